@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Blueprint, Flask, Response, g, request, jsonify, render_template, session
 from flask_cors import CORS
 import os
 import json
@@ -7,228 +7,242 @@ from dotenv import load_dotenv
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import random
+import time
 import psycopg2
 import psycopg2.extras
-from utils.pdf_processor import extract_text_from_pdf, extraer_preguntas, generate_exam
+from utils.db import ConnectionPool, DatabaseConnectionError, PoolTimeoutError
+from utils.schema import create_schema
+from utils.jobs import JobQueue, JobError, QuestionFeed
+from utils.question_cache import QuestionCache, hash_file
+from utils.memory_cache import TTLCache
+from utils.grading import build_answer_key, grade, score_percentage, question_results
+from utils import analytics, export, metrics
+from utils.versions import build_versions, insert_versions, version_questions
+from utils.student_payload import build_payload
+from utils.cooperative import gevent_active, run_blocking
+from utils.pagination import PaginationError, filter_params, page_params, keyset_filters, paginate
+from utils.bulk_grading import BulkFormatError, parse_submissions, grade_and_store, summarize
 
-# Cargar variables de entorno
+# Cargar variables de entorno (la configuración de abajo se lee al importar)
 load_dotenv()
 
-# Configuración de Flask
-app = Flask(__name__, static_folder='../frontend', template_folder='../frontend')
-
-# Configuración de CORS para producción
-if os.getenv('FLASK_ENV') == 'production':
-    # En producción, especifica tu dominio de Vercel
-    CORS(app, origins=['https://my-sistema-exams-ia.vercel.app'])
-else:
-    # En desarrollo, permite todos los orígenes
-    CORS(app)
-
-# Configuración de SECRET_KEY
-secret_key = os.getenv("SECRET_KEY")
-if not secret_key:
-    # Generar una clave secreta temporal si no existe (solo para desarrollo)
-    secret_key = str(uuid.uuid4())
-    print("⚠️ Usando SECRET_KEY temporal. Configura una permanente en producción.")
-
-app.secret_key = secret_key
+# Rutas de la aplicación; create_app() las registra en la app de Flask
+bp = Blueprint('exams', __name__)
 
 # Configuración
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Segundos que se conservan las preguntas extraídas de un PDF
+UPLOAD_TTL = float(os.getenv('UPLOAD_TTL', 24 * 3600))
 
-# Crear directorio de uploads si no existe
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Máximo de versiones por solicitud en /generate-exam-versions
+MAX_EXAM_VERSIONS = int(os.getenv('MAX_EXAM_VERSIONS', 100))
 
-# Configuración de base de datos
+# Máximo de filas por archivo de calificación masiva
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 50000))
+
+# Configuración de base de datos (se valida en create_app)
 DATABASE_URL = os.getenv('DATABASE_URL')
-if not DATABASE_URL:
-    raise ValueError("⚠️ Falta la variable DATABASE_URL en las variables de entorno")
+
+# Pool de conexiones (uno por proceso; las conexiones se abren bajo demanda)
+db_pool = ConnectionPool(
+    DATABASE_URL,
+    minconn=int(os.getenv('DB_POOL_MIN', 1)),
+    maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+    max_idle=float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+    # Con métricas activas cada execute() se mide (db_query_duration_seconds)
+    cursor_factory=metrics.timed_cursor(psycopg2.extras.RealDictCursor),
+)
 
 def get_db_connection():
-    """Crear conexión a la base de datos PostgreSQL"""
-    try:
-        conn = psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.RealDictCursor)
-        return conn
-    except Exception as e:
-        print(f"Error conectando a la base de datos: {e}")
-        return None
+    """Obtener una conexión del pool; usar siempre como context manager:
+
+        with get_db_connection() as conn:
+            ...
+    """
+    return db_pool.connection()
+
+# Token opcional para /metrics (Authorization: Bearer ...)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@bp.after_app_request
+def record_request_duration(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # La regla (/get-exam/<exam_code>) y no la URL, para no crear una serie por código
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                             route=route, status=response.status_code)
+    return response
+
+@bp.app_errorhandler(DatabaseConnectionError)
+def handle_database_connection_error(e):
+    print(f"Error conectando a la base de datos: {e}")
+    if isinstance(e, PoolTimeoutError):
+        return jsonify({'error': 'Database busy, try again'}), 503, {'Retry-After': '1'}
+    return jsonify({'error': 'Database connection failed'}), 500
 
 def init_database():
     """Inicializar tablas de la base de datos"""
-    conn = get_db_connection()
-    if not conn:
-        return False
-    
     try:
-        cur = conn.cursor()
-        
-        # Tabla de maestros
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS teachers (
-                id VARCHAR(36) PRIMARY KEY,
-                name VARCHAR(200) NOT NULL,
-                email VARCHAR(200) UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Tabla de exámenes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS exams (
-                id VARCHAR(36) PRIMARY KEY,
-                teacher_id VARCHAR(36) REFERENCES teachers(id),
-                exam_code VARCHAR(10) UNIQUE NOT NULL,
-                questions JSONB NOT NULL,
-                time_limit INTEGER DEFAULT 40,
-                difficulty VARCHAR(20) DEFAULT 'medium',
-                versions INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Tabla de versiones de exámenes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS exam_versions (
-                id VARCHAR(36) PRIMARY KEY,
-                original_exam_id VARCHAR(36) REFERENCES exams(id),
-                version_code VARCHAR(10) UNIQUE NOT NULL,
-                questions JSONB NOT NULL,
-                time_limit INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Tabla de resultados de estudiantes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS student_results (
-                id VARCHAR(36) PRIMARY KEY,
-                student_name VARCHAR(200) NOT NULL,
-                exam_code VARCHAR(10) NOT NULL,
-                exam_id VARCHAR(36),
-                answers JSONB,
-                correct_answers INTEGER,
-                total_questions INTEGER,
-                overall_percentage DECIMAL(5,2),
-                topic_scores JSONB,
-                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            
+            create_schema(cur)
+            
+            conn.commit()
+            cur.close()
         print("✅ Base de datos inicializada correctamente")
         return True
         
     except Exception as e:
         print(f"❌ Error inicializando base de datos: {e}")
-        conn.rollback()
-        cur.close()
-        conn.close()
         return False
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de salud para Render"""
     try:
         # Verificar conexión a la base de datos
-        conn = get_db_connection()
-        if conn:
-            conn.close()
-            return jsonify({
-                "status": "OK", 
-                "message": "Backend funcionando",
-                "database": "connected",
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
-            return jsonify({
-                "status": "ERROR",
-                "message": "Error de conexión a base de datos"
-            }), 500
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+        return jsonify({
+            "status": "OK", 
+            "message": "Backend funcionando",
+            "database": "connected",
+            "db_pool": db_pool.stats(),
+            "timestamp": datetime.now().isoformat()
+        })
+    except DatabaseConnectionError:
+        return jsonify({
+            "status": "ERROR",
+            "message": "Error de conexión a base de datos",
+            "db_pool": db_pool.stats()
+        }), 500
     except Exception as e:
         return jsonify({
             "status": "ERROR",
             "message": str(e)
         }), 500
 
-@app.route('/')
+@bp.route('/stats', methods=['GET'])
+def stats():
+    """Métricas internas para dimensionar el despliegue"""
+    return jsonify({
+        'db_pool': db_pool.stats(),
+        'generation_jobs': generation_jobs.stats(),
+        'question_cache': question_cache.stats(),
+        'exam_cache': exam_cache.stats(),
+        'answer_key_cache': answer_key_cache.stats()
+    })
+
+# Componentes que ya llevan sus propias cuentas; se leen al consultar /metrics
+metrics.register_stats('cache', {
+    'exam': lambda: exam_cache.stats(),
+    'answer_key': lambda: answer_key_cache.stats(),
+    'question': lambda: question_cache.stats(),
+}, metrics.CACHE_FIELDS)
+metrics.register_stats('pool', {'db': lambda: db_pool.stats()}, metrics.POOL_FIELDS)
+metrics.register_stats('queue', {'generation': lambda: generation_jobs.stats()}, metrics.JOB_FIELDS)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas de este proceso en formato de Prometheus"""
+    if not metrics.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics disabled'}), 404
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 # Rutas para maestros
-@app.route('/register-teacher', methods=['POST'])
+@bp.route('/register-teacher', methods=['POST'])
 def register_teacher():
     data = request.json
     teacher_id = str(uuid.uuid4())
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO teachers (id, name, email) VALUES (%s, %s, %s)",
-            (teacher_id, data['name'], data['email'])
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return jsonify({'teacher_id': teacher_id, 'success': True})
-        
-    except psycopg2.IntegrityError:
-        return jsonify({'error': 'Email already exists'}), 400
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO teachers (id, name, email) VALUES (%s, %s, %s)",
+                (teacher_id, data['name'], data['email'])
+            )
+            conn.commit()
+            cur.close()
+            
+            return jsonify({'teacher_id': teacher_id, 'success': True})
+            
+        except psycopg2.IntegrityError:
+            return jsonify({'error': 'Email already exists'}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
 
-@app.route('/login-teacher', methods=['POST'])
+@bp.route('/login-teacher', methods=['POST'])
 def login_teacher():
     data = request.json
     name = data['name']
     email = data['email']
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id FROM teachers WHERE name = %s AND email = %s",
-            (name, email)
-        )
-        teacher = cur.fetchone()
-        
-        if teacher:
-            cur.close()
-            conn.close()
-            return jsonify({
-                'teacher_id': teacher['id'], 
-                'success': True,
-                'message': 'Login exitoso'
-            })
-        else:
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id FROM teachers WHERE name = %s AND email = %s",
+                (name, email)
+            )
+            teacher = cur.fetchone()
             cur.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'error': 'Credenciales incorrectas'
-            }), 404
             
-    except Exception as e:
+            if teacher:
+                return jsonify({
+                    'teacher_id': teacher['id'], 
+                    'success': True,
+                    'message': 'Login exitoso'
+                })
+            else:
+                return jsonify({
+                    'success': False,
+                    'error': 'Credenciales incorrectas'
+                }), 404
+                
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+def purge_expired_uploads():
+    """Borrar cargas (y PDFs huérfanos) más antiguas que UPLOAD_TTL"""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM uploads
+            WHERE COALESCE(used_at, created_at) < NOW() - make_interval(secs => %s)
+        """, (UPLOAD_TTL,))
+        removed = cur.rowcount
+        conn.commit()
         cur.close()
-        conn.close()
-        return jsonify({'error': str(e)}), 500
 
-@app.route('/upload-pdf', methods=['POST'])
+    # PDFs que quedaron en disco por un fallo a mitad del procesamiento
+    cutoff = datetime.now().timestamp() - UPLOAD_TTL
+    for entry in os.scandir(UPLOAD_FOLDER):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+
+    return removed
+
+@bp.route('/upload-pdf', methods=['POST'])
 def upload_pdf():
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
@@ -244,402 +258,790 @@ def upload_pdf():
         # Usar timestamp para evitar conflictos de nombres
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         unique_filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
         file.save(file_path)
         
         try:
-            # Extraer texto y preguntas
-            pdf_text = extract_text_from_pdf(file_path)
-            preguntas = extraer_preguntas(pdf_text)
-            
+            upload_id = str(uuid.uuid4())
+            pdf_hash = hash_file(file_path)
+
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                # Si el mismo PDF ya se procesó, reutilizar sus preguntas sin volver a extraerlas
+                cur.execute("""
+                    INSERT INTO uploads (id, teacher_id, filename, pdf_hash, questions, num_questions)
+                    SELECT %s, %s, %s, pdf_hash, questions, num_questions
+                    FROM uploads WHERE pdf_hash = %s
+                    ORDER BY created_at DESC LIMIT 1
+                    RETURNING num_questions
+                """, (upload_id, teacher_id, unique_filename, pdf_hash))
+                row = cur.fetchone()
+                conn.commit()
+                cur.close()
+
+            if row:
+                num_preguntas = row['num_questions']
+            else:
+                # Extraer preguntas página a página (sin ocupar una conexión del pool
+                # ni, con gevent, bloquear a las demás solicitudes del worker). Con
+                # gevent se extrae en el hilo: el pool de procesos depende de hilos
+                # internos que gevent convierte en greenlets.
+                workers = 1 if gevent_active() else None
+                # PyMuPDF se carga aquí, la primera vez que se sube un PDF
+                from utils.pdf_processor import iter_preguntas_pdf
+                with metrics.PDF_EXTRACT_SECONDS.time():
+                    preguntas = run_blocking(lambda: list(iter_preguntas_pdf(file_path, workers=workers)))
+                num_preguntas = len(preguntas)
+                metrics.PDF_QUESTIONS.inc(num_preguntas)
+
+                with get_db_connection() as conn:
+                    cur = conn.cursor()
+                    cur.execute("""
+                        INSERT INTO uploads (id, teacher_id, filename, pdf_hash, questions, num_questions)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, (upload_id, teacher_id, unique_filename, pdf_hash,
+                          json.dumps(preguntas, ensure_ascii=False), num_preguntas))
+                    conn.commit()
+                    cur.close()
+
+            try:
+                purge_expired_uploads()
+            except Exception as e:
+                print(f"⚠ Error depurando cargas antiguas: {e}")
+
             return jsonify({
                 'success': True,
+                'upload_id': upload_id,
                 'filename': unique_filename,
-                'num_preguntas': len(preguntas),
-                'file_path': file_path
+                'num_preguntas': num_preguntas
             })
+        except DatabaseConnectionError:
+            raise
         except Exception as e:
-            # Limpiar archivo si hay error
+            return jsonify({'error': f'Error processing PDF: {str(e)}'}), 500
+        finally:
+            # Las preguntas ya quedaron en la base de datos: el PDF no se vuelve a leer
             if os.path.exists(file_path):
                 os.remove(file_path)
-            return jsonify({'error': f'Error processing PDF: {str(e)}'}), 500
     
     return jsonify({'error': 'Invalid file type'}), 400
 
-@app.route('/generate-exam', methods=['POST'])
-def generate_exam_route():
-    data = request.json
-
-    # Validación básica
-    if not data or 'teacher_id' not in data or 'file_path' not in data:
-        return jsonify({"error": "Faltan parámetros obligatorios"}), 400
-
-    teacher_id = data['teacher_id']
-    file_path = data['file_path']
-    num_questions = data.get('num_questions', 20)
-    difficulty = data.get('difficulty', 'medium')
-    time_limit = data.get('time_limit', 40)
-
-    try:
-        # Generar examen usando IA
-        exam_data = generate_exam(file_path, num_questions, difficulty)
+# Caché persistente de lotes generados por la IA
+question_cache = QuestionCache(
+    db_pool,
+    max_entries=int(os.getenv('QUESTION_CACHE_MAX_ENTRIES', 5000)),
+    ttl=float(os.getenv('QUESTION_CACHE_TTL', 30 * 24 * 3600)),
+)
 
-        print("exam_data recibido:", exam_data)
+def save_exam(teacher_id, preguntas, time_limit, difficulty):
+    """Guardar un examen generado y devolver (exam_id, exam_code)"""
+    exam_id = str(uuid.uuid4())
+    exam_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
 
-        # Verificar clave correcta (preguntas o questions)
-        if not exam_data or ('preguntas' not in exam_data and 'questions' not in exam_data):
-            return jsonify({"error": "La generación del examen falló, no hay preguntas."}), 400
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO exams (id, teacher_id, exam_code, questions, time_limit, difficulty, answer_key, num_questions)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (exam_id, teacher_id, exam_code, json.dumps(preguntas), time_limit, difficulty,
+              json.dumps(build_answer_key(preguntas)), len(preguntas)))
+        
+        conn.commit()
+        cur.close()
 
-        # Obtener preguntas usando la clave correcta
-        preguntas = exam_data.get('preguntas') or exam_data.get('questions')
+    return exam_id, exam_code
 
-        exam_id = str(uuid.uuid4())
-        exam_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
+def run_generation_job(job, progress):
+    """Ejecutar un trabajo de la cola: generar con IA y guardar el examen"""
+    # El stack de PDF/IA solo lo necesitan los workers que generan
+    from utils.pdf_processor import generate_exam_from_questions
 
-        # Guardar en base de datos
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+    params = job['params']
 
+    with get_db_connection() as conn:
         cur = conn.cursor()
         cur.execute("""
-            INSERT INTO exams (id, teacher_id, exam_code, questions, time_limit, difficulty)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (exam_id, teacher_id, exam_code, json.dumps(preguntas), time_limit, difficulty))
-        
+            UPDATE uploads SET used_at = NOW() WHERE id = %s
+            RETURNING pdf_hash, questions
+        """, (params['upload_id'],))
+        upload = cur.fetchone()
         conn.commit()
         cur.close()
-        conn.close()
 
-        # Limpiar archivo PDF temporal
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    if not upload:
+        raise JobError("El archivo PDF ya no está disponible, súbelo de nuevo.")
 
-        return jsonify({
-            'exam_id': exam_id,
-            'exam_code': exam_code,
-            'questions': preguntas,
-            'success': True
-        })
-        
+    preguntas_pdf = json.loads(upload['questions']) if isinstance(upload['questions'], str) else upload['questions']
+
+    # Generar examen usando IA; las preguntas se publican en el trabajo conforme llegan
+    feed = QuestionFeed(progress)
+    exam_data = generate_exam_from_questions(
+        preguntas_pdf, params['num_questions'], params['difficulty'],
+        on_progress=progress,
+        cache=question_cache,
+        pdf_hash=upload['pdf_hash'].strip(),
+        force_regenerate=params.get('force_regenerate', False),
+        on_question=feed.add,
+        # Latido antes de cada llamada: los reintentos de un lote pueden tardar más que JOB_STALE_AFTER
+        on_attempt=progress
+    )
+    feed.flush()
+
+    # Verificar clave correcta (preguntas o questions)
+    preguntas = exam_data.get('preguntas') or exam_data.get('questions') if exam_data else None
+    if not preguntas:
+        raise JobError("La generación del examen falló, no hay preguntas.")
+
+    # Lanza JobLost si otro worker reclamó el trabajo: no guardar un examen duplicado
+    progress()
+    exam_id, exam_code = save_exam(job['teacher_id'], preguntas, params['time_limit'], params['difficulty'])
+
+    return {'exam_id': exam_id, 'exam_code': exam_code, 'metrics': exam_data.get('metricas')}
+
+# Cola de generación de exámenes (hilos en segundo plano en cada proceso)
+generation_jobs = JobQueue(
+    db_pool,
+    run_generation_job,
+    workers=int(os.getenv('JOB_WORKERS', 2)),
+    poll_interval=float(os.getenv('JOB_POLL_INTERVAL', 2)),
+    stale_after=float(os.getenv('JOB_STALE_AFTER', 600)),
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+)
+
+@bp.route('/generate-exam', methods=['POST'])
+def generate_exam_route():
+    data = request.json
+
+    # Validación básica
+    if not data or 'teacher_id' not in data or 'upload_id' not in data:
+        return jsonify({"error": "Faltan parámetros obligatorios"}), 400
+
+    params = {
+        'upload_id': data['upload_id'],
+        'num_questions': data.get('num_questions', 20),
+        'difficulty': data.get('difficulty', 'medium'),
+        'time_limit': data.get('time_limit', 40),
+        'force_regenerate': bool(data.get('force_regenerate', False)),
+    }
+
+    try:
+        job_id = generation_jobs.enqueue(data['teacher_id'], params)
+    except DatabaseConnectionError:
+        raise
     except Exception as e:
         return jsonify({"error": f"Error generando examen: {str(e)}"}), 500
 
-@app.route('/get-teacher-exams/<teacher_id>')
-def get_teacher_exams(teacher_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'success': True
+    }), 202
+
+@bp.route('/generate-exam/<job_id>', methods=['GET'])
+def generate_exam_status(job_id):
     try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, exam_code, questions, difficulty, versions, created_at
-            FROM exams WHERE teacher_id = %s ORDER BY created_at DESC
-        """, (teacher_id,))
-        
-        exams_data = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        teacher_exams = []
-        for exam in exams_data:
-            questions = json.loads(exam['questions']) if isinstance(exam['questions'], str) else exam['questions']
-            teacher_exams.append({
-                'exam_id': exam['id'],
-                'exam_code': exam['exam_code'],
-                'num_questions': len(questions),
-                'difficulty': exam['difficulty'],
-                'created_at': exam['created_at'].isoformat() if exam['created_at'] else None,
-                'versions': exam['versions']
-            })
-        
-        return jsonify({'exams': teacher_exams})
-        
+        job = generation_jobs.get(job_id)
+    except DatabaseConnectionError:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/generate-exam-versions', methods=['POST'])
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'batches_done': job['batches_done'],
+        'batches_total': job['batches_total'],
+        'questions_ready': job['questions_ready'] or 0,
+        'preview': job['preview'] or [],
+        'attempts': job['attempts'],
+        'exam_id': job['exam_id'],
+        'exam_code': job['exam_code'],
+        'error': job['error'],
+        'metrics': job['metrics'],
+        'created_at': job['created_at'].isoformat() if job['created_at'] else None,
+        'updated_at': job['updated_at'].isoformat() if job['updated_at'] else None
+    })
+
+@bp.route('/get-teacher-exams/<teacher_id>')
+def get_teacher_exams(teacher_id):
+    """Exámenes del maestro, del más reciente al más antiguo, por páginas.
+
+    Parámetros opcionales: limit, cursor (``next_cursor`` de la página
+    anterior), exam_code, from y to (fechas ISO).
+    """
+    try:
+        params = page_params(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conditions, values = keyset_filters(params, 'created_at', 'id')
+    if params['exam_code']:
+        conditions.append("exam_code = %s")
+        values.append(params['exam_code'])
+    where = ''.join(f" AND {condition}" for condition in conditions)
+
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            # Solo las columnas del listado: las preguntas se cuentan en la base
+            # de datos y únicamente para exámenes anteriores a num_questions
+            cur.execute(f"""
+                SELECT id, exam_code, difficulty, versions, created_at,
+                       COALESCE(num_questions, jsonb_array_length(questions)) AS num_questions
+                FROM exams WHERE teacher_id = %s{where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            """, (teacher_id, *values, params['limit'] + 1))
+            
+            exams_data = cur.fetchall()
+            cur.close()
+            
+            exams_data, next_cursor = paginate(exams_data, params['limit'], 'created_at')
+            teacher_exams = []
+            for exam in exams_data:
+                teacher_exams.append({
+                    'exam_id': exam['id'],
+                    'exam_code': exam['exam_code'],
+                    'num_questions': exam['num_questions'],
+                    'difficulty': exam['difficulty'],
+                    'created_at': exam['created_at'].isoformat() if exam['created_at'] else None,
+                    'versions': exam['versions']
+                })
+            
+            return jsonify({'exams': teacher_exams, 'next_cursor': next_cursor})
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+@bp.route('/generate-exam-versions', methods=['POST'])
 def generate_exam_versions():
     data = request.json
     exam_id = data['exam_id']
-    num_versions = data.get('num_versions', 1)
-    
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
     try:
-        # Obtener examen original
+        num_versions = int(data.get('num_versions', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'num_versions debe ser un número'}), 400
+    if not 1 <= num_versions <= MAX_EXAM_VERSIONS:
+        return jsonify({'error': f'num_versions debe estar entre 1 y {MAX_EXAM_VERSIONS}'}), 400
+    
+    # Obtener examen original
+    with get_db_connection() as conn:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM exams WHERE id = %s", (exam_id,))
+        cur.execute("SELECT questions, time_limit FROM exams WHERE id = %s", (exam_id,))
         original_exam = cur.fetchone()
-        
-        if not original_exam:
-            return jsonify({'error': 'Exam not found'}), 404
-        
-        questions = json.loads(original_exam['questions']) if isinstance(original_exam['questions'], str) else original_exam['questions']
-        versions = []
-        
-        for i in range(num_versions):
-            version_id = str(uuid.uuid4())
-            version_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
-            
-            # Mezclar preguntas
-            shuffled_questions = questions.copy()
-            random.shuffle(shuffled_questions)
+        cur.close()
+    
+    if not original_exam:
+        return jsonify({'error': 'Exam not found'}), 404
+    
+    questions = json.loads(original_exam['questions']) if isinstance(original_exam['questions'], str) else original_exam['questions']
+    
+    # Todas las versiones en una pasada, sin conexión tomada ni tocar las preguntas originales
+    versions = build_versions(questions, num_versions)
+    
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            insert_versions(cur, exam_id, original_exam['time_limit'], versions)
             
-            # Mezclar opciones de cada pregunta
-            for question in shuffled_questions:
-                if 'opciones' in question:
-                    options = list(question['opciones'].items())
-                    random.shuffle(options)
-                    question['opciones'] = dict(options)
+            # Actualizar contador de versiones
+            cur.execute(
+                "UPDATE exams SET versions = versions + %s WHERE id = %s",
+                (num_versions, exam_id)
+            )
             
-            # Guardar versión en base de datos
-            cur.execute("""
-                INSERT INTO exam_versions (id, original_exam_id, version_code, questions, time_limit)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (version_id, exam_id, version_code, json.dumps(shuffled_questions), original_exam['time_limit']))
+            conn.commit()
+            cur.close()
             
-            versions.append({
-                'version_id': version_id,
-                'version_code': version_code
-            })
-        
-        # Actualizar contador de versiones
-        cur.execute(
-            "UPDATE exams SET versions = versions + %s WHERE id = %s",
-            (num_versions, exam_id)
-        )
-        
-        conn.commit()
+        except DatabaseConnectionError:
+            raise
+        except Exception as e:
+            conn.rollback()
+            return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'versions': [{'version_id': v['version_id'], 'version_code': v['version_code']} for v in versions],
+        'success': True
+    })
+
+# Segundos que el navegador puede reusar un examen sin revalidarlo
+EXAM_HTTP_MAX_AGE = int(os.getenv('EXAM_HTTP_MAX_AGE', 60))
+
+# Exámenes por código: datos inmutables que todos los alumnos piden al mismo tiempo
+exam_cache = TTLCache(
+    maxsize=int(os.getenv('EXAM_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('EXAM_CACHE_TTL', 300)),
+)
+
+def find_exam_by_code(exam_code):
+    """Resolver un código de examen o de versión, pasando por la caché.
+
+    Devuelve la respuesta precalculada para el alumno (ver
+    utils.student_payload: body, gzip, etag, exam_id y original_exam_id)
+    o ``None`` si el código no existe. El resultado es compartido: no
+    debe modificarse.
+    """
+    exam = exam_cache.get(exam_code)
+    if exam is not None:
+        return exam
+
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        # Exámenes originales y versiones en una sola consulta (vista exam_codes)
+        cur.execute("""
+            SELECT exam_id, original_exam_id, questions, time_limit, is_version, permutation
+            FROM exam_codes WHERE code = %s
+            LIMIT 1
+        """, (exam_code,))
+        row = cur.fetchone()
         cur.close()
-        conn.close()
-        
-        return jsonify({'versions': versions, 'success': True})
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
 
-@app.route('/get-exam/<exam_code>')
-def get_exam(exam_code):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    try:
+    if not row:
+        return None
+
+    # Las versiones por permutación se arman aquí una vez y quedan en caché,
+    # ya serializadas sin respuestas y comprimidas
+    questions = version_questions(row['questions'], row['permutation'])
+    exam = build_payload(row['exam_id'], row['original_exam_id'], questions,
+                         row['time_limit'], row['is_version'])
+    exam_cache.set(exam_code, exam)
+    return exam
+
+# Claves de respuestas por código, para calificar sin tocar las preguntas
+answer_key_cache = TTLCache(
+    maxsize=int(os.getenv('EXAM_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('EXAM_CACHE_TTL', 300)),
+)
+
+def find_answer_key_by_code(exam_code):
+    """Resolver un código y devolver su clave de respuestas (sin decodificar las preguntas).
+
+    Devuelve un dict con exam_id, original_exam_id, is_version, answer_key
+    y question_order (índice en el original de cada pregunta, para las
+    estadísticas), o ``None`` si el código no existe.
+    """
+    exam = answer_key_cache.get(exam_code)
+    if exam is not None:
+        return exam
+
+    with get_db_connection() as conn:
         cur = conn.cursor()
-        
-        # Buscar en exámenes originales
-        cur.execute("SELECT * FROM exams WHERE exam_code = %s", (exam_code,))
-        exam = cur.fetchone()
-        
-        if exam:
-            questions = json.loads(exam['questions']) if isinstance(exam['questions'], str) else exam['questions']
-            return jsonify({
-                'exam_id': exam['id'],
-                'questions': questions,
-                'time_limit': exam['time_limit'],
-                'is_version': False
-            })
-        
-        # Buscar en versiones
-        cur.execute("SELECT * FROM exam_versions WHERE version_code = %s", (exam_code,))
-        version = cur.fetchone()
-        
-        if version:
-            questions = json.loads(version['questions']) if isinstance(version['questions'], str) else version['questions']
-            return jsonify({
-                'exam_id': version['id'],
-                'questions': questions,
-                'time_limit': version['time_limit'],
-                'is_version': True
-            })
-        
+        cur.execute("""
+            SELECT exam_id, original_exam_id, is_version, answer_key, permutation
+            FROM exam_codes WHERE code = %s
+            LIMIT 1
+        """, (exam_code,))
+        row = cur.fetchone()
+
+        if row and row['answer_key'] is None:
+            # Examen anterior a las claves precalculadas: calcularla una vez y guardarla
+            cur.execute("SELECT questions FROM exam_codes WHERE code = %s LIMIT 1", (exam_code,))
+            questions = version_questions(cur.fetchone()['questions'], row['permutation'])
+            row['answer_key'] = build_answer_key(questions)
+            table = 'exam_versions' if row['is_version'] else 'exams'
+            cur.execute(
+                f"UPDATE {table} SET answer_key = %s WHERE id = %s AND answer_key IS NULL",
+                (json.dumps(row['answer_key']), row['exam_id'])
+            )
+            conn.commit()
         cur.close()
-        conn.close()
-        return jsonify({'error': 'Exam not found'}), 404
-        
+
+    if not row:
+        return None
+
+    answer_key = row['answer_key']
+    answer_key = json.loads(answer_key) if isinstance(answer_key, str) else answer_key
+    exam = {
+        'exam_id': row['exam_id'],
+        'original_exam_id': row['original_exam_id'],
+        'is_version': row['is_version'],
+        'answer_key': answer_key,
+        'question_order': analytics.question_order(answer_key, row['is_version'], row['permutation'])
+    }
+    answer_key_cache.set(exam_code, exam)
+    return exam
+
+@bp.route('/get-exam/<exam_code>')
+def get_exam(exam_code):
+    try:
+        exam = find_exam_by_code(exam_code)
+    except DatabaseConnectionError:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/submit-exam', methods=['POST'])
+    if not exam:
+        return jsonify({'error': 'Exam not found'}), 404
+
+    # ETag débil: el mismo para la versión con y sin gzip
+    headers = {
+        'ETag': f'W/"{exam["etag"]}"',
+        'Cache-Control': f'private, max-age={EXAM_HTTP_MAX_AGE}, must-revalidate',
+        'Vary': 'Accept-Encoding',
+    }
+    if request.if_none_match.contains_weak(exam['etag']):
+        return Response(status=304, headers=headers)
+
+    if exam['gzip'] is not None and 'gzip' in request.accept_encodings:
+        headers['Content-Encoding'] = 'gzip'
+        body = exam['gzip']
+    else:
+        body = exam['body']
+    return Response(body, mimetype='application/json', headers=headers)
+
+@bp.route('/submit-exam', methods=['POST'])
 def submit_exam():
-    data = request.json
+    data = request.get_json(silent=True)
+
+    # Validación básica
+    if not isinstance(data, dict) or not all(k in data for k in ('student_name', 'exam_code', 'answers')):
+        return jsonify({'error': 'Faltan parámetros obligatorios'}), 400
+
     student_name = data['student_name']
     exam_code = data['exam_code']
     answers = data['answers']
+
+    # grade() espera un dict índice -> opción, como lo envía el frontend
+    if not isinstance(exam_code, str) or not isinstance(answers, dict):
+        return jsonify({'error': 'exam_code debe ser texto y answers un objeto'}), 400
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    try:
+        exam = find_answer_key_by_code(exam_code)
+    except DatabaseConnectionError:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if not exam:
+        return jsonify({'error': 'Exam not found'}), 404
+
+    exam_id = exam['exam_id']
     
+    # Calcular calificación con la clave precalculada
+    correct_answers, total_questions, topic_percentages = grade(exam['answer_key'], answers)
+    overall_percentage = score_percentage(correct_answers, total_questions)
+    stats_delta = analytics.new_delta()
+    analytics.add_submission(stats_delta, overall_percentage, topic_percentages,
+                             question_results(exam['answer_key'], answers), exam['question_order'])
+    
+    with get_db_connection() as conn:
+        try:
+            # Guardar resultado
+            cur = conn.cursor()
+            result_id = str(uuid.uuid4())
+            cur.execute("""
+                INSERT INTO student_results 
+                (id, student_name, exam_code, exam_id, answers, correct_answers, 
+                 total_questions, overall_percentage, topic_scores)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (result_id, student_name, exam_code, exam_id, json.dumps(answers),
+                  correct_answers, total_questions, overall_percentage, 
+                  json.dumps(topic_percentages)))
+            
+            # Sumar la entrega a las estadísticas del examen en la misma transacción
+            analytics.apply_delta(cur, exam['original_exam_id'], stats_delta)
+            
+            conn.commit()
+            cur.close()
+            
+            return jsonify({
+                'result_id': result_id,
+                'correct_answers': correct_answers,
+                'total_questions': total_questions,
+                'overall_percentage': overall_percentage,
+                'topic_scores': topic_percentages,
+                'success': True
+            })
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+@bp.route('/submit-exam-bulk', methods=['POST'])
+def submit_exam_bulk():
+    """Calificar y guardar muchas hojas de respuestas a la vez (JSON o CSV).
+
+    Acepta un archivo en el campo ``file`` o el cuerpo directo
+    (application/json o text/csv). Con ``?dry_run=1`` solo califica.
+    """
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
     try:
-        cur = conn.cursor()
-        
-        # Encontrar examen
-        exam_data = None
-        exam_id = None
-        
-        # Buscar en exámenes originales
-        cur.execute("SELECT * FROM exams WHERE exam_code = %s", (exam_code,))
-        exam = cur.fetchone()
-        
-        if exam:
-            exam_data = exam
-            exam_id = exam['id']
+        if 'file' in request.files:
+            file = request.files['file']
+            fmt = request.form.get('format') or ('csv' if file.filename.lower().endswith('.csv') else 'json')
+            rows = parse_submissions(file.read().decode('utf-8-sig'), fmt)
+        elif request.mimetype == 'application/json':
+            rows = parse_submissions(request.get_data(as_text=True), 'json')
+        elif request.mimetype == 'text/csv':
+            rows = parse_submissions(request.get_data(as_text=True), 'csv')
         else:
-            # Buscar en versiones
-            cur.execute("SELECT * FROM exam_versions WHERE version_code = %s", (exam_code,))
-            version = cur.fetchone()
-            if version:
-                exam_data = version
-                exam_id = version['id']
-        
-        if not exam_data:
-            return jsonify({'error': 'Exam not found'}), 404
-        
-        questions = json.loads(exam_data['questions']) if isinstance(exam_data['questions'], str) else exam_data['questions']
-        
-        # Calcular calificación
-        correct_answers = 0
-        total_questions = len(questions)
-        topic_scores = {}
-        
-        for i, question in enumerate(questions):
-            topic = question.get('tema', 'General')
-            if topic not in topic_scores:
-                topic_scores[topic] = {'correct': 0, 'total': 0}
+            return jsonify({'error': 'Envía un archivo JSON o CSV'}), 400
+    except (BulkFormatError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if len(rows) > BULK_MAX_ROWS:
+        return jsonify({'error': f'Máximo {BULK_MAX_ROWS} filas por archivo'}), 413
+
+    with get_db_connection() as conn:
+        try:
+            records, errors = grade_and_store(conn, rows, dry_run=dry_run)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    return jsonify(summarize(records, errors, dry_run=dry_run))
+
+@bp.route('/exam-analytics/<exam_id>')
+def exam_analytics(exam_id):
+    """Estadísticas del examen y sus versiones: media, mediana, histograma,
+    aprobación por tema y porcentaje de aciertos por pregunta.
+
+    Lee la fila precalculada de exam_stats; ``?rebuild=1`` (o un examen con
+    entregas anteriores a exam_stats) la recalcula desde student_results.
+    """
+    rebuild = request.args.get('rebuild', '').lower() in ('1', 'true', 'yes')
+
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM exams WHERE id = %s", (exam_id,))
+            if not cur.fetchone():
+                cur.close()
+                return jsonify({'error': 'Exam not found'}), 404
+
+            row = None if rebuild else analytics.load(cur, exam_id)
+            if row is None:
+                analytics.rebuild(cur, exam_id)
+                conn.commit()
+                row = analytics.load(cur, exam_id)
+            cur.close()
+
+        except DatabaseConnectionError:
+            raise
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    stats = analytics.summarize(row)
+    stats['exam_id'] = exam_id
+    stats['success'] = True
+    return jsonify(stats)
+
+@bp.route('/item-analysis/<exam_id>')
+def exam_item_analysis(exam_id):
+    """Análisis de reactivos del examen y sus versiones (dificultad,
+    discriminación, distractores y alfa de Cronbach)."""
+    # NumPy solo se carga en el worker que atiende el primer análisis
+    from utils import item_analysis
+
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            loaded = item_analysis.load_groups(cur, exam_id)
+            cur.close()
+        except DatabaseConnectionError:
+            raise
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    if loaded is None:
+        return jsonify({'error': 'Exam not found'}), 404
+
+    # El cálculo se hace con la conexión ya devuelta al pool
+    questions, groups, skipped = loaded
+    choices, alphabet = run_blocking(item_analysis.build_matrix, questions, groups)
+    report = run_blocking(item_analysis.analyze, questions, choices, alphabet)
+    report['exam_id'] = exam_id
+    report['skipped_submissions'] = skipped
+    report['success'] = True
+    return jsonify(report)
+
+@bp.route('/get-student-results/<teacher_id>')
+def get_student_results(teacher_id):
+    """Resultados de los exámenes del maestro (originales y versiones), por páginas.
+
+    Mismos parámetros que /get-teacher-exams; ``exam_code`` acepta el código
+    de una versión o el del examen original (incluye todas sus versiones).
+    """
+    try:
+        params = page_params(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conditions, values = keyset_filters(params, 'sr.submitted_at', 'sr.id')
+    if params['exam_code']:
+        conditions.append("(sr.exam_code = %s OR c.original_exam_id IN (SELECT id FROM exams WHERE exam_code = %s))")
+        values.extend([params['exam_code'], params['exam_code']])
+    where = ''.join(f" AND {condition}" for condition in conditions)
+
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
             
-            topic_scores[topic]['total'] += 1
+            # Obtener resultados de exámenes del maestro (sin las respuestas completas)
+            cur.execute(f"""
+                SELECT sr.id, sr.student_name, sr.exam_code, sr.overall_percentage,
+                       sr.submitted_at, sr.topic_scores
+                FROM student_results sr
+                JOIN exam_codes c ON c.code = sr.exam_code
+                WHERE c.teacher_id = %s{where}
+                ORDER BY sr.submitted_at DESC, sr.id DESC
+                LIMIT %s
+            """, (teacher_id, *values, params['limit'] + 1))
             
-            if str(i) in answers and answers[str(i)] == question.get('respuesta_correcta'):
-                correct_answers += 1
-                topic_scores[topic]['correct'] += 1
-        
-        # Calcular porcentajes por tema
-        topic_percentages = {}
-        for topic, scores in topic_scores.items():
-            percentage = (scores['correct'] / scores['total']) * 100
-            topic_percentages[topic] = {
-                'percentage': round(percentage, 2),
-                'status': 'Aprobado' if percentage >= 60 else 'Reprobado',
-                'correct': scores['correct'],
-                'total': scores['total']
-            }
-        
-        overall_percentage = (correct_answers / total_questions) * 100
-        
-        # Guardar resultado
-        result_id = str(uuid.uuid4())
-        cur.execute("""
-            INSERT INTO student_results 
-            (id, student_name, exam_code, exam_id, answers, correct_answers, 
-             total_questions, overall_percentage, topic_scores)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (result_id, student_name, exam_code, exam_id, json.dumps(answers),
-              correct_answers, total_questions, round(overall_percentage, 2), 
-              json.dumps(topic_percentages)))
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return jsonify({
-            'result_id': result_id,
-            'correct_answers': correct_answers,
-            'total_questions': total_questions,
-            'overall_percentage': round(overall_percentage, 2),
-            'topic_scores': topic_percentages,
-            'success': True
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            results_data = cur.fetchall()
+            cur.close()
+            
+            results_data, next_cursor = paginate(results_data, params['limit'], 'submitted_at')
+            results = []
+            for result in results_data:
+                topic_scores = json.loads(result['topic_scores']) if isinstance(result['topic_scores'], str) else result['topic_scores']
+                results.append({
+                    'result_id': result['id'],
+                    'student_name': result['student_name'],
+                    'exam_code': result['exam_code'],
+                    'overall_percentage': float(result['overall_percentage']),
+                    'submitted_at': result['submitted_at'].isoformat() if result['submitted_at'] else None,
+                    'topic_scores': topic_scores
+                })
+            
+            return jsonify({'results': results, 'next_cursor': next_cursor})
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
 
-@app.route('/get-student-results/<teacher_id>')
-def get_student_results(teacher_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
+@bp.route('/export-results/<teacher_id>')
+def export_results(teacher_id):
+    """Descargar todos los resultados del maestro en CSV (o ``?format=ndjson``).
+
+    Acepta los mismos filtros que /get-student-results (exam_code, from, to).
+    Las filas se envían conforme salen de la base de datos.
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"Formato no soportado: {fmt}"}), 400
     try:
-        cur = conn.cursor()
-        
-        # Obtener resultados de exámenes del maestro
-        cur.execute("""
-            SELECT sr.* FROM student_results sr
-            JOIN exams e ON sr.exam_code = e.exam_code
-            WHERE e.teacher_id = %s
-            UNION
-            SELECT sr.* FROM student_results sr
-            JOIN exam_versions ev ON sr.exam_code = ev.version_code
-            JOIN exams e ON ev.original_exam_id = e.id
-            WHERE e.teacher_id = %s
-            ORDER BY submitted_at DESC
-        """, (teacher_id, teacher_id))
-        
-        results_data = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        results = []
-        for result in results_data:
-            topic_scores = json.loads(result['topic_scores']) if isinstance(result['topic_scores'], str) else result['topic_scores']
-            results.append({
-                'result_id': result['id'],
-                'student_name': result['student_name'],
-                'exam_code': result['exam_code'],
-                'overall_percentage': float(result['overall_percentage']),
-                'submitted_at': result['submitted_at'].isoformat() if result['submitted_at'] else None,
-                'topic_scores': topic_scores
-            })
-        
-        return jsonify({'results': results})
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        params = filter_params(request.args)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
 
-@app.route('/get-student-details/<result_id>')
-def get_student_details(result_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
+    # La conexión se toma aquí (un pool agotado sigue siendo un 503) y se
+    # devuelve cuando el servidor cierra la respuesta, aunque el cliente corte
+    conn = db_pool.getconn()
     try:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM student_results WHERE id = %s", (result_id,))
-        result = cur.fetchone()
+        topics = export.load_topics(cur, teacher_id, params['exam_code'])
         cur.close()
-        conn.close()
-        
-        if not result:
-            return jsonify({'error': 'Result not found'}), 404
-        
-        # Convertir a diccionario serializable
-        result_data = dict(result)
-        
-        # Parsear JSON fields
-        if isinstance(result_data['answers'], str):
-            result_data['answers'] = json.loads(result_data['answers'])
-        if isinstance(result_data['topic_scores'], str):
-            result_data['topic_scores'] = json.loads(result_data['topic_scores'])
-        
-        # Convertir timestamp a string
-        if result_data['submitted_at']:
-            result_data['submitted_at'] = result_data['submitted_at'].isoformat()
-        
-        # Convertir Decimal a float
-        if result_data['overall_percentage']:
-            result_data['overall_percentage'] = float(result_data['overall_percentage'])
-        
-        return jsonify(result_data)
-        
     except Exception as e:
+        db_pool.putconn(conn)
         return jsonify({'error': str(e)}), 500
 
+    body = export.stream_results(conn, teacher_id, params, topics, fmt)
+    response = Response(body, mimetype=export.FORMATS[fmt])
+    response.call_on_close(lambda: db_pool.putconn(conn))
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="resultados_{datetime.now():%Y%m%d_%H%M}.{fmt}"'
+    )
+    return response
+
+@bp.route('/get-student-details/<result_id>')
+def get_student_details(result_id):
+    with get_db_connection() as conn:
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM student_results WHERE id = %s", (result_id,))
+            result = cur.fetchone()
+            cur.close()
+            
+            if not result:
+                return jsonify({'error': 'Result not found'}), 404
+            
+            # Convertir a diccionario serializable
+            result_data = dict(result)
+            
+            # Parsear JSON fields
+            if isinstance(result_data['answers'], str):
+                result_data['answers'] = json.loads(result_data['answers'])
+            if isinstance(result_data['topic_scores'], str):
+                result_data['topic_scores'] = json.loads(result_data['topic_scores'])
+            
+            # Convertir timestamp a string
+            if result_data['submitted_at']:
+                result_data['submitted_at'] = result_data['submitted_at'].isoformat()
+            
+            # Convertir Decimal a float
+            if result_data['overall_percentage']:
+                result_data['overall_percentage'] = float(result_data['overall_percentage'])
+            
+            return jsonify(result_data)
+            
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+def create_app():
+    """Construir la aplicación: configuración, rutas y trabajos en segundo plano.
+
+    Importar este módulo no abre conexiones, no crea directorios ni carga
+    PyMuPDF, el cliente de IA o NumPy; eso pasa aquí o en la primera
+    solicitud que los usa.
+    """
+    if not DATABASE_URL:
+        raise ValueError("⚠️ Falta la variable DATABASE_URL en las variables de entorno")
+
+    # Configuración de Flask
+    app = Flask(__name__, static_folder='../frontend', template_folder='../frontend')
+
+    # Configuración de CORS para producción
+    if os.getenv('FLASK_ENV') == 'production':
+        # En producción, especifica tu dominio de Vercel
+        CORS(app, origins=['https://my-sistema-exams-ia.vercel.app'], expose_headers=['ETag'])
+    else:
+        # En desarrollo, permite todos los orígenes
+        CORS(app, expose_headers=['ETag'])
+
+    # Configuración de SECRET_KEY
+    secret_key = os.getenv("SECRET_KEY")
+    if not secret_key:
+        # Generar una clave secreta temporal si no existe (solo para desarrollo)
+        secret_key = str(uuid.uuid4())
+        print("⚠️ Usando SECRET_KEY temporal. Configura una permanente en producción.")
+
+    app.secret_key = secret_key
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+
+    # Crear directorio de uploads si no existe
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    app.register_blueprint(bp)
+
+    if generation_jobs.workers > 0:
+        generation_jobs.start()
+
+    return app
+
+def shutdown(timeout=10):
+    """Al salir el proceso: devolver los trabajos en curso a la cola y cerrar el pool"""
+    generation_jobs.stop(timeout)
+    db_pool.closeall()
+
+_app = None
+
+def __getattr__(name):
+    """``app`` se construye la primera vez que se pide (``gunicorn app:app``, ``from app import app``)"""
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
+    import atexit
+
+    app = create_app()
+    atexit.register(shutdown)
+
     # Inicializar base de datos al arrancar
     init_database()
     
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Benchmark de punta a punta del ciclo de un examen
+
+Etapas (--stages, por defecto todas):
+- extract: extracción de texto y separación de preguntas en PDFs sintéticos
+  de 10 a 1000 páginas (utils.pdf_processor.iter_preguntas_pdf)
+- generate: generate_exam sobre un PDF sintético con el backend de IA local
+  (utils.llm.StubBackend), sin proveedor ni red
+- window: ventana de examen simulada contra Postgres: N alumnos concurrentes
+  hacen /get-exam y luego /submit-exam; reporta p50/p95/p99 y peticiones/s.
+  Sin --base-url usa el cliente de pruebas de Flask en este proceso; con
+  --base-url manda HTTP a un servidor ya levantado (p. ej. gunicorn) que use
+  la misma base de datos. Los datos creados se borran al final (salvo --keep).
+
+Los resultados se escriben en JSON (--output). Con --baseline se comparan
+contra una corrida anterior y el proceso termina con código 1 si alguna
+métrica empeora más de --tolerance.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_e2e --stages extract generate
+    python -m benchmarks.bench_e2e --database-url postgresql://localhost/exams_bench --output bench.json
+    python -m benchmarks.bench_e2e --database-url ... --students 500 --concurrency 50 --versions 4
+    python -m benchmarks.bench_e2e --database-url ... --base-url http://localhost:5000
+    python -m benchmarks.bench_e2e --database-url ... --baseline bench_anterior.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.bench_grading import examen_sintetico
+from benchmarks.bench_splitter import texto_sintetico
+
+STAGES = ('extract', 'generate', 'window')
+PREGUNTAS_POR_PAGINA = 6
+
+
+def percentiles(valores):
+    """p50/p95/p99 (rango más cercano), media y máximo en milisegundos"""
+    if not valores:
+        return {}
+    ordenados = sorted(valores)
+
+    def rango(p):
+        return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+    return {
+        'count': len(ordenados),
+        'mean_ms': round(sum(ordenados) / len(ordenados) * 1000, 2),
+        'p50_ms': round(rango(50) * 1000, 2),
+        'p95_ms': round(rango(95) * 1000, 2),
+        'p99_ms': round(rango(99) * 1000, 2),
+        'max_ms': round(ordenados[-1] * 1000, 2),
+    }
+
+
+# --- extract ---------------------------------------------------------------
+
+def pdf_sintetico(ruta, paginas, seed=42):
+    """PDF de ``paginas`` páginas con preguntas numeradas e incisos"""
+    import fitz
+
+    lineas = texto_sintetico(paginas * PREGUNTAS_POR_PAGINA, seed=seed).split("\n")
+    por_pagina = math.ceil(len(lineas) / paginas)
+    with fitz.open() as doc:
+        for i in range(paginas):
+            page = doc.new_page()
+            texto = "\n".join(lineas[i * por_pagina:(i + 1) * por_pagina])
+            # insert_text no recorta (insert_textbox descarta el texto que no cabe)
+            page.insert_text((36, 36), texto, fontsize=7)
+        doc.save(ruta)
+    return ruta
+
+
+def etapa_extract(args, tmpdir):
+    from utils.pdf_processor import iter_preguntas_pdf
+
+    resultados = []
+    for paginas in args.pages:
+        ruta = pdf_sintetico(os.path.join(tmpdir, f"sintetico_{paginas}.pdf"), paginas)
+        for workers in args.extract_workers:
+            mejor = float('inf')
+            preguntas = 0
+            for _ in range(args.repeat):
+                inicio = time.perf_counter()
+                preguntas = sum(1 for _ in iter_preguntas_pdf(ruta, workers=workers))
+                mejor = min(mejor, time.perf_counter() - inicio)
+            resultados.append({
+                'pages': paginas,
+                'workers': workers,
+                'seconds': round(mejor, 4),
+                'pages_per_s': round(paginas / mejor, 1),
+                'questions': preguntas,
+                'pdf_bytes': os.path.getsize(ruta),
+            })
+            print(f"📄 {paginas:>5} páginas, {workers} procesos: {mejor:.3f}s "
+                  f"({paginas / mejor:.0f} páginas/s, {preguntas} preguntas)")
+    return resultados
+
+
+# --- generate --------------------------------------------------------------
+
+def etapa_generate(args, tmpdir):
+    from utils import llm
+    from utils.pdf_processor import generate_exam
+
+    ruta = os.path.join(tmpdir, "generar.pdf")
+    if not os.path.exists(ruta):
+        pdf_sintetico(ruta, max(10, math.ceil(max(args.num_questions) / PREGUNTAS_POR_PAGINA)))
+
+    resultados = []
+    for num_questions in args.num_questions:
+        for concurrency in args.llm_concurrency:
+            # Backend nuevo en cada corrida: mismas latencias y fallos para la misma semilla
+            llm.set_backend(llm.StubBackend(latency=args.llm_latency, jitter=args.llm_jitter,
+                                            failure_rate=args.llm_failure_rate, seed=args.seed))
+            inicio = time.perf_counter()
+            examen = generate_exam(ruta, num_questions, 'medium', max_concurrency=concurrency)
+            segundos = time.perf_counter() - inicio
+            resumen = examen['metricas']['resumen']
+            resultados.append({
+                'num_questions': num_questions,
+                'concurrency': concurrency,
+                'seconds': round(segundos, 4),
+                'questions': len(examen['preguntas']),
+                'questions_per_s': round(len(examen['preguntas']) / segundos, 2),
+                'batches': resumen['batches'],
+                'calls': resumen['calls'],
+                'retries': resumen['retries'],
+                'prompt_tokens': resumen['prompt_tokens'],
+                'completion_tokens': resumen['completion_tokens'],
+                'tokens_estimated': resumen['tokens_estimated'],
+            })
+            print(f"🤖 {num_questions:>4} preguntas, concurrencia {concurrency}: {segundos:.2f}s "
+                  f"({resumen['batches']} lotes, {resumen['calls']} llamadas)")
+    return resultados
+
+
+# --- window ----------------------------------------------------------------
+
+class ClienteFlask:
+    """Cliente de pruebas de Flask, uno por hilo"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def _cliente(self):
+        if not hasattr(self.local, 'cliente'):
+            self.local.cliente = self.app.test_client()
+        return self.local.cliente
+
+    def get(self, ruta):
+        respuesta = self._cliente().get(ruta)
+        return respuesta.status_code, respuesta.get_json(silent=True)
+
+    def post(self, ruta, datos):
+        respuesta = self._cliente().post(ruta, json=datos)
+        return respuesta.status_code, respuesta.get_json(silent=True)
+
+
+class ClienteHTTP:
+    """HTTP contra un servidor ya levantado"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _pedir(self, solicitud):
+        try:
+            with urllib.request.urlopen(solicitud, timeout=self.timeout) as respuesta:
+                return respuesta.status, json.loads(respuesta.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def get(self, ruta):
+        return self._pedir(urllib.request.Request(self.base_url + ruta))
+
+    def post(self, ruta, datos):
+        return self._pedir(urllib.request.Request(
+            self.base_url + ruta, data=json.dumps(datos).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}, method='POST'))
+
+
+def preparar_examen(app_module, args):
+    """Maestro, examen sintético y sus versiones; devuelve (teacher_id, exam_id, códigos)"""
+    teacher_id = str(uuid.uuid4())
+    with app_module.get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO teachers (id, name, email) VALUES (%s, %s, %s)",
+                    (teacher_id, 'Benchmark', f"bench-{teacher_id}@example.com"))
+        conn.commit()
+        cur.close()
+
+    exam_id, exam_code = app_module.save_exam(teacher_id, examen_sintetico(args.questions, seed=args.seed),
+                                              args.time_limit, 'medium')
+    codigos = [exam_code]
+    if args.versions:
+        status, datos = ClienteFlask(app_module.app).post(
+            '/generate-exam-versions', {'exam_id': exam_id, 'num_versions': args.versions})
+        if status != 200:
+            raise RuntimeError(f"No se pudieron crear las versiones: {status} {datos}")
+        codigos.extend(v['version_code'] for v in datos['versions'])
+    return teacher_id, exam_id, codigos
+
+
+def limpiar(app_module, teacher_id, exam_id):
+    with app_module.get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            DELETE FROM student_results WHERE exam_code IN (
+                SELECT code FROM exam_codes WHERE original_exam_id = %s)
+        """, (exam_id,))
+        cur.execute("DELETE FROM exam_stats WHERE exam_id = %s", (exam_id,))
+        cur.execute("DELETE FROM exam_versions WHERE original_exam_id = %s", (exam_id,))
+        cur.execute("DELETE FROM exams WHERE id = %s", (exam_id,))
+        cur.execute("DELETE FROM teachers WHERE id = %s", (teacher_id,))
+        conn.commit()
+        cur.close()
+
+
+def alumno(cliente, indice, codigos, args, tiempos, errores):
+    """Un alumno: obtener su examen, contestarlo y entregarlo"""
+    rng = random.Random(args.seed * 100003 + indice)
+    codigo = codigos[indice % len(codigos)]
+
+    inicio = time.perf_counter()
+    status, examen = cliente.get(f'/get-exam/{codigo}')
+    tiempos['get-exam'].append(time.perf_counter() - inicio)
+    if status != 200 or not examen:
+        errores['get-exam'].append(status)
+        return
+
+    if args.think_ms:
+        time.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+    respuestas = {
+        str(i): rng.choice(sorted(pregunta['opciones']))
+        for i, pregunta in enumerate(examen['questions']) if rng.random() < 0.95
+    }
+    inicio = time.perf_counter()
+    status, _ = cliente.post('/submit-exam', {
+        'student_name': f"Alumno {indice}", 'exam_code': codigo, 'answers': respuestas})
+    tiempos['submit-exam'].append(time.perf_counter() - inicio)
+    if status != 200:
+        errores['submit-exam'].append(status)
+
+
+def etapa_window(args):
+    if not args.database_url:
+        print("⚠ Etapa window omitida: falta --database-url (o DATABASE_URL)")
+        return None
+
+    # La aplicación lee la configuración al importarse; sin trabajos de generación en este proceso
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('JOB_WORKERS', '0')
+    import app as app_module
+
+    if not app_module.init_database():
+        raise RuntimeError("No se pudo inicializar la base de datos")
+
+    teacher_id, exam_id, codigos = preparar_examen(app_module, args)
+    cliente = ClienteHTTP(args.base_url) if args.base_url else ClienteFlask(app_module.app)
+    tiempos = {'get-exam': [], 'submit-exam': []}
+    # Listas (append es atómico entre hilos): estado HTTP de cada petición fallida
+    errores = {'get-exam': [], 'submit-exam': []}
+
+    try:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = [executor.submit(alumno, cliente, i, codigos, args, tiempos, errores)
+                       for i in range(args.students)]
+            for future in futures:
+                future.result()
+        segundos = time.perf_counter() - inicio
+    finally:
+        if not args.keep:
+            limpiar(app_module, teacher_id, exam_id)
+
+    peticiones = sum(len(v) for v in tiempos.values())
+    errores = {ruta: len(estados) for ruta, estados in errores.items()}
+    resultado = {
+        'students': args.students,
+        'concurrency': args.concurrency,
+        'questions': args.questions,
+        'codes': len(codigos),
+        'client': 'http' if args.base_url else 'flask',
+        'seconds': round(segundos, 4),
+        'requests': peticiones,
+        'rps': round(peticiones / segundos, 1),
+        'errors': errores,
+        'endpoints': {ruta: percentiles(valores) for ruta, valores in tiempos.items()},
+    }
+    print(f"🎓 {args.students} alumnos, concurrencia {args.concurrency}: {segundos:.2f}s, "
+          f"{resultado['rps']} peticiones/s, errores {errores}")
+    for ruta, stats in resultado['endpoints'].items():
+        if stats:
+            print(f"   {ruta:>12}: p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms")
+    return resultado
+
+
+# --- comparación -----------------------------------------------------------
+
+def metricas_comparables(resultados):
+    """Métricas donde menor es mejor, con una clave estable por configuración"""
+    metricas = {}
+    for fila in resultados.get('extract') or []:
+        metricas[f"extract/{fila['pages']}p/{fila['workers']}w/seconds"] = fila['seconds']
+    for fila in resultados.get('generate') or []:
+        metricas[f"generate/{fila['num_questions']}q/c{fila['concurrency']}/seconds"] = fila['seconds']
+    window = resultados.get('window')
+    if window:
+        for ruta, stats in window['endpoints'].items():
+            for p in ('p50_ms', 'p95_ms', 'p99_ms'):
+                if p in stats:
+                    metricas[f"window/{ruta}/{p}"] = stats[p]
+    return metricas
+
+
+def comparar(actual, anterior, tolerancia):
+    """Lista de (métrica, anterior, actual) que empeoraron más de ``tolerancia``"""
+    nuevas = metricas_comparables(actual)
+    viejas = metricas_comparables(anterior)
+    regresiones = []
+    for nombre, valor in sorted(nuevas.items()):
+        base = viejas.get(nombre)
+        if base and valor > base * (1 + tolerancia):
+            regresiones.append((nombre, base, valor))
+    return regresiones
+
+
+def version_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--output", help="archivo JSON de resultados")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="empeoramiento permitido (0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    # extract
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--extract-workers", type=int, nargs="+", default=[1])
+    # generate
+    parser.add_argument("--num-questions", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--llm-concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="segundos por lote del backend local")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    # window
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--base-url", help="servidor ya levantado; sin esto, cliente de Flask en proceso")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--versions", type=int, default=0)
+    parser.add_argument("--time-limit", type=int, default=40)
+    parser.add_argument("--think-ms", type=float, default=0, help="pausa aleatoria entre ver y entregar")
+    parser.add_argument("--keep", action="store_true", help="no borrar los datos creados")
+    args = parser.parse_args()
+
+    resultados = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git': version_git(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'args': {k: v for k, v in vars(args).items() if k != 'database_url'},
+        },
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if 'extract' in args.stages:
+            resultados['extract'] = etapa_extract(args, tmpdir)
+        if 'generate' in args.stages:
+            resultados['generate'] = etapa_generate(args, tmpdir)
+    if 'window' in args.stages:
+        resultados['window'] = etapa_window(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerance)
+        for nombre, antes, ahora in regresiones:
+            print(f"❌ {nombre}: {antes} → {ahora}")
+        if regresiones:
+            sys.exit(1)
+        print("✅ Sin regresiones respecto a la corrida anterior")
+
+
+if __name__ == "__main__":
+    main()
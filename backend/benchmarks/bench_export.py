@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark de exportación de resultados
+
+Compara, para N resultados sintéticos con T temas:
+- anterior: armar la lista completa como /get-student-results y serializarla
+- streaming: utils.export.iter_csv / iter_ndjson sobre filas que llegan de una en una
+  (como las entrega el cursor con nombre)
+
+Reporta tiempo y filas/s; con --memory mide además, en una segunda pasada,
+el pico de memoria de Python con tracemalloc (bastante más lenta).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_export
+    python -m benchmarks.bench_export --rows 100000 --topics 8 --memory
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from utils import export
+
+
+def filas_sinteticas(num_filas, temas, seed=5):
+    """Filas con la forma que devuelve export.iter_results, generadas bajo demanda"""
+    rng = random.Random(seed)
+    inicio = datetime(2024, 1, 1)
+    for i in range(num_filas):
+        topic_scores = {}
+        for tema in rng.sample(temas, k=max(1, len(temas) // 2)):
+            total = rng.randint(2, 10)
+            correct = rng.randint(0, total)
+            percentage = round(correct / total * 100, 2)
+            topic_scores[tema] = {'percentage': percentage, 'status': 'Aprobado' if percentage >= 60 else 'Reprobado',
+                                  'correct': correct, 'total': total}
+        yield {
+            'id': f"{i:08d}-0000-0000-0000-000000000000",
+            'student_name': f"Alumno {i}",
+            'exam_code': f"C{i % 50:05d}",
+            'original_exam_code': f"C{i % 10:05d}",
+            'submitted_at': inicio + timedelta(seconds=i),
+            'correct_answers': rng.randint(0, 40),
+            'total_questions': 40,
+            'overall_percentage': round(rng.random() * 100, 2),
+            'topic_scores': json.dumps(topic_scores),
+        }
+
+
+def exportar_anterior(filas):
+    """Lista completa en memoria y un solo json.dumps, como jsonify"""
+    results = []
+    for row in filas:
+        results.append({
+            'result_id': row['id'],
+            'student_name': row['student_name'],
+            'exam_code': row['exam_code'],
+            'overall_percentage': float(row['overall_percentage']),
+            'submitted_at': row['submitted_at'].isoformat(),
+            'topic_scores': json.loads(row['topic_scores']),
+        })
+    return len(json.dumps({'results': results}))
+
+
+def exportar_streaming(escritor, temas):
+    def funcion(filas):
+        return sum(len(trozo) for trozo in escritor(filas, temas))
+    return funcion
+
+
+def medir(funcion, args, temas):
+    inicio = time.perf_counter()
+    tamano = funcion(filas_sinteticas(args.rows, temas))
+    segundos = time.perf_counter() - inicio
+
+    pico = None
+    if args.memory:
+        tracemalloc.start()
+        funcion(filas_sinteticas(args.rows, temas))
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return segundos, pico, tamano
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--topics", type=int, default=8)
+    parser.add_argument("--memory", action="store_true", help="medir el pico de memoria (tracemalloc)")
+    args = parser.parse_args()
+
+    temas = [f"Tema {i}" for i in range(args.topics)]
+    casos = [
+        ("anterior (JSON)", exportar_anterior),
+        ("streaming CSV", exportar_streaming(export.iter_csv, temas)),
+        ("streaming NDJSON", exportar_streaming(export.iter_ndjson, temas)),
+    ]
+
+    print(f"{args.rows} resultados, {args.topics} temas")
+    print(f"{'modo':>18} {'segundos':>9} {'filas/s':>10} {'pico MB':>8} {'salida MB':>10}")
+    for nombre, funcion in casos:
+        segundos, pico, tamano = medir(funcion, args, temas)
+        memoria = f"{pico / 1e6:>8.1f}" if pico is not None else f"{'-':>8}"
+        print(f"{nombre:>18} {segundos:>9.2f} {args.rows / segundos:>10.0f} {memoria} {tamano / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
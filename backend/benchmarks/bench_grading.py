@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark de calificación
+
+Califica N entregas contra un examen de Q preguntas de dos formas:
+- anterior: decodificar el JSON completo de preguntas y recorrerlo por entrega
+- clave precalculada: utils.grading.grade sobre la clave compacta (ya en caché)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_grading
+    python -m benchmarks.bench_grading --submissions 10000 --questions 100
+"""
+
+import argparse
+import json
+import random
+import time
+
+from utils.grading import build_answer_key, grade, score_percentage
+
+
+def examen_sintetico(num_preguntas, num_temas=8, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "numero": i + 1,
+            "tema": f"Tema {rng.randrange(num_temas)}",
+            "pregunta": "¿Cuál de las siguientes opciones describe mejor el concepto? " * 3,
+            "opciones": {letra: f"Opción {letra} con algo de texto" for letra in "ABCD"},
+            "respuesta_correcta": rng.choice("ABCD"),
+        }
+        for i in range(num_preguntas)
+    ]
+
+
+def entregas_sinteticas(num_entregas, num_preguntas, seed=11):
+    rng = random.Random(seed)
+    return [
+        {str(i): rng.choice("ABCD") for i in range(num_preguntas) if rng.random() < 0.95}
+        for _ in range(num_entregas)
+    ]
+
+
+def calificar_anterior(questions_json, answers):
+    """Lógica anterior de submit_exam (JSON de preguntas decodificado por entrega)"""
+    questions = json.loads(questions_json)
+    correct_answers = 0
+    total_questions = len(questions)
+    topic_scores = {}
+    for i, question in enumerate(questions):
+        topic = question.get('tema', 'General')
+        if topic not in topic_scores:
+            topic_scores[topic] = {'correct': 0, 'total': 0}
+        topic_scores[topic]['total'] += 1
+        if str(i) in answers and answers[str(i)] == question.get('respuesta_correcta'):
+            correct_answers += 1
+            topic_scores[topic]['correct'] += 1
+    topic_percentages = {}
+    for topic, scores in topic_scores.items():
+        percentage = (scores['correct'] / scores['total']) * 100
+        topic_percentages[topic] = {
+            'percentage': round(percentage, 2),
+            'status': 'Aprobado' if percentage >= 60 else 'Reprobado',
+            'correct': scores['correct'],
+            'total': scores['total']
+        }
+    return correct_answers, total_questions, topic_percentages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=10_000)
+    parser.add_argument("--questions", type=int, default=100)
+    args = parser.parse_args()
+
+    questions = examen_sintetico(args.questions)
+    questions_json = json.dumps(questions)
+    answer_key = build_answer_key(questions)
+    entregas = entregas_sinteticas(args.submissions, args.questions)
+
+    inicio = time.perf_counter()
+    anteriores = [calificar_anterior(questions_json, answers) for answers in entregas]
+    t_anterior = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    nuevos = [grade(answer_key, answers) for answers in entregas]
+    t_nuevo = time.perf_counter() - inicio
+
+    if anteriores != nuevos:
+        print("⚠ Las calificaciones no coinciden")
+
+    promedio = sum(score_percentage(c, t) for c, t, _ in nuevos) / len(nuevos)
+    print(f"{args.submissions} entregas x {args.questions} preguntas (promedio {promedio:.1f}%)")
+    print(f"  anterior:          {t_anterior:8.3f}s  {args.submissions / t_anterior:10.0f} entregas/s")
+    print(f"  clave precalculada:{t_nuevo:8.3f}s  {args.submissions / t_nuevo:10.0f} entregas/s")
+    print(f"  speedup: {t_anterior / t_nuevo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark del análisis de reactivos
+
+Simula N entregas de un examen de Q preguntas repartidas entre V versiones
+(permutaciones) y mide por separado:
+- armar la matriz alumno × pregunta en el orden original (build_matrix)
+- calcular dificultad, discriminación, distractores y alfa (analyze)
+
+El objetivo es que 10k entregas tarden bastante menos de un segundo.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_item_analysis
+    python -m benchmarks.bench_item_analysis --submissions 10000 --questions 100 --versions 5
+"""
+
+import argparse
+import json
+import random
+import time
+
+from utils import item_analysis
+from utils.versions import build_versions, materialize
+from benchmarks.bench_grading import examen_sintetico
+
+
+def entregas_por_version(questions, num_submissions, num_versions, seed=13):
+    """Respuestas sintéticas: cada alumno tiene una habilidad y acierta más o menos"""
+    rng = random.Random(seed)
+    orders = [list(range(len(questions)))]
+    orders += [json.loads(v['permutation'])['order']
+               for v in build_versions(questions, num_versions - 1, rng=rng)]
+    groups = [(order, []) for order in orders]
+
+    for s in range(num_submissions):
+        order, answers_list = groups[s % len(groups)]
+        habilidad = rng.random()
+        answers = {}
+        for j, i in enumerate(order):
+            if rng.random() < 0.03:
+                continue
+            correcta = questions[i]['respuesta_correcta']
+            answers[str(j)] = correcta if rng.random() < 0.3 + 0.6 * habilidad else rng.choice("ABCD")
+        answers_list.append(answers)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=10_000)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--versions", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    questions = examen_sintetico(args.questions)
+    groups = entregas_por_version(questions, args.submissions, args.versions)
+
+    # Comprobación: una versión reordenada debe caer en las columnas correctas
+    order, answers_list = groups[-1]
+    version = materialize(questions, {'order': order, 'options': [None] * len(order)})
+    perfecta = {str(j): q['respuesta_correcta'] for j, q in enumerate(version)}
+    choices, alphabet = item_analysis.build_matrix(questions, [(order, [perfecta])])
+    if item_analysis.analyze(questions, choices, alphabet)['items'][0]['difficulty'] != 1.0:
+        print("⚠ Las versiones no se reordenaron al orden original")
+
+    t_matriz = t_analisis = float("inf")
+    for _ in range(args.repeat):
+        inicio = time.perf_counter()
+        choices, alphabet = item_analysis.build_matrix(questions, groups)
+        medio = time.perf_counter()
+        report = item_analysis.analyze(questions, choices, alphabet)
+        fin = time.perf_counter()
+        t_matriz = min(t_matriz, medio - inicio)
+        t_analisis = min(t_analisis, fin - medio)
+
+    dificultad = sum(item['difficulty'] for item in report['items']) / len(report['items'])
+    print(f"{args.submissions} entregas x {args.questions} preguntas en {args.versions} versiones")
+    print(f"  matriz:   {t_matriz:8.3f}s")
+    print(f"  análisis: {t_analisis:8.3f}s")
+    print(f"  total:    {t_matriz + t_analisis:8.3f}s")
+    print(f"  alfa de Cronbach {report['cronbach_alpha']}, dificultad media {dificultad:.3f}")
+
+
+if __name__ == "__main__":
+    main()
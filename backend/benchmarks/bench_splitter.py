@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del separador de preguntas
+
+Compara el tokenizador de una sola pasada (utils.pdf_processor.extraer_preguntas)
+con la versión anterior basada en la regex perezosa con DOTALL, sobre textos
+sintéticos de 1k/10k/100k preguntas. Reporta el rendimiento en MB/s.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_splitter
+    python -m benchmarks.bench_splitter --sizes 1000 10000 --repeat 5
+"""
+
+import argparse
+import random
+import re
+import time
+
+from utils.pdf_processor import extraer_preguntas
+
+
+def extraer_preguntas_regex(texto_completo):
+    """Implementación anterior, conservada solo como referencia"""
+    patron = r'(\d+\.\s.*?)(?=\n\d+\.|\Z)'
+    bloques = re.findall(patron, texto_completo, re.DOTALL)
+    preguntas_limpias = []
+    for b in bloques:
+        pregunta = " ".join(b.split())
+        pregunta = re.split(r'\s[A-E]\)', pregunta)[0]
+        if len(pregunta) > 10:
+            preguntas_limpias.append(pregunta[:500])
+    return preguntas_limpias
+
+
+PALABRAS = (
+    "cuál es la función principal de el la los proceso sistema célula energía "
+    "valor resultado ecuación historia mercado según texto anterior siguiente "
+    "describe explica calcula identifica 3.5 kg (a) 1990"
+).split()
+
+
+def texto_sintetico(num_preguntas, seed=42, ocr=False):
+    """Banco de preguntas con incisos, saltos de línea de PDF y algo de ruido.
+
+    Con ``ocr`` simula un PDF escaneado: pocas líneas numeradas, bloques
+    de texto largos y sin incisos reconocibles.
+    """
+    rng = random.Random(seed)
+    lineas = []
+    for n in range(1, num_preguntas + 1):
+        if ocr:
+            lineas.append(f"{n}. " + " ".join(rng.choice(PALABRAS) for _ in range(10)))
+            lineas.extend(" ".join(rng.choice(PALABRAS) for _ in range(12)) for _ in range(rng.randint(20, 60)))
+            continue
+        enunciado = " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(8, 40)))
+        # Partir el enunciado en varias líneas como lo hace PyMuPDF
+        palabras = enunciado.split()
+        lineas.append(f"{n}. " + " ".join(palabras[:10]))
+        for i in range(10, len(palabras), 10):
+            lineas.append(" ".join(palabras[i:i + 10]))
+        for letra in "ABCD":
+            lineas.append(f"{letra}) " + " ".join(rng.choice(PALABRAS) for _ in range(rng.randint(1, 6))))
+        if rng.random() < 0.05:
+            lineas.append("Página " + str(n // 20 + 1))
+    return "\n".join(lineas)
+
+
+def medir(funcion, texto, repeat):
+    """Mejor tiempo de ``repeat`` ejecuciones (segundos) y el resultado"""
+    mejor = float("inf")
+    resultado = None
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        resultado = funcion(texto)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ocr-sizes", type=int, nargs="*", default=[1_000, 10_000],
+                        help="tamaños para el perfil de PDF escaneado (bloques largos)")
+    args = parser.parse_args()
+
+    casos = [("banco", size, False) for size in args.sizes] + [("ocr", size, True) for size in args.ocr_sizes]
+
+    print(f"{'perfil':>6} {'preguntas':>10} {'MB':>8} {'regex MB/s':>12} {'tokenizador MB/s':>17} {'speedup':>8}")
+    for perfil, size, ocr in casos:
+        texto = texto_sintetico(size, ocr=ocr)
+        mb = len(texto.encode("utf-8")) / 1e6
+
+        t_regex, anterior = medir(extraer_preguntas_regex, texto, args.repeat)
+        t_nuevo, nuevo = medir(extraer_preguntas, texto, args.repeat)
+
+        if anterior != nuevo:
+            print(f"⚠ Resultados distintos con {size} preguntas ({len(anterior)} vs {len(nuevo)})")
+
+        print(f"{perfil:>6} {size:>10} {mb:>8.2f} {mb / t_regex:>12.1f} {mb / t_nuevo:>17.1f} "
+              f"{t_regex / t_nuevo:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
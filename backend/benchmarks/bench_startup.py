@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque en frío
+
+Mide en procesos nuevos (como un worker de gunicorn recién creado):
+- import: ``import app``
+- create_app: construir la aplicación y registrar las rutas
+- primer uso de los módulos que se cargan bajo demanda: extracción de PDF
+  (PyMuPDF), análisis de reactivos (NumPy) y cliente de IA (openai)
+
+Reporta la mediana de --repeat procesos. Con --top muestra los módulos
+más lentos de ``python -X importtime`` al importar la aplicación.
+
+No abre conexiones: si falta DATABASE_URL se usa una ficticia.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --top 15 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Se ejecuta en cada proceso hijo; imprime los tiempos en JSON
+SCRIPT = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+import utils.pdf_processor
+utils.pdf_processor._fitz()
+t3 = time.perf_counter()
+import utils.item_analysis
+t4 = time.perf_counter()
+try:
+    import openai
+except ImportError:
+    pass
+t5 = time.perf_counter()
+print(json.dumps({
+    'import_app_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_pdf_ms': (t3 - t2) * 1000,
+    'first_item_analysis_ms': (t4 - t3) * 1000,
+    'first_llm_client_ms': (t5 - t4) * 1000,
+}))
+"""
+
+
+def entorno():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'postgresql://bench@127.0.0.1:1/bench')
+    # Sin hilos de generación: solo se mide el arranque
+    env['JOB_WORKERS'] = '0'
+    return env
+
+
+def medir(repeat):
+    corridas = []
+    for _ in range(repeat):
+        salida = subprocess.run([sys.executable, '-c', SCRIPT], capture_output=True, text=True,
+                                env=entorno(), check=True).stdout
+        corridas.append(json.loads(salida.strip().splitlines()[-1]))
+    return {clave: round(statistics.median(c[clave] for c in corridas), 1) for clave in corridas[0]}
+
+
+def modulos_lentos(top):
+    """Imports directos de app con mayor tiempo acumulado según -X importtime"""
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], capture_output=True,
+                            text=True, env=entorno(), check=True).stderr
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or '|' not in linea:
+            continue
+        _, acumulado, modulo = linea.split('|')
+        # La sangría indica el nivel: " app" y "   flask" (importado por app)
+        nivel = (len(modulo) - len(modulo.lstrip()) - 1) // 2
+        if nivel != 1 or not acumulado.strip().isdigit():
+            continue
+        filas.append((int(acumulado), modulo.strip()))
+    return sorted(filas, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="mostrar los N imports más lentos")
+    parser.add_argument("--output", help="archivo JSON de resultados")
+    args = parser.parse_args()
+
+    resultados = {'repeat': args.repeat, 'median_ms': medir(args.repeat)}
+    for clave, ms in resultados['median_ms'].items():
+        print(f"{clave:>24}: {ms:>8.1f} ms")
+    arranque = resultados['median_ms']['import_app_ms'] + resultados['median_ms']['create_app_ms']
+    print(f"{'arranque del worker':>24}: {arranque:>8.1f} ms")
+
+    if args.top:
+        resultados['slowest_imports'] = [{'module': m, 'cumulative_ms': round(us / 1000, 1)}
+                                         for us, m in modulos_lentos(args.top)]
+        print("\nImports más lentos (acumulado):")
+        for fila in resultados['slowest_imports']:
+            print(f"  {fila['cumulative_ms']:>8.1f} ms  {fila['module']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+        print(f"💾 Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
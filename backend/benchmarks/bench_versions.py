@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark de generación de versiones
+
+Genera V versiones de un examen de Q preguntas de dos formas:
+- anterior: por versión, mezclar (modificando las opciones compartidas),
+  json.dumps de la lista completa y un INSERT individual
+- por lotes: utils.versions.build_versions + un solo INSERT multi-fila
+
+Sin --database-url usa un cursor simulado que cuenta los viajes a la base
+de datos y agrega --rtt-ms de latencia por viaje. Con --database-url mide
+contra Postgres real dentro de una transacción que se revierte al final.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_versions
+    python -m benchmarks.bench_versions --versions 100 --questions 200 --rtt-ms 2
+    python -m benchmarks.bench_versions --database-url postgresql://...
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+
+import psycopg2
+
+from utils.grading import build_answer_key
+from utils.versions import build_versions, insert_versions
+from benchmarks.bench_grading import examen_sintetico
+
+
+class CursorSimulado:
+    """Cursor mínimo compatible con execute_values que cuenta los viajes"""
+
+    class _Conexion:
+        encoding = 'UTF8'
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.connection = self._Conexion()
+
+    def mogrify(self, sql, args):
+        if isinstance(sql, bytes):
+            sql = sql.decode()
+        valores = tuple("'" + str(a).replace("'", "''") + "'" for a in args)
+        return (sql % valores).encode()
+
+    def execute(self, sql, args=None):
+        if args is not None:
+            sql = self.mogrify(sql, args)
+        self.round_trips += 1
+        self.bytes_sent += len(sql)
+        if self.rtt:
+            time.sleep(self.rtt)
+
+
+class CursorContado:
+    """Envuelve un cursor real para contar los execute()"""
+
+    def __init__(self, cur):
+        self._cur = cur
+        self.round_trips = 0
+
+    def execute(self, *args):
+        self.round_trips += 1
+        return self._cur.execute(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+def versiones_anterior(cur, exam_id, questions, num_versions, time_limit=60):
+    """Lógica anterior de generate_exam_versions (un INSERT por versión)"""
+    for _ in range(num_versions):
+        version_id = str(uuid.uuid4())
+        version_code = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
+        shuffled_questions = questions.copy()
+        random.shuffle(shuffled_questions)
+        for question in shuffled_questions:
+            if 'opciones' in question:
+                options = list(question['opciones'].items())
+                random.shuffle(options)
+                question['opciones'] = dict(options)
+        cur.execute("""
+            INSERT INTO exam_versions (id, original_exam_id, version_code, questions, time_limit, answer_key)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (version_id, exam_id, version_code, json.dumps(shuffled_questions), time_limit,
+              json.dumps(build_answer_key(shuffled_questions))))
+
+
+def versiones_lote(cur, exam_id, questions, num_versions, time_limit=60):
+    insert_versions(cur, exam_id, time_limit, build_versions(questions, num_versions))
+
+
+def medir_simulado(funcion, questions, args):
+    cur = CursorSimulado(args.rtt_ms / 1000)
+    inicio = time.perf_counter()
+    funcion(cur, 'bench', questions, args.versions)
+    return time.perf_counter() - inicio, cur.round_trips
+
+
+def medir_postgres(funcion, questions, args):
+    conn = psycopg2.connect(args.database_url)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO exams (id, teacher_id, exam_code, questions, time_limit)
+            SELECT %s, id, %s, %s, 60 FROM teachers LIMIT 1
+            RETURNING id
+        """, (str(uuid.uuid4()), 'B' + uuid.uuid4().hex[:9].upper(), json.dumps(questions)))
+        row = cur.fetchone()
+        if not row:
+            raise SystemExit("Se necesita al menos un registro en teachers para medir contra Postgres")
+        exam_id = row[0]
+        contado = CursorContado(cur)
+        inicio = time.perf_counter()
+        funcion(contado, exam_id, questions, args.versions)
+        return time.perf_counter() - inicio, contado.round_trips
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--versions", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="latencia simulada por viaje")
+    parser.add_argument("--database-url", help="medir contra Postgres real (se revierte)")
+    args = parser.parse_args()
+
+    medir = medir_postgres if args.database_url else medir_simulado
+    destino = "Postgres" if args.database_url else f"cursor simulado, {args.rtt_ms:g} ms por viaje"
+
+    # La versión anterior modifica las preguntas: cada medición usa su propia copia
+    t_anterior, viajes_anterior = medir(versiones_anterior, json.loads(json.dumps(examen_sintetico(args.questions))), args)
+    questions = examen_sintetico(args.questions)
+    original = json.dumps(questions)
+    t_lote, viajes_lote = medir(versiones_lote, questions, args)
+
+    if json.dumps(questions) != original:
+        print("⚠ build_versions modificó las preguntas originales")
+
+    print(f"{args.versions} versiones x {args.questions} preguntas ({destino})")
+    print(f"  anterior:  {t_anterior:8.3f}s  {viajes_anterior:5d} viajes")
+    print(f"  por lotes: {t_lote:8.3f}s  {viajes_lote:5d} viajes")
+    print(f"  speedup: {t_anterior / t_lote:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
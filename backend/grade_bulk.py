@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Script para calificar hojas de respuestas en lote (exámenes en papel o sin conexión)
+Califica todo el archivo en memoria y guarda los resultados en una sola transacción
+
+Uso:
+    python grade_bulk.py respuestas.csv
+    python grade_bulk.py respuestas.json --dry-run
+    python grade_bulk.py respuestas.csv --report reporte.json
+"""
+
+import argparse
+import json
+import os
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from utils.bulk_grading import BulkFormatError, parse_submissions, grade_and_store, summarize
+
+# Cargar variables de entorno
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Calificar hojas de respuestas en lote")
+    parser.add_argument("file", help="archivo .csv o .json con las entregas")
+    parser.add_argument("--format", choices=["csv", "json"], help="formato (por defecto según la extensión)")
+    parser.add_argument("--dry-run", action="store_true", help="calificar sin guardar en la base de datos")
+    parser.add_argument("--report", help="guardar el resumen completo en este archivo JSON")
+    args = parser.parse_args()
+
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    if not DATABASE_URL:
+        print("❌ Error: No se encontró DATABASE_URL en las variables de entorno")
+        return 1
+
+    fmt = args.format or ('csv' if args.file.lower().endswith('.csv') else 'json')
+    try:
+        with open(args.file, encoding='utf-8-sig') as f:
+            rows = parse_submissions(f.read(), fmt)
+    except (OSError, BulkFormatError) as e:
+        print(f"❌ Error leyendo {args.file}: {e}")
+        return 1
+
+    print(f"🔄 Calificando {len(rows)} filas de {args.file}...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.RealDictCursor)
+        try:
+            records, errors = grade_and_store(conn, rows, dry_run=args.dry_run)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"❌ Error guardando resultados: {e}")
+        return 1
+
+    summary = summarize(records, errors, dry_run=args.dry_run)
+    if args.dry_run:
+        print(f"✅ {summary['graded']} filas calificadas (dry-run: no se guardó nada)")
+    else:
+        print(f"✅ {summary['inserted']} resultados guardados")
+
+    if errors:
+        print(f"⚠️ {len(errors)} filas con errores:")
+        for error in errors[:20]:
+            print(f"   - fila {error['row']}: {error['error']}")
+        if len(errors) > 20:
+            print(f"   ... y {len(errors) - 20} más")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"📋 Reporte guardado en {args.report}")
+
+    return 0 if not errors else 2
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,36 @@
+"""Configuración de gunicorn (se carga sola al ejecutar ``gunicorn app:app`` desde backend/)
+
+``app:app`` construye la aplicación con ``create_app()`` en cada worker,
+después del fork; ``gunicorn 'app:create_app()'`` es equivalente.
+
+Por defecto cada worker es cooperativo (gevent): mientras una solicitud
+espera a Postgres o a la IA, el mismo proceso atiende a los demás alumnos.
+WEB_WORKER_CLASS=sync (o gthread) vuelve al modelo de un hilo por solicitud.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = os.getenv('WEB_WORKER_CLASS', 'gevent')
+# Solicitudes simultáneas por worker con gevent (hilos con gthread)
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', 1000))
+threads = int(os.getenv('WEB_THREADS', 1))
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    """Hacer que psycopg2 ceda el turno a otros greenlets mientras espera a Postgres"""
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info("psycopg2 en modo cooperativo (psycogreen)")
+
+
+def worker_exit(server, worker):
+    """Devolver a la cola los trabajos de generación en curso y cerrar el pool del worker"""
+    import app
+    app.shutdown()
+    server.log.info("Worker %s: trabajos devueltos a la cola y pool cerrado", worker.pid)
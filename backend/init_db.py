@@ -8,6 +8,7 @@ import os
 import psycopg2
 import psycopg2.extras
 from dotenv import load_dotenv
+from utils.schema import TABLES, create_schema
 
 # Cargar variables de entorno
 load_dotenv()
@@ -25,70 +26,7 @@ def init_database():
         conn = psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.RealDictCursor)
         cur = conn.cursor()
         
-        print("🔄 Creando tabla 'teachers'...")
-        # Tabla de maestros
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS teachers (
-                id VARCHAR(36) PRIMARY KEY,
-                name VARCHAR(200) NOT NULL,
-                email VARCHAR(200) UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        print("🔄 Creando tabla 'exams'...")
-        # Tabla de exámenes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS exams (
-                id VARCHAR(36) PRIMARY KEY,
-                teacher_id VARCHAR(36) REFERENCES teachers(id),
-                exam_code VARCHAR(10) UNIQUE NOT NULL,
-                questions JSONB NOT NULL,
-                time_limit INTEGER DEFAULT 40,
-                difficulty VARCHAR(20) DEFAULT 'medium',
-                versions INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        print("🔄 Creando tabla 'exam_versions'...")
-        # Tabla de versiones de exámenes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS exam_versions (
-                id VARCHAR(36) PRIMARY KEY,
-                original_exam_id VARCHAR(36) REFERENCES exams(id),
-                version_code VARCHAR(10) UNIQUE NOT NULL,
-                questions JSONB NOT NULL,
-                time_limit INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        print("🔄 Creando tabla 'student_results'...")
-        # Tabla de resultados de estudiantes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS student_results (
-                id VARCHAR(36) PRIMARY KEY,
-                student_name VARCHAR(200) NOT NULL,
-                exam_code VARCHAR(10) NOT NULL,
-                exam_id VARCHAR(36),
-                answers JSONB,
-                correct_answers INTEGER,
-                total_questions INTEGER,
-                overall_percentage DECIMAL(5,2),
-                topic_scores JSONB,
-                submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        print("🔄 Creando índices para mejor rendimiento...")
-        # Índices para mejorar rendimiento
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_teachers_email ON teachers(email)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_exams_teacher_id ON exams(teacher_id)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_exams_code ON exams(exam_code)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_versions_code ON exam_versions(version_code)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_results_exam_code ON student_results(exam_code)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_results_submitted_at ON student_results(submitted_at)")
+        create_schema(cur, log=print)
         
         conn.commit()
         cur.close()
@@ -96,10 +34,8 @@ def init_database():
         
         print("✅ Base de datos inicializada correctamente")
         print("📋 Tablas creadas:")
-        print("   - teachers (maestros)")
-        print("   - exams (exámenes)")
-        print("   - exam_versions (versiones de exámenes)")
-        print("   - student_results (resultados de estudiantes)")
+        for name, description, _ in TABLES:
+            print(f"   - {name} ({description})")
         print("📈 Índices creados para optimizar consultas")
         
         return True
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Script para convertir las versiones guardadas como copia completa del examen
+al formato compacto (permutación del examen original)
+
+Las filas que no son una permutación exacta del original se dejan igual:
+siguen funcionando porque la copia completa tiene prioridad.
+
+Uso:
+    python migrate_versions.py             # convertir y mostrar el ahorro
+    python migrate_versions.py --dry-run   # solo calcular el ahorro
+    python migrate_versions.py --vacuum    # además, devolver el espacio al disco
+"""
+
+import argparse
+import json
+import os
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+from utils.schema import create_schema
+from utils.grading import build_answer_key
+from utils.versions import infer_permutation
+
+# Cargar variables de entorno
+load_dotenv()
+
+
+def formato_bytes(n):
+    if abs(n) < 1024:
+        return f"{n} B"
+    for unidad in ('KB', 'MB', 'GB'):
+        n /= 1024
+        if abs(n) < 1024 or unidad == 'GB':
+            return f"{n:.1f} {unidad}"
+
+
+def tamano_tabla(cur):
+    cur.execute("SELECT pg_total_relation_size('exam_versions') AS size")
+    return cur.fetchone()['size']
+
+
+def migrar(conn, dry_run=False, batch_size=200):
+    """Convertir las versiones pendientes, por lotes. Devuelve el resumen."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id FROM exam_versions
+        WHERE questions IS NOT NULL AND permutation IS NULL
+        ORDER BY original_exam_id
+    """)
+    pendientes = [row['id'] for row in cur.fetchall()]
+
+    resumen = {'pendientes': len(pendientes), 'convertidas': 0, 'omitidas': 0,
+               'bytes_antes': 0, 'bytes_despues': 0}
+    originales = {}
+
+    for inicio in range(0, len(pendientes), batch_size):
+        cur.execute("""
+            SELECT id, original_exam_id, questions, answer_key,
+                   pg_column_size(questions) AS questions_size
+            FROM exam_versions WHERE id = ANY(%s)
+        """, (pendientes[inicio:inicio + batch_size],))
+        filas = cur.fetchall()
+
+        faltantes = {row['original_exam_id'] for row in filas} - originales.keys()
+        if faltantes:
+            cur.execute("SELECT id, questions FROM exams WHERE id = ANY(%s)", (list(faltantes),))
+            for exam in cur.fetchall():
+                originales[exam['id']] = exam['questions']
+
+        cambios = []
+        for row in filas:
+            original = originales.get(row['original_exam_id'])
+            permutation = infer_permutation(original, row['questions']) if original is not None else None
+            if permutation is None:
+                resumen['omitidas'] += 1
+                continue
+            permutation_json = json.dumps(permutation, separators=(',', ':'))
+            answer_key = row['answer_key'] or build_answer_key(row['questions'])
+            cambios.append((row['id'], permutation_json, json.dumps(answer_key)))
+            resumen['bytes_antes'] += row['questions_size']
+            resumen['bytes_despues'] += len(permutation_json.encode('utf-8'))
+
+        if cambios and not dry_run:
+            psycopg2.extras.execute_values(cur, """
+                UPDATE exam_versions AS ev
+                SET permutation = v.permutation::jsonb, answer_key = v.answer_key::jsonb, questions = NULL
+                FROM (VALUES %s) AS v(id, permutation, answer_key)
+                WHERE ev.id = v.id
+            """, cambios)
+            conn.commit()
+        resumen['convertidas'] += len(cambios)
+        print(f"   ... {min(inicio + batch_size, len(pendientes))}/{len(pendientes)} revisadas")
+
+    conn.rollback()
+    cur.close()
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convertir versiones de examen a permutaciones")
+    parser.add_argument("--dry-run", action="store_true", help="calcular el ahorro sin modificar nada")
+    parser.add_argument("--vacuum", action="store_true", help="ejecutar VACUUM FULL exam_versions al terminar")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    if not DATABASE_URL:
+        print("❌ Error: No se encontró DATABASE_URL en las variables de entorno")
+        return 1
+
+    try:
+        print("🔄 Conectando a la base de datos...")
+        conn = psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.RealDictCursor)
+        cur = conn.cursor()
+        create_schema(cur)
+        conn.commit()
+        tabla_antes = tamano_tabla(cur)
+        cur.close()
+
+        print("🔄 Convirtiendo versiones...")
+        resumen = migrar(conn, dry_run=args.dry_run, batch_size=args.batch_size)
+
+        if args.vacuum and not args.dry_run:
+            print("🔄 Ejecutando VACUUM FULL exam_versions...")
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("VACUUM FULL exam_versions")
+            conn.autocommit = False
+
+        with conn.cursor() as cur:
+            tabla_despues = tamano_tabla(cur)
+        conn.close()
+    except Exception as e:
+        print(f"❌ Error en la migración: {e}")
+        return 1
+
+    ahorro = resumen['bytes_antes'] - resumen['bytes_despues']
+    accion = "se convertirían" if args.dry_run else "convertidas"
+    print(f"✅ {resumen['convertidas']} de {resumen['pendientes']} versiones {accion}")
+    if resumen['omitidas']:
+        print(f"⚠️ {resumen['omitidas']} versiones no coinciden con su examen original y se dejaron completas")
+    print("📋 Reporte de almacenamiento:")
+    print(f"   - preguntas en las filas convertidas: {formato_bytes(resumen['bytes_antes'])}")
+    print(f"   - permutaciones que las reemplazan:   {formato_bytes(resumen['bytes_despues'])}")
+    print(f"   - ahorro estimado:                    {formato_bytes(ahorro)}")
+    print(f"   - tamaño de exam_versions:            {formato_bytes(tabla_antes)} -> {formato_bytes(tabla_despues)}")
+    if not args.vacuum and not args.dry_run and ahorro > 0:
+        print("   (el espacio vuelve al disco tras VACUUM; usa --vacuum para compactar ahora)")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
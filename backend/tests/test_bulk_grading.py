@@ -0,0 +1,61 @@
+"""Calificación masiva con filas JSON de tipos mezclados"""
+
+import json
+
+from utils.bulk_grading import grade_and_store, parse_json
+from utils.grading import build_answer_key
+
+
+class FakeCursor:
+    """Cursor mínimo: responde a la consulta de claves de load_answer_keys"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        codes = self.queries[-1][1][0]
+        return [row for row in self.rows if row['code'] in codes]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def rollback(self):
+        pass
+
+
+def test_mixed_type_exam_codes_are_row_errors():
+    answer_key = build_answer_key([
+        {'tema': 'Álgebra', 'respuesta_correcta': 'A'},
+        {'tema': 'Álgebra', 'respuesta_correcta': 'B'},
+    ])
+    cur = FakeCursor([{
+        'code': 'ABC123', 'exam_id': 'e1', 'original_exam_id': 'e1', 'is_version': False,
+        'answer_key': answer_key, 'questions': None, 'permutation': None,
+    }])
+    rows = parse_json(json.dumps([
+        {'student_name': 'Ana', 'exam_code': ' ABC123 ', 'answers': {'0': 'A', '1': 'C'}},
+        {'student_name': 'Luis', 'exam_code': ['ABC123'], 'answers': {'0': 'A'}},
+        {'student_name': 'Eva', 'exam_code': 123456, 'answers': {'0': 'A'}},
+        {'student_name': 'Sol', 'exam_code': {'code': 'ABC123'}, 'answers': {'0': 'A'}},
+    ]))
+
+    records, errors = grade_and_store(FakeConnection(cur), rows, dry_run=True)
+
+    assert [r['row'] for r in records] == [1]
+    assert records[0]['exam_code'] == 'ABC123'
+    assert records[0]['correct_answers'] == 1
+    assert [e['row'] for e in errors] == [2, 3, 4]
+    # Solo códigos de texto llegan a la consulta
+    assert cur.queries[0][1] == (['ABC123'],)
@@ -0,0 +1,54 @@
+"""Llamadas a la IA por lote con el backend local (stub)"""
+
+import pytest
+
+from utils import llm
+from utils.jobs import JobLost
+from utils.pdf_processor import _procesar_lote, llamar_ia_para_lote
+
+LOTE = [{"num": i + 1, "texto": f"¿Pregunta {i + 1}?"} for i in range(4)]
+
+
+@pytest.fixture
+def stub():
+    backend = llm.StubBackend(latency=0, jitter=0)
+    llm.set_backend(backend)
+    yield backend
+    llm.set_backend(None)
+
+
+class CutStream(llm.StubBackend):
+    """Entrega parte de la respuesta y luego falla, como un stream que se corta"""
+
+    def generate(self, prompt, lote, timeout, stream, usage):
+        for i, trozo in enumerate(super().generate(prompt, lote, timeout, True, usage)):
+            if i == 8:
+                raise ConnectionError("stream cortado")
+            yield trozo
+
+
+def test_job_lost_in_on_question_propagates(stub):
+    llamadas = []
+
+    def on_question(pregunta):
+        raise JobLost("otro worker reclamó el trabajo")
+
+    def on_attempt():
+        llamadas.append(1)
+
+    with pytest.raises(JobLost):
+        _procesar_lote(LOTE, 'medium', 30, None, None, False, [], on_question, on_attempt)
+    # Sin reintentos para un trabajo que ya no es de este worker
+    assert len(llamadas) == 1
+
+
+def test_stream_error_keeps_received_questions():
+    llm.set_backend(CutStream(latency=0, jitter=0))
+    try:
+        metrics = {}
+        resultado = llamar_ia_para_lote(LOTE, 'medium', 30, metrics, stream=True)
+    finally:
+        llm.set_backend(None)
+
+    assert 'stream cortado' in metrics['error']
+    assert 0 < len(resultado['preguntas']) < len(LOTE)
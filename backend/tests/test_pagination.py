@@ -0,0 +1,27 @@
+"""Paginación por cursor de los listados del maestro"""
+
+from datetime import datetime
+
+from utils.pagination import NULL_TIMESTAMP, decode_cursor, paginate
+
+
+def test_page_ending_on_null_timestamp_gets_a_cursor():
+    rows = [
+        {'id': 'b', 'created_at': datetime(2024, 5, 1, 12, 0)},
+        {'id': 'a', 'created_at': None},
+        {'id': 'c', 'created_at': None},
+    ]
+
+    page, next_cursor = paginate(rows, 2, 'created_at')
+
+    assert [row['id'] for row in page] == ['b', 'a']
+    assert decode_cursor(next_cursor) == (NULL_TIMESTAMP, 'a')
+
+
+def test_cursor_round_trip():
+    rows = [{'id': 'x', 'created_at': datetime(2024, 5, 1, 12, 30, 15)}, {'id': 'y', 'created_at': datetime(2024, 4, 1)}]
+
+    page, next_cursor = paginate(rows, 1, 'created_at')
+
+    assert decode_cursor(next_cursor) == (datetime(2024, 5, 1, 12, 30, 15), 'x')
+    assert paginate(rows, 5, 'created_at') == (rows, None)
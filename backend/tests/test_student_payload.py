@@ -0,0 +1,34 @@
+"""Respuesta precalculada de /get-exam"""
+
+import gzip
+import json
+
+from utils.student_payload import build_payload
+from utils.versions import materialize
+
+QUESTIONS = [
+    {'numero': i + 1, 'tema': 'Historia', 'pregunta': f'Pregunta {i + 1}',
+     'opciones': {'A': 'uno', 'B': 'dos', 'C': 'tres', 'D': 'cuatro'}, 'respuesta_correcta': 'B'}
+    for i in range(20)
+]
+
+
+def test_permuted_version_keeps_option_order():
+    permutation = {'order': [1, 0] + list(range(2, 20)), 'options': [[2, 0, 3, 1], None] + [[3, 2, 1, 0]] * 18}
+    version = materialize(QUESTIONS, permutation)
+
+    payload = build_payload('v1', 'e1', version, 40, True)
+    body = json.loads(payload['body'])
+
+    assert list(body['questions'][0]['opciones']) == ['C', 'A', 'D', 'B']
+    assert list(body['questions'][1]['opciones']) == ['A', 'B', 'C', 'D']
+    assert list(body['questions'][2]['opciones']) == ['D', 'C', 'B', 'A']
+    assert json.loads(gzip.decompress(payload['gzip'])) == body
+
+
+def test_payload_hides_answers_and_etag_is_stable():
+    first = build_payload('e1', 'e1', QUESTIONS, 40, False)
+    second = build_payload('e1', 'e1', [dict(q) for q in QUESTIONS], 40, False)
+
+    assert b'respuesta_correcta' not in first['body']
+    assert first['etag'] == second['etag']
@@ -0,0 +1,289 @@
+"""Estadísticas por examen mantenidas de forma incremental (tabla exam_stats)
+
+Cada entrega suma su aporte a una fila por examen original (las versiones
+cuentan para su original), así que el panel del maestro lee una sola fila
+sin recorrer ``student_results``:
+
+- suma y suma de cuadrados de las calificaciones (media y desviación)
+- histograma de 101 casillas de un punto (0..100), de donde sale la mediana
+- por tema: intentos, aprobados, aciertos y preguntas
+- por pregunta (en el orden del examen original): número de aciertos
+"""
+
+import json
+import math
+
+from utils.grading import PASSING_PERCENTAGE, build_answer_key, question_results
+from utils.versions import version_questions
+
+HISTOGRAM_BUCKETS = 101
+
+
+def new_delta():
+    """Aporte vacío; se llena con ``add_submission``"""
+    return {
+        'submissions': 0,
+        'score_sum': 0.0,
+        'score_sq_sum': 0.0,
+        'histogram': [0] * HISTOGRAM_BUCKETS,
+        'topics': {},
+        'question_correct': [],
+        'question_submissions': 0,
+    }
+
+
+def add_submission(delta, percentage, topic_scores, question_flags=None, question_order=None):
+    """Sumar una entrega calificada al aporte.
+
+    ``question_flags`` son los aciertos (1/0) en el orden en que se calificó
+    y ``question_order[j]`` el índice en el original de la pregunta ``j``.
+    Sin orden conocido la entrega no cuenta para las estadísticas por pregunta.
+    """
+    percentage = float(percentage)
+    delta['submissions'] += 1
+    delta['score_sum'] += percentage
+    delta['score_sq_sum'] += percentage * percentage
+    delta['histogram'][min(max(int(percentage), 0), HISTOGRAM_BUCKETS - 1)] += 1
+
+    for topic, score in topic_scores.items():
+        stats = delta['topics'].setdefault(topic, {'attempts': 0, 'passed': 0, 'correct': 0, 'total': 0})
+        stats['attempts'] += 1
+        stats['passed'] += score['percentage'] >= PASSING_PERCENTAGE
+        stats['correct'] += score['correct']
+        stats['total'] += score['total']
+
+    if question_flags is not None and question_order is not None:
+        correct = delta['question_correct']
+        if len(correct) < len(question_flags):
+            correct.extend([0] * (len(question_flags) - len(correct)))
+        for flag, original_index in zip(question_flags, question_order):
+            correct[original_index] += flag
+        delta['question_submissions'] += 1
+
+
+def _sumar_listas(a, b):
+    if len(a) < len(b):
+        a = a + [0] * (len(b) - len(a))
+    return [x + (b[i] if i < len(b) else 0) for i, x in enumerate(a)]
+
+
+# Fila de exam_stats sin entregas (base de rebuild)
+_EMPTY_ROW = {
+    'submissions': 0, 'score_sum': 0.0, 'score_sq_sum': 0.0, 'histogram': [0] * HISTOGRAM_BUCKETS,
+    'topic_stats': {}, 'question_correct': [], 'question_submissions': 0,
+}
+
+
+# Espacio de los advisory locks de exam_stats (pg_advisory_xact_lock(clase, id))
+_LOCK_CLASS = 0x5354
+
+
+def _lock_exam(cur, exam_id):
+    """Serializar la creación y el recálculo de la fila del examen hasta el commit"""
+    cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(%s))", (_LOCK_CLASS, exam_id))
+
+
+def _lock_row(cur, exam_id):
+    cur.execute("""
+        SELECT submissions, score_sum, score_sq_sum, histogram, topic_stats,
+               question_correct, question_submissions
+        FROM exam_stats WHERE exam_id = %s FOR UPDATE
+    """, (exam_id,))
+    return cur.fetchone()
+
+
+def _store(cur, exam_id, row, delta):
+    """Escribir ``row`` + ``delta`` en la fila (ya bloqueada) del examen"""
+    topics = row['topic_stats']
+    topics = json.loads(topics) if isinstance(topics, str) else dict(topics or {})
+    for topic, stats in delta['topics'].items():
+        current = topics.setdefault(topic, {'attempts': 0, 'passed': 0, 'correct': 0, 'total': 0})
+        for field, value in stats.items():
+            current[field] = current.get(field, 0) + value
+
+    cur.execute("""
+        UPDATE exam_stats
+        SET submissions = %s, score_sum = %s, score_sq_sum = %s, histogram = %s,
+            topic_stats = %s, question_correct = %s, question_submissions = %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE exam_id = %s
+    """, (row['submissions'] + delta['submissions'],
+          row['score_sum'] + delta['score_sum'],
+          row['score_sq_sum'] + delta['score_sq_sum'],
+          _sumar_listas(row['histogram'], delta['histogram']),
+          json.dumps(topics),
+          _sumar_listas(row['question_correct'] or [], delta['question_correct']),
+          row['question_submissions'] + delta['question_submissions'],
+          exam_id))
+
+
+def apply_delta(cur, exam_id, delta):
+    """Sumar el aporte a la fila del examen (sin commit).
+
+    ``delta`` debe corresponder a resultados ya insertados en
+    ``student_results`` en esta misma transacción. El ``FOR UPDATE`` bloquea
+    la fila hasta el commit, así que entregas simultáneas del mismo examen
+    se suman una tras otra.
+
+    Si el examen aún no tiene fila (p. ej. entregas anteriores a exam_stats)
+    se siembra con ``rebuild``, que ya cuenta las entregas de esta transacción.
+    """
+    if not delta['submissions']:
+        return
+    row = _lock_row(cur, exam_id)
+    if row is None:
+        # Otra transacción puede estar sembrando la fila: esperar y volver a leer
+        _lock_exam(cur, exam_id)
+        row = _lock_row(cur, exam_id)
+        if row is None:
+            rebuild(cur, exam_id)
+            return
+    _store(cur, exam_id, row, delta)
+
+
+def rebuild(cur, exam_id, batch_size=2000):
+    """Recalcular la fila de un examen desde ``student_results`` (sin commit).
+
+    Sirve para exámenes con entregas anteriores a exam_stats. Bloquea el
+    examen y su fila antes de leer las entregas: las que se guarden mientras
+    tanto esperan el commit y después se suman a la fila recalculada, así
+    ninguna se pierde ni se cuenta dos veces.
+    """
+    _lock_exam(cur, exam_id)
+    # La fila queda aunque no haya entregas, para no recalcular en cada consulta
+    cur.execute("""
+        INSERT INTO exam_stats (exam_id, histogram) VALUES (%s, %s)
+        ON CONFLICT (exam_id) DO NOTHING
+    """, (exam_id, [0] * HISTOGRAM_BUCKETS))
+    _lock_row(cur, exam_id)
+
+    cur.execute("""
+        SELECT code, is_version, answer_key, permutation,
+               CASE WHEN answer_key IS NULL THEN questions END AS questions
+        FROM exam_codes WHERE original_exam_id = %s
+    """, (exam_id,))
+    keys = {}
+    for row in cur.fetchall():
+        answer_key = row['answer_key']
+        if answer_key is None:
+            answer_key = build_answer_key(version_questions(row['questions'], row['permutation']))
+        elif isinstance(answer_key, str):
+            answer_key = json.loads(answer_key)
+        keys[row['code']] = (answer_key, question_order(answer_key, row['is_version'], row['permutation']))
+
+    delta = new_delta()
+    cur.execute("""
+        SELECT exam_code, answers, overall_percentage, topic_scores
+        FROM student_results WHERE exam_code = ANY(%s)
+    """, (list(keys),))
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            answer_key, order = keys[row['exam_code']]
+            answers = row['answers'] or {}
+            answers = json.loads(answers) if isinstance(answers, str) else answers
+            topic_scores = row['topic_scores'] or {}
+            topic_scores = json.loads(topic_scores) if isinstance(topic_scores, str) else topic_scores
+            add_submission(delta, row['overall_percentage'] or 0, topic_scores,
+                           question_results(answer_key, answers), order)
+
+    _store(cur, exam_id, _EMPTY_ROW, delta)
+    return delta['submissions']
+
+
+def question_order(answer_key, is_version, permutation):
+    """Índice en el original de cada pregunta calificada, o ``None`` si no se sabe.
+
+    Las versiones guardadas como copia completa (anteriores a las
+    permutaciones, ver migrate_versions.py) no tienen orden conocido.
+    """
+    if not is_version:
+        return list(range(len(answer_key['answers'])))
+    if permutation is None:
+        return None
+    if isinstance(permutation, str):
+        permutation = json.loads(permutation)
+    return permutation['order']
+
+
+def _mediana(histogram, n):
+    """Mediana redondeada al punto, a partir del histograma"""
+    def posicion(k):
+        acumulado = 0
+        for bucket, count in enumerate(histogram):
+            acumulado += count
+            if acumulado > k:
+                return bucket
+        return len(histogram) - 1
+    if n % 2:
+        return float(posicion(n // 2))
+    return (posicion(n // 2 - 1) + posicion(n // 2)) / 2
+
+
+def load(cur, exam_id):
+    """Fila de exam_stats del examen, o ``None`` si aún no existe"""
+    cur.execute("""
+        SELECT submissions, score_sum, score_sq_sum, histogram, topic_stats,
+               question_correct, question_submissions, updated_at
+        FROM exam_stats WHERE exam_id = %s
+    """, (exam_id,))
+    return cur.fetchone()
+
+
+def summarize(row, bins=10):
+    """Respuesta del endpoint a partir de una fila de exam_stats"""
+    n = row['submissions'] if row else 0
+    if not n:
+        return {'submissions': 0, 'mean': None, 'median': None, 'stddev': None,
+                'histogram': [], 'topics': [], 'questions': []}
+
+    mean = row['score_sum'] / n
+    variance = max(row['score_sq_sum'] / n - mean * mean, 0.0)
+    histogram = row['histogram']
+
+    # Casillas de 10 puntos; la última incluye el 100
+    width = (HISTOGRAM_BUCKETS - 1) // bins
+    grouped = []
+    for b in range(bins):
+        start = b * width
+        end = start + width if b < bins - 1 else HISTOGRAM_BUCKETS
+        grouped.append({
+            'range': f"{start}-{min(end, HISTOGRAM_BUCKETS) - 1}",
+            'count': sum(histogram[start:end]),
+        })
+
+    topic_stats = row['topic_stats']
+    topic_stats = json.loads(topic_stats) if isinstance(topic_stats, str) else topic_stats
+    topics = [
+        {
+            'topic': topic,
+            'attempts': stats['attempts'],
+            'pass_rate': round(stats['passed'] / stats['attempts'] * 100, 2) if stats['attempts'] else 0.0,
+            'average_percentage': round(stats['correct'] / stats['total'] * 100, 2) if stats['total'] else 0.0,
+        }
+        for topic, stats in sorted(topic_stats.items())
+    ]
+
+    question_submissions = row['question_submissions']
+    questions = [
+        {
+            'index': i,
+            'correct': correct,
+            'percent_correct': round(correct / question_submissions * 100, 2),
+        }
+        for i, correct in enumerate(row['question_correct'] or [])
+    ] if question_submissions else []
+
+    return {
+        'submissions': n,
+        'mean': round(mean, 2),
+        'median': _mediana(histogram, n),
+        'stddev': round(math.sqrt(variance), 2),
+        'histogram': grouped,
+        'topics': topics,
+        'questions': questions,
+        'question_submissions': question_submissions,
+        'updated_at': row['updated_at'].isoformat() if row.get('updated_at') else None,
+    }
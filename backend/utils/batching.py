@@ -0,0 +1,96 @@
+"""Armado de lotes para la IA según un presupuesto de tokens
+
+En lugar de un número fijo de preguntas por lote, cada lote se llena hasta
+``token_budget`` tokens estimados (prompt + respuesta): las preguntas cortas
+viajan juntas en pocas llamadas y las largas van en lotes pequeños, con
+menos riesgo de que el JSON de la respuesta salga truncado.
+"""
+
+import json
+import math
+import os
+
+# Presupuesto por lote (prompt + respuesta esperada) y tope de preguntas por lote
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", 4000))
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", 10))
+# Tokens que ocupa en la respuesta cada pregunta generada (JSON con 4 opciones)
+LLM_COMPLETION_TOKENS_PER_QUESTION = int(os.getenv("LLM_COMPLETION_TOKENS_PER_QUESTION", 250))
+# Caracteres por token para estimar sin tokenizador (español ~3.5-4)
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", 3.5))
+# Instrucciones y formato del prompt, fijos en cada lote
+PROMPT_OVERHEAD_TOKENS = 220
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / LLM_CHARS_PER_TOKEN)
+
+
+def question_cost(texto):
+    """Tokens estimados que agrega una pregunta: su texto en el prompt y su respuesta"""
+    entrada = json.dumps({"num": 10, "texto": texto}, ensure_ascii=False)
+    return estimate_tokens(entrada) + LLM_COMPLETION_TOKENS_PER_QUESTION
+
+
+def pack_batches(preguntas, token_budget=None, max_batch_size=None):
+    """Repartir las preguntas (textos) en lotes consecutivos dentro del presupuesto.
+
+    Cada lote es una lista de ``{"num", "texto"}`` como la espera el prompt.
+    Una pregunta que sola excede el presupuesto va en un lote propio.
+    """
+    token_budget = token_budget or LLM_BATCH_TOKEN_BUDGET
+    max_batch_size = max_batch_size or LLM_MAX_BATCH_SIZE
+
+    lotes = []
+    actual = []
+    usados = PROMPT_OVERHEAD_TOKENS
+    for texto in preguntas:
+        costo = question_cost(texto)
+        if actual and (usados + costo > token_budget or len(actual) >= max_batch_size):
+            lotes.append(actual)
+            actual = []
+            usados = PROMPT_OVERHEAD_TOKENS
+        actual.append({"num": len(actual) + 1, "texto": texto})
+        usados += costo
+    if actual:
+        lotes.append(actual)
+    return lotes
+
+
+def estimate_batch(lote):
+    """(tokens de prompt, tokens de respuesta) estimados para un lote"""
+    prompt = PROMPT_OVERHEAD_TOKENS + sum(
+        estimate_tokens(json.dumps(item, ensure_ascii=False)) for item in lote
+    )
+    return prompt, LLM_COMPLETION_TOKENS_PER_QUESTION * len(lote)
+
+
+def summarize_metrics(metrics):
+    """Totales de las métricas por llamada registradas durante una generación.
+
+    Si el proveedor no informó los tokens de una llamada se suma la
+    estimación y ``tokens_estimated`` queda en ``True``.
+    """
+    llamadas = [m for m in metrics if not m.get('cached')]
+    prompt_tokens = completion_tokens = 0
+    estimated = False
+    for m in llamadas:
+        if m.get('prompt_tokens') is not None:
+            prompt_tokens += m['prompt_tokens']
+        else:
+            prompt_tokens += m.get('estimated_prompt_tokens') or 0
+            estimated = True
+        if m.get('completion_tokens') is not None:
+            completion_tokens += m['completion_tokens']
+        else:
+            completion_tokens += m.get('completion_tokens_estimated') or 0
+            estimated = True
+    return {
+        'calls': len(llamadas),
+        'cached_batches': len(metrics) - len(llamadas),
+        'retries': sum(1 for m in metrics if m.get('retry')),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'tokens_estimated': estimated,
+        'latency_ms': round(sum(m.get('latency_ms') or 0 for m in llamadas), 1),
+        'max_latency_ms': round(max((m.get('latency_ms') or 0 for m in llamadas), default=0), 1),
+    }
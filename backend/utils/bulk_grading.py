@@ -0,0 +1,231 @@
+"""Calificación masiva de hojas de respuestas (exámenes en papel o sin conexión)
+
+Formatos aceptados:
+- JSON: lista de objetos ``{"student_name", "exam_code", "answers": {"0": "A", ...}}``
+  (o un objeto con esa lista en ``"submissions"``)
+- CSV: columnas ``student_name`` y ``exam_code`` más, para las respuestas,
+  una columna ``answers`` con JSON o una columna por pregunta con el índice
+  como encabezado (``0``, ``1``, ...). Las celdas vacías cuentan como sin responder.
+"""
+
+import csv
+import io
+import json
+import uuid
+
+import psycopg2.extras
+
+from utils.grading import build_answer_key, grade, score_percentage, question_results
+from utils import analytics
+from utils.versions import version_questions
+
+
+class BulkFormatError(ValueError):
+    """El archivo no se puede interpretar en absoluto"""
+
+
+def parse_json(text):
+    """Filas (número, dict) de un JSON de entregas"""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise BulkFormatError(f"JSON inválido: {e}") from e
+    if isinstance(data, dict):
+        data = data.get('submissions')
+    if not isinstance(data, list):
+        raise BulkFormatError("Se esperaba una lista de entregas")
+    return list(enumerate(data, start=1))
+
+
+def parse_csv(text):
+    """Filas (número, dict) de un CSV de hojas de respuestas"""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {'student_name', 'exam_code'} <= set(reader.fieldnames):
+        raise BulkFormatError("El CSV debe tener las columnas student_name y exam_code")
+
+    question_columns = [name for name in reader.fieldnames if name.strip().isdigit()]
+    rows = []
+    # La fila 1 es el encabezado
+    for number, record in enumerate(reader, start=2):
+        if record.get('answers'):
+            try:
+                answers = json.loads(record['answers'])
+            except ValueError:
+                answers = record['answers']  # se reporta como error de la fila
+        else:
+            answers = {
+                name.strip(): record[name].strip().upper()
+                for name in question_columns
+                if record.get(name) and record[name].strip()
+            }
+        rows.append((number, {
+            'student_name': (record.get('student_name') or '').strip(),
+            'exam_code': (record.get('exam_code') or '').strip(),
+            'answers': answers,
+        }))
+    return rows
+
+
+def parse_submissions(text, fmt):
+    """Interpretar un archivo de entregas (``fmt``: "json" o "csv")"""
+    if fmt == 'json':
+        return parse_json(text)
+    if fmt == 'csv':
+        return parse_csv(text)
+    raise BulkFormatError(f"Formato no soportado: {fmt}")
+
+
+def load_answer_keys(cur, exam_codes):
+    """Claves de respuestas de todos los códigos en una sola consulta"""
+    if not exam_codes:
+        return {}
+    cur.execute("""
+        SELECT code, exam_id, original_exam_id, is_version, answer_key,
+               CASE WHEN answer_key IS NULL THEN questions END AS questions, permutation
+        FROM exam_codes WHERE code = ANY(%s)
+    """, (list(exam_codes),))
+
+    keys = {}
+    for row in cur.fetchall():
+        answer_key = row['answer_key']
+        if answer_key is None:
+            answer_key = build_answer_key(version_questions(row['questions'], row['permutation']))
+        elif isinstance(answer_key, str):
+            answer_key = json.loads(answer_key)
+        keys[row['code']] = {
+            'exam_id': row['exam_id'],
+            'original_exam_id': row['original_exam_id'],
+            'is_version': row['is_version'],
+            'answer_key': answer_key,
+            'question_order': analytics.question_order(answer_key, row['is_version'], row['permutation']),
+        }
+    return keys
+
+
+def _exam_code(row):
+    """Código de la fila sin espacios, o ``None`` si falta o no es texto"""
+    code = row.get('exam_code')
+    if not isinstance(code, str):
+        return None
+    return code.strip() or None
+
+
+def grade_rows(rows, answer_keys):
+    """Calificar todas las filas en memoria.
+
+    Devuelve (registros, errores): los registros están listos para
+    ``insert_results`` y cada error es ``{"row": n, "error": "..."}``.
+    """
+    records = []
+    errors = []
+    for number, row in rows:
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'error': 'La fila no es un objeto'})
+            continue
+
+        student_name = row.get('student_name')
+        exam_code = _exam_code(row)
+        answers = row.get('answers')
+
+        if not student_name or not isinstance(student_name, str):
+            errors.append({'row': number, 'error': 'Falta student_name'})
+            continue
+        if not exam_code:
+            errors.append({'row': number, 'error': 'Falta exam_code o no es texto'})
+            continue
+        if not isinstance(answers, dict):
+            errors.append({'row': number, 'error': 'answers debe ser un objeto índice -> opción'})
+            continue
+
+        exam = answer_keys.get(exam_code)
+        if not exam:
+            errors.append({'row': number, 'error': f'Exam not found: {exam_code}'})
+            continue
+
+        correct, total, topic_percentages = grade(exam['answer_key'], answers)
+        records.append({
+            'row': number,
+            'result_id': str(uuid.uuid4()),
+            'student_name': student_name[:200],
+            'exam_code': exam_code,
+            'exam_id': exam['exam_id'],
+            'original_exam_id': exam['original_exam_id'],
+            'answers': answers,
+            'correct_answers': correct,
+            'total_questions': total,
+            'overall_percentage': score_percentage(correct, total),
+            'topic_scores': topic_percentages,
+            'question_flags': question_results(exam['answer_key'], answers),
+            'question_order': exam['question_order'],
+        })
+    return records, errors
+
+
+def insert_results(cur, records, page_size=1000):
+    """Insertar todos los resultados con INSERT multi-fila (sin commit)"""
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO student_results
+        (id, student_name, exam_code, exam_id, answers, correct_answers,
+         total_questions, overall_percentage, topic_scores)
+        VALUES %s
+    """, [
+        (r['result_id'], r['student_name'], r['exam_code'], r['exam_id'], json.dumps(r['answers']),
+         r['correct_answers'], r['total_questions'], r['overall_percentage'], json.dumps(r['topic_scores']))
+        for r in records
+    ], page_size=page_size)
+
+
+def update_stats(cur, records):
+    """Sumar los resultados a exam_stats con una actualización por examen"""
+    deltas = {}
+    for r in records:
+        delta = deltas.setdefault(r['original_exam_id'], analytics.new_delta())
+        analytics.add_submission(delta, r['overall_percentage'], r['topic_scores'],
+                                 r['question_flags'], r['question_order'])
+    # Orden fijo para que dos cargas simultáneas no se bloqueen entre sí
+    for exam_id in sorted(deltas):
+        analytics.apply_delta(cur, exam_id, deltas[exam_id])
+
+
+def grade_and_store(conn, rows, dry_run=False):
+    """Calificar ``rows`` y guardar los válidos en una sola transacción.
+
+    Devuelve (registros, errores). Con ``dry_run`` no se escribe nada.
+    """
+    cur = conn.cursor()
+    # Solo códigos de texto: las filas con otro tipo se reportan en grade_rows
+    codes = {code for code in (_exam_code(row) for _, row in rows if isinstance(row, dict)) if code}
+    answer_keys = load_answer_keys(cur, codes)
+    records, errors = grade_rows(rows, answer_keys)
+
+    if records and not dry_run:
+        insert_results(cur, records)
+        update_stats(cur, records)
+        conn.commit()
+    else:
+        conn.rollback()
+    cur.close()
+    return records, errors
+
+
+def summarize(records, errors, dry_run=False):
+    """Respuesta/resumen común para el endpoint y el CLI"""
+    return {
+        'success': not errors,
+        'dry_run': dry_run,
+        'graded': len(records),
+        'inserted': 0 if dry_run else len(records),
+        'errors': errors,
+        'results': [
+            {
+                'row': r['row'],
+                'result_id': r['result_id'],
+                'student_name': r['student_name'],
+                'exam_code': r['exam_code'],
+                'correct_answers': r['correct_answers'],
+                'total_questions': r['total_questions'],
+                'overall_percentage': r['overall_percentage'],
+            }
+            for r in records
+        ],
+    }
@@ -0,0 +1,28 @@
+"""Ayudas para ejecutar la app en un worker cooperativo (gevent)
+
+Con ``gunicorn.conf.py`` cada worker atiende cientos de solicitudes en
+greenlets: la red (Postgres vía psycogreen, la IA vía httpx) cede el turno
+mientras espera. El trabajo de CPU largo, como leer un PDF, bloquearía a
+todos los greenlets del proceso, así que se manda a un hilo del sistema.
+"""
+
+
+def gevent_active():
+    """``True`` si el proceso corre con los módulos parcheados por gevent"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def run_blocking(func, *args, **kwargs):
+    """Ejecutar ``func`` sin bloquear a los demás greenlets.
+
+    Con gevent usa el pool de hilos reales del hub; en un worker normal
+    simplemente la llama.
+    """
+    if gevent_active():
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
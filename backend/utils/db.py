@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+from utils import metrics
+
+
+class DatabaseConnectionError(Exception):
+    """No se pudo obtener una conexión a la base de datos"""
+
+
+class PoolTimeoutError(DatabaseConnectionError):
+    """El pool no liberó ninguna conexión dentro del tiempo de espera"""
+
+
+class ConnectionPool:
+    """Pool de conexiones PostgreSQL seguro para hilos.
+
+    - Las conexiones se abren bajo demanda (nunca al importar), así cada
+      worker de gunicorn crea las suyas después del fork.
+    - Como máximo ``maxconn`` conexiones abiertas; si todas están en uso,
+      el checkout espera hasta ``timeout`` segundos y luego falla.
+    - Se conservan al menos ``minconn`` conexiones ociosas; las que sobran
+      se cierran tras ``max_idle`` segundos sin uso.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=5.0, max_idle=300.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Tamaño de pool inválido: se requiere 0 <= minconn <= maxconn y maxconn >= 1")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conexión, momento en que se devolvió)
+        self._size = 0        # conexiones abiertas: ociosas + en uso
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._connect_errors = 0
+        self._created = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        with metrics.DB_CONNECT_SECONDS.time():
+            conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def getconn(self, timeout=None):
+        """Obtener una conexión del pool (usar ``putconn`` al terminar)"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise DatabaseConnectionError("El pool de conexiones está cerrado")
+
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No hay conexiones libres tras {timeout:.1f}s (máximo {self.maxconn})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    # LIFO: reutilizar la conexión más reciente mantiene calientes pocas conexiones
+                    conn, _ = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except psycopg2.Error as e:
+                    # La conexión nunca se abrió: liberar el lugar sin contarla como cerrada
+                    with self._cond:
+                        self._connect_errors += 1
+                        self._size -= 1
+                        self._cond.notify()
+                    raise DatabaseConnectionError(str(e)) from e
+            elif conn.closed:
+                # El servidor cerró la conexión mientras estaba ociosa
+                self._release_slot()
+                continue
+
+            waited = time.monotonic() - start
+            metrics.DB_POOL_WAIT_SECONDS.observe(waited)
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Devolver una conexión al pool, dejándola en un estado limpio"""
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        if close or conn.closed or self._closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+            self._release_slot()
+            return
+
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._idle.append((conn, now))
+            # Cerrar las conexiones ociosas más antiguas que excedan el mínimo
+            while len(self._idle) > self.minconn and now - self._idle[0][1] > self.max_idle:
+                expired.append(self._idle.popleft()[0])
+            self._cond.notify()
+
+        for old in expired:
+            try:
+                old.close()
+            except psycopg2.Error:
+                pass
+            self._release_slot()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager que siempre devuelve la conexión al pool.
+
+        Si el bloque lanza una excepción se hace rollback; si la conexión
+        quedó rota se descarta en lugar de reutilizarse.
+        """
+        conn = self.getconn(timeout)
+        close = False
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            raise
+        finally:
+            self.putconn(conn, close=close)
+
+    def stats(self):
+        """Métricas del pool para dimensionarlo"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'timeout': self.timeout,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'connect_errors': self._connect_errors,
+                'connections_created': self._created,
+                'connections_closed': self._discarded,
+                'avg_wait_ms': round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'max_wait_ms': round(self._wait_max * 1000, 3),
+            }
+
+    def closeall(self):
+        """Cerrar todas las conexiones ociosas y rechazar nuevos checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+            self._release_slot()
@@ -0,0 +1,145 @@
+"""Exportación de resultados en streaming (CSV o NDJSON)
+
+Las filas salen de un cursor con nombre (del lado del servidor), que trae
+``itersize`` filas por viaje, y se escriben en trozos conforme llegan: la
+memoria usada no depende del número de resultados.
+"""
+
+import csv
+import io
+import json
+
+import psycopg2.extras
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+BASE_COLUMNS = [
+    'result_id', 'student_name', 'exam_code', 'original_exam_code', 'submitted_at',
+    'correct_answers', 'total_questions', 'overall_percentage',
+]
+
+
+def _filters(params):
+    conditions = []
+    values = []
+    if params['exam_code']:
+        conditions.append("(sr.exam_code = %s OR o.exam_code = %s)")
+        values.extend([params['exam_code'], params['exam_code']])
+    if params['date_from']:
+        conditions.append("sr.submitted_at >= %s")
+        values.append(params['date_from'])
+    if params['date_to']:
+        conditions.append("sr.submitted_at < %s")
+        values.append(params['date_to'])
+    return ''.join(f" AND {condition}" for condition in conditions), values
+
+
+def load_topics(cur, teacher_id, exam_code=None):
+    """Temas de los exámenes del maestro, para las columnas por tema"""
+    cur.execute("""
+        SELECT DISTINCT topic FROM exams e,
+            LATERAL jsonb_array_elements_text(
+                COALESCE(e.answer_key->'topics', jsonb_path_query_array(e.questions, '$[*].tema'))
+            ) AS topic
+        WHERE e.teacher_id = %s
+          AND (%s::text IS NULL OR e.exam_code = %s OR e.id IN (
+                SELECT original_exam_id FROM exam_versions WHERE version_code = %s))
+        ORDER BY topic
+    """, (teacher_id, exam_code, exam_code, exam_code))
+    return [row['topic'] for row in cur.fetchall()]
+
+
+def iter_results(conn, teacher_id, params, itersize=2000):
+    """Resultados del maestro, del más antiguo al más reciente, con un cursor con nombre"""
+    where, values = _filters(params)
+    cur = conn.cursor(name='export_results', cursor_factory=psycopg2.extras.RealDictCursor)
+    cur.itersize = itersize
+    try:
+        cur.execute(f"""
+            SELECT sr.id, sr.student_name, sr.exam_code, o.exam_code AS original_exam_code,
+                   sr.submitted_at, sr.correct_answers, sr.total_questions,
+                   sr.overall_percentage, sr.topic_scores
+            FROM student_results sr
+            JOIN exam_codes c ON c.code = sr.exam_code
+            JOIN exams o ON o.id = c.original_exam_id
+            WHERE c.teacher_id = %s{where}
+            ORDER BY sr.submitted_at, sr.id
+        """, (teacher_id, *values))
+        yield from cur
+    finally:
+        cur.close()
+
+
+def _record(row, topics):
+    """Fila plana: columnas base y porcentaje por tema (vacío si no aplica)"""
+    topic_scores = row['topic_scores'] or {}
+    if isinstance(topic_scores, str):
+        topic_scores = json.loads(topic_scores)
+    record = [
+        row['id'],
+        row['student_name'],
+        row['exam_code'],
+        row['original_exam_code'],
+        row['submitted_at'].isoformat() if row['submitted_at'] else '',
+        row['correct_answers'],
+        row['total_questions'],
+        float(row['overall_percentage']) if row['overall_percentage'] is not None else '',
+    ]
+    for topic in topics:
+        score = topic_scores.get(topic)
+        record.append(score['percentage'] if score else '')
+    return record
+
+
+def iter_csv(rows, topics, chunk_rows=500):
+    """CSV en trozos de ``chunk_rows`` filas (con BOM para que Excel lea UTF-8)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(BASE_COLUMNS + [f"{topic} (%)" for topic in topics])
+
+    pending = 0
+    for row in rows:
+        writer.writerow(_record(row, topics))
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows, topics, chunk_rows=500):
+    """Un objeto JSON por línea; los temas van en ``topics``"""
+    chunk = []
+    for row in rows:
+        record = _record(row, topics)
+        item = dict(zip(BASE_COLUMNS, record))
+        item['topics'] = {
+            topic: value for topic, value in zip(topics, record[len(BASE_COLUMNS):]) if value != ''
+        }
+        chunk.append(json.dumps(item, ensure_ascii=False))
+        if len(chunk) >= chunk_rows:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+WRITERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+def stream_results(conn, teacher_id, params, topics, fmt):
+    """Cuerpo de la respuesta; al cerrarlo (fin o cliente desconectado) cierra el cursor"""
+    rows = iter_results(conn, teacher_id, params)
+    try:
+        yield from WRITERS[fmt](rows, topics)
+    finally:
+        rows.close()
@@ -0,0 +1,99 @@
+"""Calificación de exámenes con una clave de respuestas precalculada"""
+
+import threading
+
+# Umbral de aprobación por tema (porcentaje)
+PASSING_PERCENTAGE = 60
+
+_MISSING = object()
+_INDEX_KEYS = [str(i) for i in range(256)]  # "0", "1", ... reutilizados entre calificaciones
+_INDEX_KEYS_LOCK = threading.Lock()
+
+
+def _index_keys(n):
+    """Claves de texto de las respuestas ("0".."n-1"), como las envía el frontend"""
+    if len(_INDEX_KEYS) < n:
+        with _INDEX_KEYS_LOCK:
+            while len(_INDEX_KEYS) < n:
+                _INDEX_KEYS.append(str(len(_INDEX_KEYS)))
+    return _INDEX_KEYS
+
+
+def build_answer_key(questions):
+    """Clave compacta para calificar sin recorrer las preguntas completas.
+
+    - answers: respuesta correcta por pregunta
+    - topic_idx: índice del tema de cada pregunta en ``topics``
+    - topics: temas en orden de aparición
+    - topic_totals: número de preguntas por tema
+    """
+    topics = []
+    topic_positions = {}
+    answers = []
+    topic_idx = []
+
+    for question in questions:
+        topic = question.get('tema', 'General')
+        position = topic_positions.get(topic)
+        if position is None:
+            position = topic_positions[topic] = len(topics)
+            topics.append(topic)
+        answers.append(question.get('respuesta_correcta'))
+        topic_idx.append(position)
+
+    topic_totals = [0] * len(topics)
+    for position in topic_idx:
+        topic_totals[position] += 1
+
+    return {
+        'answers': answers,
+        'topic_idx': topic_idx,
+        'topics': topics,
+        'topic_totals': topic_totals,
+    }
+
+
+def grade(answer_key, answers):
+    """Calificar las respuestas de un alumno (dict índice -> opción).
+
+    Devuelve (correctas, total, porcentajes_por_tema) con el mismo formato
+    que se guarda en ``student_results.topic_scores``.
+    """
+    correct_answers = answer_key['answers']
+    topic_idx = answer_key['topic_idx']
+    total = len(correct_answers)
+    correct_by_topic = [0] * len(answer_key['topics'])
+    correct = 0
+
+    get = answers.get
+    for key, expected, topic in zip(_index_keys(total), correct_answers, topic_idx):
+        if get(key, _MISSING) == expected:
+            correct += 1
+            correct_by_topic[topic] += 1
+
+    topic_percentages = {}
+    for topic, topic_total, topic_correct in zip(answer_key['topics'], answer_key['topic_totals'], correct_by_topic):
+        percentage = (topic_correct / topic_total) * 100
+        topic_percentages[topic] = {
+            'percentage': round(percentage, 2),
+            'status': 'Aprobado' if percentage >= PASSING_PERCENTAGE else 'Reprobado',
+            'correct': topic_correct,
+            'total': topic_total
+        }
+
+    return correct, total, topic_percentages
+
+
+def score_percentage(correct, total):
+    """Porcentaje global redondeado a dos decimales (0 si el examen no tiene preguntas)"""
+    return round((correct / total) * 100, 2) if total else 0.0
+
+
+def question_results(answer_key, answers):
+    """Acierto (1) o no (0) de cada pregunta, en el orden de la clave"""
+    get = answers.get
+    expected_answers = answer_key['answers']
+    return [
+        1 if get(key, _MISSING) == expected else 0
+        for key, expected in zip(_index_keys(len(expected_answers)), expected_answers)
+    ]
@@ -0,0 +1,177 @@
+"""Análisis de reactivos de un examen y sus versiones
+
+Las respuestas se cargan en una matriz densa alumno × pregunta (NumPy),
+con las versiones reordenadas al orden del examen original, y de ahí se
+calcula por pregunta:
+
+- dificultad: proporción de aciertos
+- discriminación: aciertos del 27% superior menos los del 27% inferior
+- frecuencia de cada opción (distractores) y de preguntas sin responder
+
+y para el examen el alfa de Cronbach.
+"""
+
+import json
+
+import numpy as np
+
+from utils.versions import infer_permutation, version_questions
+
+GROUP_FRACTION = 0.27
+UNANSWERED = -1
+
+
+def _option_alphabet(questions):
+    """Todas las claves de opción del examen (normalmente A..E)"""
+    return sorted({key for question in questions for key in (question.get('opciones') or {})})
+
+
+def build_matrix(questions, groups):
+    """Matriz de opciones elegidas (int8, ``UNANSWERED`` si no respondió o
+    el valor guardado no es una opción).
+
+    ``groups`` es una lista de ``(question_order, [answers, ...])``: las
+    respuestas de cada código con el índice en el original de cada pregunta.
+    Las columnas de la matriz siguen el orden del examen original y los
+    valores son índices en el alfabeto de opciones devuelto.
+    """
+    n = len(questions)
+    keys = [str(j) for j in range(n)]
+    alphabet = _option_alphabet(questions)
+    code_of = {letter: code for code, letter in enumerate(alphabet)}.get
+
+    choices = np.full((sum(len(answers_list) for _, answers_list in groups), n), UNANSWERED, dtype=np.int8)
+    start = 0
+    for order, answers_list in groups:
+        if not answers_list:
+            continue
+        # Una fila por alumno en el orden de su versión; luego a las columnas del original
+        # Valores guardados que no son texto (listas, dicts...) cuentan como sin responder
+        block = np.array([
+            [code_of(value, UNANSWERED) if isinstance(value, str) else UNANSWERED
+             for value in map((answers if isinstance(answers, dict) else {}).get, keys)]
+            for answers in answers_list
+        ], dtype=np.int8)
+        choices[start:start + len(answers_list), order] = block
+        start += len(answers_list)
+    return choices, alphabet
+
+
+def cronbach_alpha(scored):
+    """Alfa de Cronbach de una matriz 0/1 alumno × pregunta (``None`` si no aplica)"""
+    students, k = scored.shape
+    if students < 2 or k < 2:
+        return None
+    total_variance = scored.sum(axis=1).var()
+    if total_variance == 0:
+        return None
+    return float(k / (k - 1) * (1 - scored.var(axis=0).sum() / total_variance))
+
+
+def analyze(questions, choices, alphabet, group_fraction=GROUP_FRACTION):
+    """Estadísticas por pregunta y del examen a partir de ``build_matrix``"""
+    students, n = choices.shape
+    position = {letter: code for code, letter in enumerate(alphabet)}
+    correct = np.array([position.get(q.get('respuesta_correcta'), -2) for q in questions], dtype=np.int8)
+
+    scored = (choices == correct).astype(np.float64)
+    totals = scored.sum(axis=1)
+
+    if students:
+        difficulty = scored.mean(axis=0)
+        group = max(1, int(round(students * group_fraction)))
+        ranking = np.argsort(totals, kind='stable')
+        lower, upper = ranking[:group], ranking[-group:]
+        discrimination = scored[upper].mean(axis=0) - scored[lower].mean(axis=0)
+    else:
+        difficulty = discrimination = np.zeros(n)
+
+    # Frecuencia de cada opción por pregunta (una fila por opción del alfabeto)
+    counts = np.zeros((len(alphabet), n), dtype=np.int64)
+    for code in range(len(alphabet)):
+        counts[code] = (choices == code).sum(axis=0)
+    omitted = (choices == UNANSWERED).sum(axis=0)
+
+    items = []
+    for j, question in enumerate(questions):
+        opciones = question.get('opciones') or {}
+        items.append({
+            'index': j,
+            'numero': question.get('numero', j + 1),
+            'tema': question.get('tema', 'General'),
+            'pregunta': (question.get('pregunta') or '')[:200],
+            'respuesta_correcta': question.get('respuesta_correcta'),
+            'difficulty': round(float(difficulty[j]), 4),
+            'discrimination': round(float(discrimination[j]), 4),
+            'options': {
+                letter: {
+                    'count': int(counts[position[letter], j]),
+                    'proportion': round(float(counts[position[letter], j]) / students, 4) if students else 0.0,
+                    'correct': letter == question.get('respuesta_correcta'),
+                }
+                for letter in opciones
+            },
+            'omitted': int(omitted[j]),
+        })
+
+    alpha = cronbach_alpha(scored)
+    return {
+        'submissions': students,
+        'questions': n,
+        'cronbach_alpha': round(alpha, 4) if alpha is not None else None,
+        'mean_score': round(float(totals.mean()), 4) if students else None,
+        'items': items,
+    }
+
+
+def load_groups(cur, exam_id):
+    """Preguntas del original y respuestas agrupadas por código.
+
+    Devuelve (questions, groups, skipped) o ``None`` si el examen no existe;
+    ``skipped`` cuenta las entregas de versiones que no se pudieron
+    relacionar con el orden original.
+    """
+    cur.execute("SELECT questions FROM exams WHERE id = %s", (exam_id,))
+    exam = cur.fetchone()
+    if not exam:
+        return None
+    questions = exam['questions']
+    questions = json.loads(questions) if isinstance(questions, str) else questions
+    n = len(questions)
+
+    # Orden de cada código; las versiones como copia completa se relacionan aquí
+    cur.execute("""
+        SELECT code, is_version, permutation,
+               CASE WHEN is_version AND permutation IS NULL THEN questions END AS questions
+        FROM exam_codes WHERE original_exam_id = %s
+    """, (exam_id,))
+    orders = {}
+    for row in cur.fetchall():
+        if not row['is_version']:
+            orders[row['code']] = list(range(n))
+            continue
+        permutation = row['permutation']
+        if permutation is None:
+            permutation = infer_permutation(questions, version_questions(row['questions'], None))
+        elif isinstance(permutation, str):
+            permutation = json.loads(permutation)
+        if permutation is not None and len(permutation['order']) == n:
+            orders[row['code']] = permutation['order']
+        else:
+            orders[row['code']] = None
+
+    cur.execute("SELECT exam_code, answers FROM student_results WHERE exam_code = ANY(%s)", (list(orders),))
+    answers_by_code = {}
+    for row in cur.fetchall():
+        answers = row['answers'] or {}
+        answers = json.loads(answers) if isinstance(answers, str) else answers
+        answers_by_code.setdefault(row['exam_code'], []).append(answers)
+
+    groups = []
+    skipped = 0
+    for code, answers_list in answers_by_code.items():
+        if orders.get(code) is None:
+            skipped += len(answers_list)
+        else:
+            groups.append((orders[code], answers_list))
+    return questions, groups, skipped
@@ -0,0 +1,314 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+# Estados posibles de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    """Error esperado de un trabajo: se guarda su mensaje sin traceback"""
+
+
+class JobLost(Exception):
+    """Otro worker reclamó el trabajo (se creyó abandonado): dejar de ejecutarlo"""
+
+
+class JobQueue:
+    """Cola de trabajos respaldada por la tabla ``generation_jobs``.
+
+    Los trabajos se reclaman con ``FOR UPDATE SKIP LOCKED``, así varios
+    procesos (workers de gunicorn o instancias) pueden compartir la cola.
+    Un trabajo en ``running`` cuyo latido es más antiguo que ``stale_after``
+    se considera abandonado (p. ej. el worker se reinició) y se reintenta
+    hasta ``max_attempts`` veces.
+
+    ``handler(job, progress)`` ejecuta el trabajo; ``progress(done, total)``
+    actualiza el avance y el latido, ``progress(preview=[...])`` las
+    preguntas generadas hasta el momento y ``progress()`` solo el latido.
+    Debe devolver un dict con ``exam_id`` y ``exam_code``.
+
+    Cada hilo reclama los trabajos con su propio ``worker_id`` y solo
+    escribe en los que siguen siendo suyos: si otro worker lo reclamó,
+    ``progress`` lanza ``JobLost`` para que el handler no termine el
+    trabajo dos veces.
+    """
+
+    def __init__(self, pool, handler, workers=2, poll_interval=2.0, stale_after=600, max_attempts=3):
+        self.pool = pool
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._processed = {DONE: 0, FAILED: 0}
+        self._running = {}  # worker_id del hilo -> trabajo en curso
+
+    def enqueue(self, teacher_id, params):
+        """Registrar un trabajo nuevo y devolver su id"""
+        job_id = str(uuid.uuid4())
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO generation_jobs (id, teacher_id, status, params)
+                VALUES (%s, %s, %s, %s)
+            """, (job_id, teacher_id, QUEUED, json.dumps(params)))
+            conn.commit()
+            cur.close()
+
+        # Despertar a un worker local sin esperar al siguiente sondeo
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Estado actual de un trabajo o ``None`` si no existe"""
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id, status, batches_done, batches_total, attempts,
+                       questions_ready, preview, exam_id, exam_code, error, metrics,
+                       created_at, updated_at
+                FROM generation_jobs WHERE id = %s
+            """, (job_id,))
+            job = cur.fetchone()
+            cur.close()
+        return job
+
+    def start(self):
+        """Arrancar los hilos de trabajo de este proceso (idempotente)"""
+        with self._lock:
+            if self._threads:
+                return
+            # Un nuevo worker_id por proceso: start() debe llamarse después del fork
+            self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, args=(f"{self.worker_id}#{i}",),
+                                          name=f"generation-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Detener los hilos y devolver a la cola los trabajos que no terminaron.
+
+        Se llama al salir el worker (``worker_exit`` de gunicorn): sin esto
+        un trabajo interrumpido esperaría ``stale_after`` para reintentarse.
+        El intento interrumpido no cuenta para ``max_attempts``.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+        with self._lock:
+            unfinished = list(self._running.values())
+            self._threads = []
+        for job in unfinished:
+            try:
+                with self.pool.connection() as conn:
+                    cur = conn.cursor()
+                    # El hilo que sigue corriendo recibe JobLost en su siguiente escritura
+                    cur.execute("""
+                        UPDATE generation_jobs
+                        SET status = %s, worker_id = NULL, attempts = GREATEST(attempts - 1, 0),
+                            batches_done = 0, updated_at = NOW()
+                        WHERE id = %s AND worker_id = %s AND status = %s
+                    """, (QUEUED, job['id'], job['owner'], RUNNING))
+                    conn.commit()
+                    cur.close()
+                print(f"↩ Trabajo {job['id']} devuelto a la cola")
+            except Exception as e:
+                print(f"⚠ No se pudo devolver el trabajo {job['id']} a la cola: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'worker_id': self.worker_id,
+                'done': self._processed[DONE],
+                'failed': self._processed[FAILED],
+            }
+
+    def _worker_loop(self, owner):
+        while not self._stop.is_set():
+            try:
+                job = self._claim(owner)
+            except Exception as e:
+                print(f"⚠ Error reclamando trabajo: {e}")
+                job = None
+
+            if job:
+                with self._lock:
+                    self._running[owner] = job
+                try:
+                    self._run(job)
+                finally:
+                    with self._lock:
+                        self._running.pop(owner, None)
+                continue
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim(self, owner):
+        """Tomar el trabajo pendiente más antiguo (o uno abandonado)"""
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+
+            # Trabajos abandonados que ya agotaron sus intentos
+            cur.execute("""
+                UPDATE generation_jobs
+                SET status = %s, error = 'Se agotaron los intentos', updated_at = NOW()
+                WHERE status = %s AND attempts >= %s
+                  AND heartbeat_at < NOW() - make_interval(secs => %s)
+            """, (FAILED, RUNNING, self.max_attempts, self.stale_after))
+
+            cur.execute("""
+                UPDATE generation_jobs
+                SET status = %s, worker_id = %s, attempts = attempts + 1,
+                    batches_done = 0, heartbeat_at = NOW(), updated_at = NOW()
+                WHERE id = (
+                    SELECT id FROM generation_jobs
+                    WHERE status = %s
+                       OR (status = %s AND attempts < %s
+                           AND heartbeat_at < NOW() - make_interval(secs => %s))
+                    ORDER BY created_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, teacher_id, params, attempts
+            """, (RUNNING, owner, QUEUED, RUNNING, self.max_attempts, self.stale_after))
+            job = cur.fetchone()
+            conn.commit()
+            cur.close()
+
+        if job:
+            job['owner'] = owner
+            if isinstance(job['params'], str):
+                job['params'] = json.loads(job['params'])
+        return job
+
+    def _update(self, job, **fields):
+        """Actualizar el trabajo y su latido si sigue siendo de este worker"""
+        assignments = "".join(f"{name} = %s, " for name in fields)
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"UPDATE generation_jobs SET {assignments}heartbeat_at = NOW(), updated_at = NOW() "
+                f"WHERE id = %s AND worker_id = %s AND status = %s",
+                (*fields.values(), job['id'], job['owner'], RUNNING)
+            )
+            updated = cur.rowcount
+            conn.commit()
+            cur.close()
+        if not updated:
+            raise JobLost(f"El trabajo {job['id']} ya no pertenece a {job['owner']}")
+
+    def _run(self, job):
+        job_id = job['id']
+
+        def progress(done=None, total=None, preview=None):
+            fields = {}
+            if done is not None:
+                fields.update(batches_done=done, batches_total=total)
+            if preview is not None:
+                fields.update(questions_ready=len(preview), preview=json.dumps(preview, ensure_ascii=False))
+            try:
+                self._update(job, **fields)
+            except JobLost:
+                raise
+            except Exception as e:
+                # El avance es informativo: no abortar la generación por esto
+                print(f"⚠ No se pudo registrar el avance del trabajo {job_id}: {e}")
+
+        try:
+            result = self.handler(job, progress)
+            metrics = result.get('metrics')
+            self._update(job, status=DONE, exam_id=result['exam_id'],
+                         exam_code=result['exam_code'], error=None,
+                         metrics=json.dumps(metrics) if metrics is not None else None)
+            status = DONE
+        except JobLost as e:
+            # Otro worker lo está ejecutando: no escribir nada más
+            print(f"⚠ {e}")
+            return
+        except JobError as e:
+            status = self._fail(job, str(e))
+        except Exception as e:
+            traceback.print_exc()
+            status = self._fail(job, f"Error generando examen: {e}")
+
+        with self._lock:
+            self._processed[status] += 1
+
+    def _fail(self, job, error):
+        try:
+            self._update(job, status=FAILED, error=error)
+        except JobLost as e:
+            print(f"⚠ {e}")
+        except Exception:
+            # Sin base de datos: el trabajo queda abandonado y se reintentará
+            pass
+        return FAILED
+
+
+class QuestionFeed:
+    """Vista previa de las preguntas que van llegando de la IA.
+
+    ``add`` se llama desde los hilos de generación con cada pregunta; la
+    lista (tema y enunciado) se escribe en el trabajo con ``progress`` como
+    máximo cada ``interval`` segundos, y ``flush`` escribe lo pendiente.
+
+    La escritura en la base de datos ocurre fuera de ``_lock``: ``add`` no
+    espera a nadie (si otro hilo ya está escribiendo, lo nuevo sale en la
+    siguiente escritura). ``_write_lock`` ordena las escrituras y cada una
+    toma su copia de la lista ya dentro de él, así una vista más vieja
+    nunca sobrescribe a una más nueva.
+    """
+
+    def __init__(self, progress, interval=1.0):
+        self.progress = progress
+        self.interval = interval
+        self._items = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last = 0.0
+        self._pending = False
+
+    def add(self, pregunta):
+        with self._lock:
+            self._items.append({'tema': pregunta.get('tema', 'General'), 'pregunta': pregunta.get('pregunta', '')})
+            self._pending = True
+            if time.monotonic() - self._last < self.interval:
+                return
+        if self._write_lock.acquire(blocking=False):
+            try:
+                self._write()
+            finally:
+                self._write_lock.release()
+
+    def flush(self):
+        with self._write_lock:
+            self._write()
+
+    def _write(self):
+        # Con _write_lock tomado: copiar bajo _lock y escribir sin él
+        with self._lock:
+            if not self._pending:
+                return
+            self._pending = False
+            self._last = time.monotonic()
+            items = list(self._items)
+        self.progress(preview=items)
@@ -0,0 +1,82 @@
+"""Lectura incremental del JSON que devuelve la IA
+
+La respuesta llega en trozos (streaming). ``QuestionStreamParser`` recorre
+cada trozo una sola vez, llevando la cuenta de llaves, corchetes y cadenas,
+y entrega cada objeto del arreglo ``"preguntas"`` en cuanto se cierra: no
+hay que esperar a la respuesta completa y, si se corta o trae basura al
+final, las preguntas ya cerradas se conservan.
+
+Acepta ``{"preguntas": [{...}, ...]}`` y también un arreglo suelto
+``[{...}, ...]``; el texto antes del JSON (```json, razonamiento) se ignora.
+"""
+
+import json
+
+
+class QuestionStreamParser:
+    """Extraer los objetos de pregunta de una respuesta JSON que llega por partes"""
+
+    def __init__(self):
+        self._buffer = []       # texto del objeto en curso
+        self._stack = []        # contenedores abiertos: '{' o '['
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self.text = []          # respuesta completa, para el respaldo al final
+        self.errors = 0
+
+    def _item_depth(self):
+        """True si el contenedor abierto es el arreglo de preguntas"""
+        return self._stack in (['{', '['], ['['])
+
+    def feed(self, chunk):
+        """Procesar un trozo y devolver las preguntas que se completaron en él"""
+        self.text.append(chunk)
+        completas = []
+        for char in chunk:
+            if not self._started:
+                if char not in '{[':
+                    continue
+                self._started = True
+
+            capturando = len(self._stack) > (1 if self._stack[:1] == ['['] else 2) or (
+                char == '{' and self._item_depth() and not self._in_string)
+            if capturando:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._stack.append(char)
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if char == '}' and self._item_depth() and self._buffer:
+                    completas.extend(self._close_item())
+                elif not self._stack:
+                    # Terminó un JSON (o un {...} suelto del texto previo): buscar el siguiente
+                    self._started = False
+        return completas
+
+    def _close_item(self):
+        raw = ''.join(self._buffer)
+        self._buffer = []
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            self.errors += 1
+            return []
+        return [item] if isinstance(item, dict) else []
+
+    def full_text(self):
+        return ''.join(self.text)
+
@@ -0,0 +1,181 @@
+"""Backends de IA para generar preguntas
+
+``get_backend()`` devuelve el backend configurado en ``LLM_BACKEND``:
+
+- ``openai``: cualquier API compatible con OpenAI (``OPENAI_API_KEY`` y
+  ``OPENAI_BASE_URL``). El cliente se crea en la primera llamada, así la
+  aplicación arranca aunque falten las credenciales.
+- ``stub``: local y determinista, para pruebas de carga sin proveedor.
+  Devuelve preguntas válidas después de ``LLM_STUB_LATENCY`` segundos
+  (± ``LLM_STUB_JITTER``) y puede simular fallos con ``LLM_STUB_FAILURE_RATE``.
+
+Un backend implementa ``generate(prompt, lote, timeout, stream, usage)``:
+devuelve un iterador de trozos de texto de la respuesta y, si el proveedor
+lo informa, llena ``usage`` con ``prompt_tokens`` y ``completion_tokens``.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek/deepseek-r1:free")
+
+# Backend local: latencia por lote, variación aleatoria, fallos simulados y semilla
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", 1.0))
+LLM_STUB_JITTER = float(os.getenv("LLM_STUB_JITTER", 0.2))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", 0))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", 0))
+
+
+class LLMConfigError(ValueError):
+    """Falta configuración para usar el backend de IA"""
+
+
+class OpenAIBackend:
+    """API de chat compatible con OpenAI (OpenRouter, DeepSeek, etc.)"""
+
+    def __init__(self, model=LLM_MODEL, api_key=None, base_url=None):
+        self.model = model
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not self.api_key or not self.base_url:
+                        raise LLMConfigError("⚠ Faltan las variables OPENAI_API_KEY o OPENAI_BASE_URL en .env")
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    def generate(self, prompt, lote, timeout, stream, usage):
+        kwargs = {}
+        if stream:
+            # Sin esto la API no informa los tokens en streaming; llegan en el último trozo
+            kwargs['stream_options'] = {"include_usage": True}
+        chat = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            timeout=timeout,
+            stream=stream,
+            **kwargs
+        )
+        if not stream:
+            if getattr(chat, 'usage', None):
+                usage.update(prompt_tokens=chat.usage.prompt_tokens, completion_tokens=chat.usage.completion_tokens)
+            yield chat.choices[0].message.content or ''
+            return
+
+        for chunk in chat:
+            if getattr(chunk, 'usage', None):
+                usage.update(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubBackend:
+    """Backend local determinista: mismas preguntas y latencias para el mismo lote y semilla"""
+
+    model = "stub"
+
+    def __init__(self, latency=LLM_STUB_LATENCY, jitter=LLM_STUB_JITTER, failure_rate=LLM_STUB_FAILURE_RATE,
+                 seed=LLM_STUB_SEED, chunk_chars=64, max_tracked=4096):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.chunk_chars = chunk_chars
+        # Intentos por lote (LRU): un proceso largo no acumula una entrada por lote para siempre
+        self._attempts = OrderedDict()
+        self._max_tracked = max_tracked
+        self._lock = threading.Lock()
+
+    def _rng(self, lote):
+        """Generador propio del lote; cada reintento del mismo lote usa otra semilla"""
+        raw = json.dumps([self.seed, lote], ensure_ascii=False, sort_keys=True).encode('utf-8')
+        key = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            attempt = self._attempts.pop(key, 0)
+            self._attempts[key] = attempt + 1
+            if len(self._attempts) > self._max_tracked:
+                self._attempts.popitem(last=False)
+        return random.Random(f"{key}:{attempt}")
+
+    def questions(self, lote, rng):
+        """Una pregunta válida por cada pregunta de referencia del lote"""
+        preguntas = []
+        for i, item in enumerate(lote):
+            tema = f"Tema {rng.randint(1, 5)}"
+            preguntas.append({
+                "numero": i + 1,
+                "tema": tema,
+                "pregunta": f"({tema}) Variante de: {item['texto'][:200]}",
+                "opciones": {letra: f"Opción {letra} {rng.randint(1, 999)}" for letra in "ABCD"},
+                "respuesta_correcta": rng.choice("ABCD"),
+            })
+        return preguntas
+
+    def generate(self, prompt, lote, timeout, stream, usage):
+        rng = self._rng(lote)
+        latency = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        if timeout and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"stub: {latency:.2f}s excede el timeout de {timeout}s")
+        if rng.random() < self.failure_rate:
+            time.sleep(latency)
+            raise RuntimeError("stub: fallo simulado")
+
+        texto = json.dumps({"preguntas": self.questions(lote, rng)}, ensure_ascii=False)
+        usage.update(prompt_tokens=len(prompt) // 4, completion_tokens=len(texto) // 4)
+        if not stream:
+            time.sleep(latency)
+            yield texto
+            return
+
+        # La latencia se reparte entre los trozos, como llega un stream real
+        trozos = [texto[i:i + self.chunk_chars] for i in range(0, len(texto), self.chunk_chars)]
+        pausa = latency / len(trozos)
+        for trozo in trozos:
+            time.sleep(pausa)
+            yield trozo
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'stub': StubBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Backend configurado en ``LLM_BACKEND`` (uno por proceso)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if LLM_BACKEND not in BACKENDS:
+                    raise LLMConfigError(f"LLM_BACKEND debe ser uno de: {', '.join(BACKENDS)}")
+                _backend = BACKENDS[LLM_BACKEND]()
+    return _backend
+
+
+def set_backend(backend):
+    """Reemplazar el backend del proceso (benchmarks y pruebas de carga)"""
+    global _backend
+    _backend = backend
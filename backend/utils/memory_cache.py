@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Caché en memoria del proceso, con caducidad y límite de tamaño (LRU).
+
+    Pensada para datos inmutables que se leen muchas veces en poco tiempo,
+    como los exámenes durante una aplicación: no hay invalidación, las
+    entradas solo caducan tras ``ttl`` o se desalojan por tamaño. Solo se
+    guardan resultados encontrados, nunca "no existe".
+    """
+
+    def __init__(self, maxsize=256, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # clave -> (expira_en, valor)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """Valor guardado o ``None`` si no existe o ya caducó"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+            }
@@ -0,0 +1,269 @@
+"""Métricas de la aplicación en formato de texto de Prometheus
+
+Contadores e histogramas en memoria del proceso, sin dependencias, que se
+publican en ``/metrics``. Con ``METRICS_ENABLED=0`` las mediciones no
+hacen nada y el endpoint responde 404.
+
+Cada worker de gunicorn tiene sus propias métricas: al consultarlas a
+través del balanceador se ve un worker distinto cada vez; para sumarlas,
+configurar Prometheus para consultar cada worker o usar un solo worker
+con gevent.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Segundos: de consultas de milisegundos a llamadas a la IA de minutos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Valor que solo aumenta, por combinación de etiquetas"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Histogram:
+    """Distribución de duraciones (u otros valores) en cubetas acumuladas"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # etiquetas -> [conteos por cubeta, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            acumulado = 0
+            for bound, n in zip(self.buckets, counts):
+                acumulado += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {acumulado}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class StatsCollector:
+    """Publica los ``stats()`` de componentes existentes (caches, pool, cola).
+
+    ``sources`` es ``{valor de la etiqueta: función stats}``; ``fields`` es
+    ``{clave en stats: (nombre de la métrica, tipo, ayuda)}``.
+    """
+
+    def __init__(self, label, sources, fields):
+        self.label = label
+        self.sources = sources
+        self.fields = fields
+
+    def render_families(self):
+        valores = {}
+        for source, stats in self.sources.items():
+            try:
+                data = stats()
+            except Exception:
+                # Una fuente caída (p. ej. la base de datos) no debe romper /metrics
+                continue
+            for field in self.fields:
+                if field in data and data[field] is not None:
+                    valores.setdefault(field, []).append((source, data[field]))
+
+        families = []
+        for field, (name, type_, help) in self.fields.items():
+            lines = [f"{name}{_labels((self.label,), (source,))} {_number(value)}"
+                     for source, value in valores.get(field, [])]
+            if lines:
+                families.append((name, type_, help, lines))
+        return families
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """Texto de exposición de Prometheus"""
+        out = []
+        for metric in self._metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.type}")
+            out.extend(metric.render())
+        for collector in self._collectors:
+            for name, type_, help, lines in collector.render_families():
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {type_}")
+                out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Duración de las solicitudes HTTP por ruta',
+    ('method', 'route', 'status'))
+DB_CONNECT_SECONDS = REGISTRY.histogram(
+    'db_connect_duration_seconds', 'Tiempo para abrir una conexión nueva a PostgreSQL')
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    'db_pool_wait_seconds', 'Espera para obtener una conexión del pool (incluye abrirla)')
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'db_query_duration_seconds', 'Duración de execute() por tipo de sentencia', ('statement',))
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'llm_request_duration_seconds', 'Duración de cada llamada a la IA (un lote)', ('model', 'outcome'))
+LLM_FIRST_QUESTION_SECONDS = REGISTRY.histogram(
+    'llm_first_question_seconds', 'Tiempo hasta la primera pregunta completa de un lote', ('model',))
+LLM_TOKENS = REGISTRY.counter(
+    'llm_tokens_total', 'Tokens de prompt y de respuesta consumidos', ('model', 'kind'))
+LLM_QUESTIONS = REGISTRY.counter(
+    'llm_questions_total', 'Preguntas válidas recibidas de la IA', ('model',))
+PDF_EXTRACT_SECONDS = REGISTRY.histogram(
+    'pdf_extract_duration_seconds', 'Extracción de texto y separación de preguntas de un PDF')
+PDF_QUESTIONS = REGISTRY.counter(
+    'pdf_extracted_questions_total', 'Preguntas extraídas de PDFs subidos')
+
+CACHE_FIELDS = {
+    'hits': ('cache_hits_total', 'counter', 'Búsquedas encontradas en la caché'),
+    'misses': ('cache_misses_total', 'counter', 'Búsquedas no encontradas en la caché'),
+    'hit_rate': ('cache_hit_ratio', 'gauge', 'Proporción de aciertos desde el arranque'),
+    'size': ('cache_entries', 'gauge', 'Entradas en la caché'),
+    'evictions': ('cache_evictions_total', 'counter', 'Entradas desalojadas por tamaño'),
+}
+POOL_FIELDS = {
+    'size': ('db_pool_connections', 'gauge', 'Conexiones abiertas'),
+    'in_use': ('db_pool_in_use', 'gauge', 'Conexiones prestadas'),
+    'waiting': ('db_pool_waiting', 'gauge', 'Solicitudes esperando una conexión'),
+    'timeouts': ('db_pool_timeouts_total', 'counter', 'Checkouts que agotaron la espera'),
+    'connect_errors': ('db_pool_connect_errors_total', 'counter', 'Errores al abrir conexiones'),
+}
+JOB_FIELDS = {
+    'done': ('generation_jobs_done_total', 'counter', 'Trabajos de generación terminados en este proceso'),
+    'failed': ('generation_jobs_failed_total', 'counter', 'Trabajos de generación fallidos en este proceso'),
+}
+
+_STATEMENTS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'CREATE', 'ALTER', 'DECLARE'}
+
+
+def _statement(query):
+    """Primera palabra de la sentencia, para no crear una serie por consulta"""
+    head = query[:40].decode('ascii', 'ignore') if isinstance(query, bytes) else str(query)[:40]
+    word = head.split(None, 1)
+    word = word[0].upper() if word else ''
+    return word if word in _STATEMENTS else 'OTHER'
+
+
+def timed_cursor(base):
+    """Subclase de ``base`` (p. ej. RealDictCursor) que mide cada execute"""
+    if not METRICS_ENABLED:
+        return base
+
+    class TimedCursor(base):
+        def execute(self, query, vars=None):
+            inicio = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - inicio, statement=_statement(query))
+
+        def executemany(self, query, vars_list):
+            inicio = time.perf_counter()
+            try:
+                return super().executemany(query, vars_list)
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - inicio, statement=_statement(query))
+
+    TimedCursor.__name__ = f"Timed{base.__name__}"
+    return TimedCursor
+
+
+def register_stats(label, sources, fields):
+    REGISTRY.register(StatsCollector(label, sources, fields))
+
+
+def render():
+    return REGISTRY.render()
+
@@ -0,0 +1,105 @@
+"""Paginación por cursor (keyset) para los listados del panel del maestro
+
+El cursor es la posición del último elemento entregado, ``(fecha, id)``,
+codificada en base64. La siguiente página pide ``(fecha, id) < cursor``
+con el mismo orden descendente, así que no depende de OFFSET ni se
+desplaza si llegan registros nuevos mientras se navega.
+"""
+
+import base64
+from datetime import datetime, timedelta
+
+# Fecha con la que la migración rellena los registros antiguos sin fecha
+NULL_TIMESTAMP = datetime(1970, 1, 1)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class PaginationError(ValueError):
+    """Parámetros de paginación o filtros inválidos"""
+
+
+def encode_cursor(timestamp, row_id):
+    if timestamp is None:
+        timestamp = NULL_TIMESTAMP
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(fecha, id) de un cursor generado por ``encode_cursor``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        timestamp, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp), row_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise PaginationError('Cursor inválido') from e
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise PaginationError(f'{name} debe ser una fecha ISO (AAAA-MM-DD)') from e
+
+
+def filter_params(args):
+    """Leer exam_code, from y to de los parámetros de la URL.
+
+    ``to`` con solo fecha incluye ese día completo.
+    """
+    date_from = args.get('from')
+    date_to = args.get('to')
+    params = {
+        'exam_code': args.get('exam_code') or None,
+        'date_from': _parse_date(date_from, 'from') if date_from else None,
+        'date_to': None,
+        'cursor': None,
+    }
+    if date_to:
+        params['date_to'] = _parse_date(date_to, 'to')
+        if len(date_to) == 10:
+            params['date_to'] += timedelta(days=1)
+    return params
+
+
+def page_params(args, default_limit=DEFAULT_LIMIT, max_limit=MAX_LIMIT):
+    """Leer limit y cursor además de los filtros de ``filter_params``"""
+    try:
+        limit = int(args.get('limit', default_limit))
+    except ValueError as e:
+        raise PaginationError('limit debe ser un número') from e
+    if not 1 <= limit <= max_limit:
+        raise PaginationError(f'limit debe estar entre 1 y {max_limit}')
+
+    params = filter_params(args)
+    params['limit'] = limit
+    cursor = args.get('cursor')
+    if cursor:
+        params['cursor'] = decode_cursor(cursor)
+    return params
+
+
+def keyset_filters(params, column, id_column):
+    """Condiciones SQL y argumentos para rango de fechas y cursor"""
+    conditions = []
+    values = []
+    if params['date_from']:
+        conditions.append(f"{column} >= %s")
+        values.append(params['date_from'])
+    if params['date_to']:
+        conditions.append(f"{column} < %s")
+        values.append(params['date_to'])
+    if params['cursor']:
+        conditions.append(f"({column}, {id_column}) < (%s, %s)")
+        values.extend(params['cursor'])
+    return conditions, values
+
+
+def paginate(rows, limit, column, id_column='id'):
+    """Recortar la fila extra pedida con LIMIT n+1 y calcular el siguiente cursor"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][column], rows[-1][id_column]) if has_more else None
+    return rows, next_cursor
@@ -1,41 +1,234 @@
 import os
-import fitz  # PyMuPDF
 import re
 import json
-import gc
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
 from dotenv import load_dotenv
-from openai import OpenAI
+from utils.question_cache import cache_key, hash_file
+from utils.batching import estimate_batch, estimate_tokens, pack_batches, summarize_metrics
+from utils.json_stream import QuestionStreamParser
+from utils.llm import LLMConfigError, get_backend
+from utils.metrics import LLM_FIRST_QUESTION_SECONDS, LLM_QUESTIONS, LLM_REQUEST_SECONDS, LLM_TOKENS
 
 # Cargar variables de entorno
 load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
-base_url = os.getenv("OPENAI_BASE_URL")
 
-if not api_key or not base_url:
-    raise ValueError("⚠ Faltan las variables OPENAI_API_KEY o OPENAI_BASE_URL en .env")
+# Lotes enviados a la IA en paralelo (1 = secuencial) y timeout por lote en segundos
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 1))
+LLM_BATCH_TIMEOUT = float(os.getenv("LLM_BATCH_TIMEOUT", 120))
+# Veces que un lote fallido o incompleto se divide y se vuelve a pedir
+LLM_BATCH_RETRIES = int(os.getenv("LLM_BATCH_RETRIES", 2))
+# Recibir la respuesta en streaming y extraer cada pregunta en cuanto se cierra
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
 
-client = OpenAI(api_key=api_key, base_url=base_url)
+# Extracción de PDFs: procesos en paralelo (1 = en este proceso), a partir de
+# cuántas páginas vale la pena paralelizar y páginas por tarea
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", 1))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 50))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+def _fitz():
+    """PyMuPDF se importa al abrir el primer PDF: cargarlo cuesta más que el resto del módulo"""
+    import fitz  # PyMuPDF
+    return fitz
+
+def _extraer_rango(pdf_path, inicio, fin):
+    """Texto de las páginas [inicio, fin) (se ejecuta en un proceso hijo)"""
+    with _fitz().open(pdf_path) as doc:
+        return [doc[i].get_text() for i in range(inicio, fin)]
+
+def iter_pages(pdf_path, workers=None):
+    """Generar el texto de cada página en orden, sin cargar todo el documento.
+
+    Con ``workers`` > 1 y documentos grandes, los rangos de páginas se
+    extraen en un pool de procesos; solo se mantienen en vuelo unos pocos
+    rangos a la vez para acotar la memoria.
+    """
+    workers = workers or PDF_EXTRACT_WORKERS
+
+    with _fitz().open(pdf_path) as doc:
+        total = doc.page_count
+        if workers <= 1 or total < PDF_PARALLEL_MIN_PAGES:
+            for page in doc:
+                yield page.get_text()
+            return
+
+    rangos = deque((i, min(i + PDF_PAGES_PER_TASK, total)) for i in range(0, total, PDF_PAGES_PER_TASK))
+    # "spawn": el proceso que extrae puede tener hilos (cola de trabajos, pool de BD)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pendientes = deque()
+    try:
+        while rangos or pendientes:
+            while rangos and len(pendientes) < workers * 2:
+                inicio, fin = rangos.popleft()
+                pendientes.append(executor.submit(_extraer_rango, pdf_path, inicio, fin))
+            yield from pendientes.popleft().result()
+    finally:
+        # Si el consumidor se detiene antes (p. ej. ya tiene suficientes preguntas)
+        executor.shutdown(wait=False, cancel_futures=True)
 
 def extract_text_from_pdf(pdf_path):
     """Extraer texto completo del PDF"""
-    with fitz.open(pdf_path) as doc:
-        return "\n".join([page.get_text() for page in doc])
+    return "\n".join(iter_pages(pdf_path))
+
+# Un solo recorrido del texto, línea por línea, encuentra dos tipos de token:
+# - línea numerada "12." (con espacio después = inicio de pregunta)
+# - línea que empieza con inciso "A)".."E)" (ahí termina el enunciado)
+# Empezar con un "\n" literal permite a ``re`` saltar directo entre líneas.
+_TOKENS = re.compile(r'\n(?:\d+\.(?P<espacio>\s)?|(?P<inciso>[A-E]\)))')
+# Incisos a mitad de línea ("... texto A) opción"), buscados solo dentro del enunciado
+_INCISO = re.compile(r'\s[A-E]\)')
+_LARGO_MAXIMO = 500
+
+def _limpiar_enunciado(texto, inicio, fin):
+    """Normalizar espacios de texto[inicio:fin]; ``None`` si es demasiado corto"""
+    ventana = 4 * _LARGO_MAXIMO
+    if fin - inicio > ventana and not _INCISO.search(texto, inicio, inicio + ventana):
+        # Bloques enormes (OCR sin incisos): si la ventana inicial ya da el largo
+        # máximo, lo que venga después no cambia el resultado
+        prefijo = " ".join(texto[inicio:inicio + ventana].split())
+        if len(prefijo) >= _LARGO_MAXIMO:
+            return prefijo[:_LARGO_MAXIMO]
+
+    m = _INCISO.search(texto, inicio, fin)
+    if m:
+        fin = m.start()
+    pregunta = " ".join(texto[inicio:fin].split())
+    if len(pregunta) > 10:
+        # Limitar largo de la pregunta para no saturar tokens
+        return pregunta[:_LARGO_MAXIMO]
+    return None
+
+def iter_preguntas(fragmentos):
+    """Generar preguntas a medida que se completan a partir de fragmentos de texto.
+
+    Los fragmentos (p. ej. páginas) se unen con saltos de línea como en
+    ``extract_text_from_pdf``. Una pregunta empieza en una línea "N. " y
+    termina en la siguiente línea numerada; su enunciado se corta en el
+    primer inciso A)-E). El texto se tokeniza una sola vez y solo se
+    conserva en memoria la pregunta que sigue abierta.
+    """
+    texto = None
+    pos = 0          # desde dónde falta tokenizar
+    inicio = None    # inicio de la pregunta abierta
+    corte = None     # primer inciso a inicio de línea de la pregunta abierta
+
+    def tokenizar(final):
+        nonlocal pos, inicio, corte
+        for m in _TOKENS.finditer(texto, pos):
+            if m.group('inciso') is not None:
+                if inicio is not None and corte is None:
+                    corte = m.start()
+                continue
+
+            if not final and m.group('espacio') is None and m.end() == len(texto):
+                # "12." al final del fragmento: el siguiente decide si es pregunta
+                pos = m.start()
+                return
+
+            if inicio is not None:
+                pregunta = _limpiar_enunciado(texto, inicio, m.start() if corte is None else corte)
+                if pregunta:
+                    yield pregunta
+            inicio = m.start() if m.group('espacio') is not None else None
+            corte = None
+        pos = len(texto)
+
+    for fragmento in fragmentos:
+        # El "\n" inicial hace que la primera línea se trate como las demás
+        texto = "\n" + fragmento if texto is None else texto + "\n" + fragmento
+        yield from tokenizar(final=False)
+
+        # Descartar el texto que ya no puede pertenecer a ninguna pregunta
+        base = pos if inicio is None else inicio
+        if base:
+            texto = texto[base:]
+            pos -= base
+            if inicio is not None:
+                inicio = 0
+                if corte is not None:
+                    corte -= base
+
+    if texto is None:
+        return
+
+    # Fin del texto: un "12." pendiente ya no puede ser pregunta
+    yield from tokenizar(final=True)
+    if inicio is not None:
+        pregunta = _limpiar_enunciado(texto, inicio, len(texto) if corte is None else corte)
+        if pregunta:
+            yield pregunta
+
+def iter_preguntas_pdf(pdf_path, workers=None):
+    """Preguntas de un PDF, extraídas página a página"""
+    return iter_preguntas(iter_pages(pdf_path, workers))
 
 def extraer_preguntas(texto_completo):
     """Extraer preguntas sin incisos"""
-    patron = r'(\d+\.\s.*?)(?=\n\d+\.|\Z)'
-    bloques = re.findall(patron, texto_completo, re.DOTALL)
-    preguntas_limpias = []
-    for b in bloques:
-        pregunta = " ".join(b.split())
-        pregunta = re.split(r'\s[A-E]\)', pregunta)[0]
-        if len(pregunta) > 10:
-            # Limitar largo de la pregunta para no saturar tokens
-            preguntas_limpias.append(pregunta[:500])
-    return preguntas_limpias
-
-def llamar_ia_para_lote(preguntas_lote, difficulty):
-    """Generar nuevas preguntas usando IA a partir de un lote"""
+    return list(iter_preguntas([texto_completo]))
+
+def _trozos_seguros(generar, metrics, preguntas):
+    """Trozos de la respuesta de ``generar()``; un error del backend o del stream corta la lectura.
+
+    Solo se atrapan los errores de la IA: los de ``on_question`` (p. ej.
+    ``JobLost``) se propagan porque ocurren fuera de este generador.
+    """
+    iterador = None
+    while True:
+        try:
+            if iterador is None:
+                iterador = iter(generar())
+            texto = next(iterador)
+        except StopIteration:
+            return
+        except LLMConfigError:
+            # Sin credenciales no tiene caso reintentar: el trabajo falla con este mensaje
+            raise
+        except Exception as e:
+            # Con streaming, las preguntas recibidas antes del error se conservan
+            print(f"⚠ Error IA en lote ({len(preguntas)} preguntas recibidas): {e}")
+            metrics['error'] = str(e)[:200]
+            return
+        yield texto
+
+def _leer_respuesta(generar, parser, preguntas, on_question, metrics, inicio):
+    """Consumir la respuesta agregando a ``preguntas`` las válidas completas.
+
+    Se agregan conforme llegan para que, si el stream falla, las anteriores se conserven.
+    """
+    for texto in _trozos_seguros(generar, metrics, preguntas):
+        for pregunta in parser.feed(texto):
+            if not _pregunta_valida(pregunta):
+                continue
+            if not preguntas:
+                metrics['first_question_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+            preguntas.append(pregunta)
+            if on_question:
+                on_question(pregunta)
+
+def _preguntas_de_texto(generated_text):
+    """Respaldo sin streaming: el JSON entre la primera { y la última }"""
+    json_start = generated_text.find('{')
+    json_end = generated_text.rfind('}') + 1
+    if json_start != -1 and json_end != -1:
+        try:
+            return json.loads(generated_text[json_start:json_end]).get("preguntas", [])
+        except (ValueError, AttributeError):
+            pass
+    return []
+
+def llamar_ia_para_lote(preguntas_lote, difficulty, timeout=None, metrics=None, on_question=None, stream=None):
+    """Generar nuevas preguntas usando IA a partir de un lote.
+
+    Con ``stream`` (por defecto ``LLM_STREAM``) cada pregunta se extrae en
+    cuanto se cierra su objeto JSON y se pasa a ``on_question``; si la
+    respuesta se corta o llega mal formada se devuelven las que sí llegaron.
+    Si se pasa ``metrics`` (dict) se llena con los tokens y la latencia de la llamada.
+    """
+    stream = LLM_STREAM if stream is None else stream
     prompt = f"""
 Genera {len(preguntas_lote)} nuevas preguntas basadas en las siguientes, manteniendo el mismo tema y dificultad {difficulty}.
 
@@ -63,45 +256,197 @@ Reglas:
 Preguntas de referencia:
 {json.dumps(preguntas_lote, ensure_ascii=False)}
 """
+    prompt_estimado, respuesta_estimada = estimate_batch(preguntas_lote)
+    metrics = {} if metrics is None else metrics
+    metrics.update(questions_in=len(preguntas_lote), cached=False,
+                   estimated_prompt_tokens=prompt_estimado, estimated_completion_tokens=respuesta_estimada,
+                   prompt_tokens=None, completion_tokens=None)
+    backend = get_backend()
+    inicio = time.perf_counter()
+    parser = QuestionStreamParser()
+    preguntas = []
+    usage = {}
     try:
-        chat = client.chat.completions.create(
-            model="deepseek/deepseek-r1:free",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
-        generated_text = chat.choices[0].message.content
-        json_start = generated_text.find('{')
-        json_end = generated_text.rfind('}') + 1
-        if json_start != -1 and json_end != -1:
-            return json.loads(generated_text[json_start:json_end])
-    except Exception as e:
-        print(f"⚠ Error IA en lote: {e}")
-    return {"preguntas": []}
-
-def generate_exam(pdf_path, num_questions=20, difficulty='medium'):
-    """Generar examen procesando en lotes"""
-    pdf_text = extract_text_from_pdf(pdf_path)
-    solo_preguntas = extraer_preguntas(pdf_text)
+        generar = lambda: backend.generate(prompt, preguntas_lote, timeout or LLM_BATCH_TIMEOUT, stream, usage)
+        _leer_respuesta(generar, parser, preguntas, on_question, metrics, inicio)
+
+        if not preguntas:
+            # Formato inesperado (p. ej. otra clave): intentar con el JSON completo
+            preguntas.extend(p for p in _preguntas_de_texto(parser.full_text()) if _pregunta_valida(p))
+            if on_question:
+                for pregunta in preguntas:
+                    on_question(pregunta)
+    finally:
+        segundos = time.perf_counter() - inicio
+        metrics.update(usage)
+        metrics['latency_ms'] = round(segundos * 1000, 1)
+        if metrics.get('completion_tokens') is None and parser.text:
+            metrics['completion_tokens_estimated'] = estimate_tokens(parser.full_text())
+        if parser.errors:
+            metrics['malformed_questions'] = parser.errors
+        _registrar_llamada(backend.model, metrics, segundos, len(preguntas))
+    return {"preguntas": preguntas}
+
+def _registrar_llamada(model, metrics, segundos, num_preguntas):
+    """Publicar la llamada en /metrics (duración, tokens y preguntas)"""
+    outcome = 'error' if 'error' in metrics else ('ok' if num_preguntas else 'empty')
+    LLM_REQUEST_SECONDS.observe(segundos, model=model, outcome=outcome)
+    if metrics.get('first_question_ms') is not None:
+        LLM_FIRST_QUESTION_SECONDS.observe(metrics['first_question_ms'] / 1000, model=model)
+    LLM_TOKENS.inc(metrics.get('prompt_tokens') or metrics['estimated_prompt_tokens'], model=model, kind='prompt')
+    completion = metrics.get('completion_tokens') or metrics.get('completion_tokens_estimated') or 0
+    LLM_TOKENS.inc(completion, model=model, kind='completion')
+    LLM_QUESTIONS.inc(num_preguntas, model=model)
+
+def _pregunta_valida(pregunta):
+    """Pregunta con enunciado, opciones y una respuesta correcta que existe entre ellas"""
+    if not isinstance(pregunta, dict):
+        return False
+    opciones = pregunta.get("opciones")
+    return (
+        isinstance(pregunta.get("pregunta"), str) and pregunta["pregunta"].strip() != ""
+        and isinstance(opciones, dict) and len(opciones) >= 2
+        and pregunta.get("respuesta_correcta") in opciones
+    )
+
+def _llamar_con_cache(lote, difficulty, batch_timeout, cache, pdf_hash, force_regenerate, metrics=None,
+                      on_question=None):
+    """Servir el lote desde la caché si existe; si no, llamar a la IA y guardarlo"""
+    if cache is None or pdf_hash is None:
+        return llamar_ia_para_lote(lote, difficulty, batch_timeout, metrics, on_question)
+
+    model = get_backend().model
+    key = cache_key(pdf_hash, lote, difficulty, model)
+    if not force_regenerate:
+        cached = cache.get(key)
+        if cached is not None:
+            if metrics is not None:
+                metrics.update(questions_in=len(lote), cached=True)
+            if on_question:
+                for pregunta in cached.get("preguntas", []):
+                    if _pregunta_valida(pregunta):
+                        on_question(pregunta)
+            return cached
+
+    resultado = llamar_ia_para_lote(lote, difficulty, batch_timeout, metrics, on_question)
+    # Los lotes fallidos no se guardan para que se reintenten la próxima vez
+    if resultado.get("preguntas"):
+        cache.put(key, pdf_hash, model, difficulty, resultado)
+    return resultado
+
+def _procesar_lote(lote, difficulty, batch_timeout, cache, pdf_hash, force_regenerate,
+                   batch_metrics=None, on_question=None, on_attempt=None, retries=None, retry=False):
+    """Pedir un lote y, si falla o llega incompleto, dividirlo y reintentar.
+
+    Se conservan las preguntas válidas; las que faltan se piden de nuevo en
+    lotes más chicos (mitades si no llegó nada) hasta agotar ``retries``.
+    ``on_attempt()`` se llama antes de cada intento (latido del trabajo).
+    """
+    retries = LLM_BATCH_RETRIES if retries is None else retries
+    metrics = {} if batch_metrics is not None else None
+    if on_attempt:
+        on_attempt()
+    resultado = _llamar_con_cache(lote, difficulty, batch_timeout, cache, pdf_hash, force_regenerate, metrics,
+                                  on_question)
+    preguntas = [p for p in resultado.get("preguntas", []) if _pregunta_valida(p)]
+
+    if metrics is not None:
+        metrics.update(questions_out=len(preguntas), retry=retry)
+        batch_metrics.append(metrics)
+
+    faltantes = lote[len(preguntas):]
+    if not faltantes or retries <= 0:
+        return {"preguntas": preguntas}
 
+    args = (difficulty, batch_timeout, cache, pdf_hash, force_regenerate, batch_metrics, on_question,
+            on_attempt, retries - 1, True)
+    if not preguntas and len(lote) > 1:
+        mitad = len(lote) // 2
+        partes = [lote[:mitad], lote[mitad:]]
+    else:
+        partes = [faltantes]
+    for parte in partes:
+        # Renumerar dentro del nuevo lote, como lo arma pack_batches
+        parte = [{"num": i + 1, "texto": item["texto"]} for i, item in enumerate(parte)]
+        preguntas.extend(_procesar_lote(parte, *args)["preguntas"])
+    return {"preguntas": preguntas}
+
+def despachar_lotes(lotes, difficulty, max_concurrency=None, batch_timeout=None, on_progress=None,
+                    cache=None, pdf_hash=None, force_regenerate=False, batch_metrics=None, on_question=None,
+                    on_attempt=None):
+    """Enviar los lotes a la IA y devolver los resultados en el mismo orden.
+
+    Con ``max_concurrency`` > 1 los lotes se procesan en un pool de hilos;
+    cada llamada tiene su propio timeout, así un lote lento no retrasa
+    a los demás y, si expira, solo ese lote queda vacío.
+    ``on_progress(hechos, total)`` se llama cada vez que termina un lote.
+    Con ``cache`` y ``pdf_hash`` los lotes ya generados no vuelven a la IA
+    (salvo con ``force_regenerate``). Los lotes fallidos se dividen y
+    reintentan; en ``batch_metrics`` (lista) se agrega una entrada por llamada.
+    ``on_question(pregunta)`` recibe cada pregunta válida en cuanto llega
+    (desde los hilos del pool cuando hay concurrencia) y ``on_attempt()``
+    se llama antes de cada intento, incluidos los reintentos.
+    """
+    max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+    batch_timeout = batch_timeout or LLM_BATCH_TIMEOUT
+    total = len(lotes)
+    args = (difficulty, batch_timeout, cache, pdf_hash, force_regenerate, batch_metrics, on_question, on_attempt)
+
+    if on_progress:
+        on_progress(0, total)
+
+    if max_concurrency <= 1 or total <= 1:
+        resultados = []
+        for lote in lotes:
+            resultados.append(_procesar_lote(lote, *args))
+            if on_progress:
+                on_progress(len(resultados), total)
+        return resultados
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, total)) as executor:
+        futures = [executor.submit(_procesar_lote, lote, *args) for lote in lotes]
+        if on_progress:
+            for hechos, _ in enumerate(as_completed(futures), start=1):
+                on_progress(hechos, total)
+        return [future.result() for future in futures]
+
+def generate_exam(pdf_path, num_questions=20, difficulty='medium', **kwargs):
+    """Generar examen procesando en lotes a partir de un PDF"""
+    # Dejar de leer el PDF en cuanto hay suficientes preguntas
+    solo_preguntas = list(islice(iter_preguntas_pdf(pdf_path), num_questions))
+    pdf_hash = hash_file(pdf_path) if kwargs.get('cache') is not None else None
+    return generate_exam_from_questions(solo_preguntas, num_questions, difficulty, pdf_hash=pdf_hash, **kwargs)
+
+def generate_exam_from_questions(solo_preguntas, num_questions=20, difficulty='medium', max_concurrency=None,
+                                 batch_timeout=None, on_progress=None, cache=None, pdf_hash=None,
+                                 force_regenerate=False, token_budget=None, on_question=None, on_attempt=None):
+    """Generar examen procesando en lotes a partir de preguntas ya extraídas.
+
+    El resultado incluye ``metricas``: totales de tokens y latencia y el
+    detalle por llamada, para ajustar el presupuesto de los lotes.
+    """
     # Limitar a las que pidió el usuario
     solo_preguntas = solo_preguntas[:num_questions]
 
+    # Lotes llenos hasta el presupuesto de tokens (preguntas cortas juntas, largas aparte)
+    lotes = pack_batches(solo_preguntas, token_budget)
+    batch_metrics = []
+    inicio = time.perf_counter()
+    resultados = despachar_lotes(lotes, difficulty, max_concurrency, batch_timeout, on_progress,
+                                 cache=cache, pdf_hash=pdf_hash, force_regenerate=force_regenerate,
+                                 batch_metrics=batch_metrics, on_question=on_question, on_attempt=on_attempt)
+    resumen = summarize_metrics(batch_metrics)
+    resumen.update(batches=len(lotes), wall_ms=round((time.perf_counter() - inicio) * 1000, 1))
+
+    # Numerar en el orden de los lotes, sin importar cuál terminó primero
     examen_final = {"preguntas": []}
     numero_global = 1
-
-    # Procesar en lotes de 3 para menos llamadas a la IA
-    lote_tamano = 3
-    for i in range(0, len(solo_preguntas), lote_tamano):
-        lote_preguntas = [{"num": idx+1, "texto": p} for idx, p in enumerate(solo_preguntas[i:i+lote_tamano])]
-        resultado_lote = llamar_ia_para_lote(lote_preguntas, difficulty)
-
+    for resultado_lote in resultados:
         for pregunta in resultado_lote.get("preguntas", []):
+            pregunta = dict(pregunta)  # no modificar la respuesta guardada en caché
             pregunta["numero"] = numero_global
             numero_global += 1
             examen_final["preguntas"].append(pregunta)
 
-        # Liberar memoria
-        del lote_preguntas, resultado_lote
-        gc.collect()
-
+    examen_final["metricas"] = {"resumen": resumen, "llamadas": batch_metrics}
     return examen_final
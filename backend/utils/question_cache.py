@@ -0,0 +1,142 @@
+import hashlib
+import json
+import threading
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 del contenido de un archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(pdf_hash, lote, difficulty, model):
+    """Clave determinista de un lote: PDF + preguntas de origen + dificultad + modelo"""
+    material = json.dumps(
+        {'pdf': pdf_hash, 'lote': lote, 'difficulty': difficulty, 'model': model},
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class QuestionCache:
+    """Caché persistente (tabla ``question_cache``) de respuestas de la IA por lote.
+
+    - Las entradas caducan ``ttl`` segundos después de crearse.
+    - Con más de ``max_entries`` filas se eliminan las menos usadas recientemente (LRU).
+    - Los errores de base de datos se tratan como fallos de caché: nunca
+      interrumpen la generación.
+    """
+
+    def __init__(self, pool, max_entries=5000, ttl=30 * 24 * 3600, evict_every=50):
+        self.pool = pool
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+        self._errors = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get(self, key):
+        """Respuesta guardada para ``key`` o ``None``"""
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE question_cache
+                    SET hits = hits + 1, last_used_at = NOW()
+                    WHERE cache_key = %s AND created_at > NOW() - make_interval(secs => %s)
+                    RETURNING response
+                """, (key, self.ttl))
+                row = cur.fetchone()
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            print(f"⚠ Error leyendo caché de preguntas: {e}")
+            self._count('_errors')
+            row = None
+
+        if not row:
+            self._count('_misses')
+            return None
+
+        self._count('_hits')
+        response = row['response']
+        return json.loads(response) if isinstance(response, str) else response
+
+    def put(self, key, pdf_hash, model, difficulty, response):
+        """Guardar (o reemplazar) la respuesta de un lote"""
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO question_cache (cache_key, pdf_hash, model, difficulty, response)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (cache_key) DO UPDATE
+                    SET response = EXCLUDED.response, hits = 0,
+                        created_at = NOW(), last_used_at = NOW()
+                """, (key, pdf_hash, model, difficulty, json.dumps(response, ensure_ascii=False)))
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            print(f"⚠ Error guardando en caché de preguntas: {e}")
+            self._count('_errors')
+            return
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Eliminar entradas caducadas y las menos usadas por encima del límite"""
+        try:
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "DELETE FROM question_cache WHERE created_at <= NOW() - make_interval(secs => %s)",
+                    (self.ttl,)
+                )
+                removed = cur.rowcount
+                cur.execute("""
+                    DELETE FROM question_cache WHERE cache_key IN (
+                        SELECT cache_key FROM question_cache
+                        ORDER BY last_used_at DESC
+                        OFFSET %s
+                    )
+                """, (self.max_entries,))
+                removed += cur.rowcount
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            print(f"⚠ Error depurando caché de preguntas: {e}")
+            self._count('_errors')
+            return 0
+
+        self._count('_evictions', removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'writes': self._writes,
+                'evictions': self._evictions,
+                'errors': self._errors,
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,190 @@
+"""Esquema de la base de datos compartido por app.py e init_db.py"""
+
+# (nombre, descripción, sentencia) en orden de dependencias
+TABLES = [
+    ("teachers", "maestros", """
+        CREATE TABLE IF NOT EXISTS teachers (
+            id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            email VARCHAR(200) UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ("exams", "exámenes", """
+        CREATE TABLE IF NOT EXISTS exams (
+            id VARCHAR(36) PRIMARY KEY,
+            teacher_id VARCHAR(36) REFERENCES teachers(id),
+            exam_code VARCHAR(10) UNIQUE NOT NULL,
+            questions JSONB NOT NULL,
+            time_limit INTEGER DEFAULT 40,
+            difficulty VARCHAR(20) DEFAULT 'medium',
+            versions INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ("exam_versions", "versiones de exámenes", """
+        CREATE TABLE IF NOT EXISTS exam_versions (
+            id VARCHAR(36) PRIMARY KEY,
+            original_exam_id VARCHAR(36) REFERENCES exams(id),
+            version_code VARCHAR(10) UNIQUE NOT NULL,
+            questions JSONB NOT NULL,
+            time_limit INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ("student_results", "resultados de estudiantes", """
+        CREATE TABLE IF NOT EXISTS student_results (
+            id VARCHAR(36) PRIMARY KEY,
+            student_name VARCHAR(200) NOT NULL,
+            exam_code VARCHAR(10) NOT NULL,
+            exam_id VARCHAR(36),
+            answers JSONB,
+            correct_answers INTEGER,
+            total_questions INTEGER,
+            overall_percentage DECIMAL(5,2),
+            topic_scores JSONB,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ("uploads", "preguntas extraídas de PDFs subidos", """
+        CREATE TABLE IF NOT EXISTS uploads (
+            id VARCHAR(36) PRIMARY KEY,
+            teacher_id VARCHAR(36),
+            filename VARCHAR(255),
+            pdf_hash CHAR(64) NOT NULL,
+            questions JSONB NOT NULL,
+            num_questions INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            used_at TIMESTAMP
+        )
+    """),
+    ("generation_jobs", "trabajos de generación de exámenes", """
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id VARCHAR(36) PRIMARY KEY,
+            teacher_id VARCHAR(36) REFERENCES teachers(id),
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            params JSONB NOT NULL,
+            batches_done INTEGER DEFAULT 0,
+            batches_total INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            exam_id VARCHAR(36),
+            exam_code VARCHAR(10),
+            error TEXT,
+            worker_id VARCHAR(100),
+            heartbeat_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ("question_cache", "caché de preguntas generadas por IA", """
+        CREATE TABLE IF NOT EXISTS question_cache (
+            cache_key CHAR(64) PRIMARY KEY,
+            pdf_hash CHAR(64) NOT NULL,
+            model VARCHAR(200) NOT NULL,
+            difficulty VARCHAR(20),
+            response JSONB NOT NULL,
+            hits INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+    ("exam_stats", "estadísticas por examen (utils.analytics)", """
+        CREATE TABLE IF NOT EXISTS exam_stats (
+            exam_id VARCHAR(36) PRIMARY KEY REFERENCES exams(id),
+            submissions INTEGER NOT NULL DEFAULT 0,
+            score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            score_sq_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            histogram INTEGER[] NOT NULL,
+            topic_stats JSONB NOT NULL DEFAULT '{}',
+            question_correct INTEGER[] NOT NULL DEFAULT '{}',
+            question_submissions INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """),
+]
+
+# Cambios sobre tablas ya existentes (idempotentes)
+MIGRATIONS = [
+    # Clave de respuestas precalculada para calificar sin decodificar las preguntas
+    "ALTER TABLE exams ADD COLUMN IF NOT EXISTS answer_key JSONB",
+    "ALTER TABLE exam_versions ADD COLUMN IF NOT EXISTS answer_key JSONB",
+    # Versiones guardadas como permutación del original (utils.versions)
+    "ALTER TABLE exam_versions ADD COLUMN IF NOT EXISTS permutation JSONB",
+    "ALTER TABLE exam_versions ALTER COLUMN questions DROP NOT NULL",
+    # Número de preguntas para los listados sin leer el JSONB completo
+    "ALTER TABLE exams ADD COLUMN IF NOT EXISTS num_questions INTEGER",
+    # Tokens, latencia y reintentos de cada generación (utils.batching)
+    "ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS metrics JSONB",
+    # Preguntas que ya llegaron en streaming mientras el trabajo corre
+    "ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS questions_ready INTEGER DEFAULT 0",
+    "ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS preview JSONB",
+    # Fechas de la paginación por cursor (utils.pagination): sin NULL, los
+    # registros antiguos sin fecha quedan al final del listado
+    "UPDATE exams SET created_at = TIMESTAMP 'epoch' WHERE created_at IS NULL",
+    "ALTER TABLE exams ALTER COLUMN created_at SET NOT NULL",
+    "UPDATE student_results SET submitted_at = TIMESTAMP 'epoch' WHERE submitted_at IS NULL",
+    "ALTER TABLE student_results ALTER COLUMN submitted_at SET NOT NULL",
+]
+
+# Vistas: se crean después de las tablas
+VIEWS = [
+    # Todos los códigos (exámenes originales y versiones) en un solo lugar.
+    # Postgres empuja "WHERE code = ..." a cada rama del UNION ALL, así que
+    # resolver un código es una sola consulta que usa los índices únicos.
+    # Las versiones guardadas como permutación traen las preguntas del
+    # original y la permutación para armarlas (utils.versions.version_questions).
+    ("exam_codes", """
+        CREATE OR REPLACE VIEW exam_codes AS
+            SELECT e.exam_code AS code, e.id AS exam_id, e.id AS original_exam_id,
+                   e.teacher_id, e.questions, e.time_limit, FALSE AS is_version,
+                   e.answer_key, NULL::JSONB AS permutation
+            FROM exams e
+            UNION ALL
+            SELECT ev.version_code, ev.id, ev.original_exam_id,
+                   e.teacher_id, COALESCE(ev.questions, e.questions), ev.time_limit, TRUE,
+                   ev.answer_key, ev.permutation
+            FROM exam_versions ev
+            JOIN exams e ON e.id = ev.original_exam_id
+    """),
+]
+
+# Índices para mejorar rendimiento
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_teachers_email ON teachers(email)",
+    "CREATE INDEX IF NOT EXISTS idx_exams_teacher_id ON exams(teacher_id)",
+    "CREATE INDEX IF NOT EXISTS idx_exams_code ON exams(exam_code)",
+    "CREATE INDEX IF NOT EXISTS idx_versions_code ON exam_versions(version_code)",
+    "CREATE INDEX IF NOT EXISTS idx_results_exam_code ON student_results(exam_code)",
+    "CREATE INDEX IF NOT EXISTS idx_results_submitted_at ON student_results(submitted_at)",
+    "CREATE INDEX IF NOT EXISTS idx_uploads_created_at ON uploads(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_uploads_pdf_hash ON uploads(pdf_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON generation_jobs(status, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_question_cache_last_used ON question_cache(last_used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_question_cache_pdf_hash ON question_cache(pdf_hash)",
+    # Paginación por cursor de los listados del maestro
+    "CREATE INDEX IF NOT EXISTS idx_exams_teacher_created ON exams(teacher_id, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_results_code_submitted ON student_results(exam_code, submitted_at DESC, id DESC)",
+]
+
+
+def create_schema(cur, log=None):
+    """Crear tablas, vistas e índices (idempotente). ``log`` recibe mensajes de progreso."""
+    for name, description, statement in TABLES:
+        if log:
+            log(f"🔄 Creando tabla '{name}' ({description})...")
+        cur.execute(statement)
+
+    if log:
+        log("🔄 Aplicando migraciones...")
+    for statement in MIGRATIONS:
+        cur.execute(statement)
+
+    for name, statement in VIEWS:
+        if log:
+            log(f"🔄 Creando vista '{name}'...")
+        cur.execute(statement)
+
+    if log:
+        log("🔄 Creando índices para mejor rendimiento...")
+    for statement in INDEXES:
+        cur.execute(statement)
@@ -0,0 +1,44 @@
+"""Respuesta de /get-exam precalculada para los alumnos
+
+Por cada código se arma una sola vez el JSON sin las respuestas correctas,
+su versión comprimida con gzip y un ETag; después cada solicitud solo
+elige los bytes a enviar, o responde 304 si el navegador ya los tiene.
+"""
+
+import gzip
+import hashlib
+import json
+
+# Campos de cada pregunta que ve el alumno (nunca respuesta_correcta)
+STUDENT_FIELDS = ('numero', 'tema', 'pregunta', 'opciones')
+
+# Por debajo de este tamaño comprimir no compensa
+GZIP_MIN_BYTES = 1024
+
+
+def student_questions(questions):
+    return [{field: q[field] for field in STUDENT_FIELDS if field in q} for q in questions]
+
+
+def build_payload(exam_id, original_exam_id, questions, time_limit, is_version):
+    """Cuerpo JSON, cuerpo gzip (o ``None``) y ETag de un examen o versión.
+
+    La serialización es determinista (las preguntas de ``materialize`` lo
+    son), así todos los workers calculan el mismo ETag para el mismo examen.
+    Las claves no se ordenan: el orden de ``opciones`` es la permutación de
+    la versión.
+    """
+    body = json.dumps({
+        'exam_id': exam_id,
+        'questions': student_questions(questions),
+        'time_limit': time_limit,
+        'is_version': is_version,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    return {
+        'exam_id': exam_id,
+        'original_exam_id': original_exam_id,
+        'body': body,
+        'gzip': gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None,
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+    }
@@ -0,0 +1,144 @@
+"""Versiones de un examen (preguntas y opciones en otro orden)
+
+Una versión se guarda como una permutación del examen original en lugar de
+una copia completa de las preguntas::
+
+    {"order": [4, 0, 2, ...], "options": [[2, 0, 1, 3], null, ...]}
+
+``order[j]`` es el índice en el original de la pregunta que va en la
+posición ``j`` y ``options[j]`` el orden de sus opciones (índices sobre
+las claves de ``opciones`` del original), o ``null`` si no tiene.
+La versión completa se arma bajo demanda con ``materialize``.
+"""
+
+import json
+import random
+import uuid
+
+import psycopg2.extras
+
+from utils.grading import build_answer_key
+
+CODE_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+CODE_LENGTH = 6
+
+
+def random_permutation(questions, rng):
+    """Permutación aleatoria de preguntas y opciones"""
+    order = list(range(len(questions)))
+    rng.shuffle(order)
+    options = []
+    for i in order:
+        opciones = questions[i].get('opciones')
+        if isinstance(opciones, dict):
+            option_order = list(range(len(opciones)))
+            rng.shuffle(option_order)
+            options.append(option_order)
+        else:
+            options.append(None)
+    return {'order': order, 'options': options}
+
+
+def materialize(questions, permutation):
+    """Preguntas de la versión descrita por ``permutation`` (sin modificar ``questions``)"""
+    version = []
+    for i, option_order in zip(permutation['order'], permutation['options']):
+        question = questions[i]
+        if option_order is not None:
+            items = list(question['opciones'].items())
+            question = dict(question)
+            question['opciones'] = dict(items[k] for k in option_order)
+        version.append(question)
+    return version
+
+
+def version_questions(questions, permutation):
+    """Preguntas de una fila de ``exam_codes``: ya completas o por permutación"""
+    if isinstance(questions, str):
+        questions = json.loads(questions)
+    if permutation is None:
+        return questions
+    if isinstance(permutation, str):
+        permutation = json.loads(permutation)
+    return materialize(questions, permutation)
+
+
+def build_versions(questions, num_versions, rng=None, existing_codes=()):
+    """Construir ``num_versions`` versiones de ``questions``.
+
+    Devuelve una lista de dicts con version_id, version_code, permutation
+    y answer_key (estas dos ya serializadas). ``questions`` no se modifica.
+    """
+    rng = rng or random.Random()
+    usados = set(existing_codes)
+    versions = []
+
+    for _ in range(num_versions):
+        version_code = ''.join(rng.choices(CODE_ALPHABET, k=CODE_LENGTH))
+        while version_code in usados:
+            version_code = ''.join(rng.choices(CODE_ALPHABET, k=CODE_LENGTH))
+        usados.add(version_code)
+
+        permutation = random_permutation(questions, rng)
+        versions.append({
+            'version_id': str(uuid.uuid4()),
+            'version_code': version_code,
+            'permutation': json.dumps(permutation, separators=(',', ':')),
+            'answer_key': json.dumps(build_answer_key([questions[i] for i in permutation['order']])),
+        })
+    return versions
+
+
+def insert_versions(cur, exam_id, time_limit, versions):
+    """Guardar todas las versiones en un solo viaje a la base de datos (sin commit)"""
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO exam_versions (id, original_exam_id, version_code, permutation, time_limit, answer_key)
+        VALUES %s
+    """, [
+        (v['version_id'], exam_id, v['version_code'], v['permutation'], time_limit, v['answer_key'])
+        for v in versions
+    ], page_size=max(len(versions), 1))
+
+
+def _huella(question):
+    """Identidad de una pregunta sin importar el orden de sus opciones"""
+    sin_opciones = {k: v for k, v in question.items() if k != 'opciones'}
+    opciones = question.get('opciones')
+    return json.dumps([sin_opciones, sorted(opciones.items()) if isinstance(opciones, dict) else opciones],
+                      sort_keys=True, ensure_ascii=False)
+
+
+def infer_permutation(original, version):
+    """Permutación que convierte ``original`` en ``version`` (copia completa).
+
+    Devuelve ``None`` si la versión no es una permutación exacta del
+    original (por ejemplo, si el examen cambió después de generarla).
+    """
+    if len(original) != len(version):
+        return None
+
+    disponibles = {}
+    for i, question in enumerate(original):
+        disponibles.setdefault(_huella(question), []).append(i)
+
+    order = []
+    options = []
+    for question in version:
+        indices = disponibles.get(_huella(question))
+        if not indices:
+            return None
+        i = indices.pop(0)
+        order.append(i)
+
+        opciones = original[i].get('opciones')
+        if isinstance(opciones, dict):
+            posiciones = {key: k for k, key in enumerate(opciones)}
+            options.append([posiciones[key] for key in question['opciones']])
+        else:
+            options.append(None)
+
+    permutation = {'order': order, 'options': options}
+    # La versión armada debe ser idéntica, incluido el orden de las claves
+    if json.dumps(materialize(original, permutation)) != json.dumps(version):
+        return None
+    return permutation
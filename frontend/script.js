@@ -224,7 +224,7 @@ async function handleFile(file) {
                 <p>📑 Preguntas extraídas: ${data.num_preguntas}</p>
             `;
             document.getElementById('exam-config').style.display = 'block';
-            window.currentFilePath = data.file_path;
+            window.currentUploadId = data.upload_id;
         } else {
             throw new Error(data.error || 'Error al subir archivo');
         }
@@ -311,7 +311,7 @@ async function generateExam() {
         }
     }
     
-    if (!window.currentFilePath) {
+    if (!window.currentUploadId) {
         alert('Por favor sube un archivo PDF primero');
         return;
     }
@@ -324,21 +324,28 @@ async function generateExam() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 teacher_id: currentTeacherId,
-                file_path: window.currentFilePath,
+                upload_id: window.currentUploadId,
                 num_questions: parseInt(numQuestions),
                 difficulty: difficulty,
                 time_limit: parseInt(finalTimeLimit)
             })
         });
         
-        if (data.success) {
-            alert(`¡Examen generado exitosamente!\nCódigo: ${data.exam_code}`);
+        if (!data.success) {
+            throw new Error(data.error || 'Error al generar examen');
+        }
+        
+        // La generación corre en segundo plano: consultar el avance hasta que termine
+        const job = await waitForGenerationJob(data.job_id);
+        
+        if (job.status === 'done') {
+            alert(`¡Examen generado exitosamente!\nCódigo: ${job.exam_code}`);
             document.getElementById('exam-config').style.display = 'none';
             document.getElementById('upload-area').innerHTML = '<p>Arrastra un archivo PDF aquí o haz clic para seleccionar</p>';
             loadExams();
             showTab('exams-section');
         } else {
-            throw new Error(data.error || 'Error al generar examen');
+            throw new Error(job.error || 'Error al generar examen');
         }
     } catch (error) {
         alert('Error al generar examen: ' + error.message);
@@ -347,6 +354,41 @@ async function generateExam() {
     }
 }
 
+// Tiempo máximo de espera de una generación (p. ej. si no hay workers que la tomen)
+const GENERATION_MAX_WAIT_MS = 15 * 60 * 1000;
+
+// Consultar el estado de un trabajo de generación hasta que termine
+async function waitForGenerationJob(jobId, intervalMs = 2000, maxWaitMs = GENERATION_MAX_WAIT_MS) {
+    const loadingText = document.querySelector('#loading p');
+    const deadline = Date.now() + maxWaitMs;
+    
+    try {
+        while (true) {
+            if (Date.now() > deadline) {
+                throw new Error(`La generación sigue en proceso después de ${Math.round(maxWaitMs / 60000)} minutos. ` +
+                    `Vuelve a consultarlo más tarde (ID del trabajo: ${jobId}).`);
+            }
+            
+            const job = await apiCall(`/generate-exam/${jobId}`);
+            
+            if (job.status === 'done' || job.status === 'failed') {
+                return job;
+            }
+            
+            if (loadingText && job.batches_total > 0) {
+                const ready = job.questions_ready ? `, ${job.questions_ready} preguntas listas` : '';
+                loadingText.textContent = `Generando examen... ${job.batches_done}/${job.batches_total} lotes${ready}`;
+            }
+            
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+        }
+    } finally {
+        if (loadingText) {
+            loadingText.textContent = 'Cargando...';
+        }
+    }
+}
+
 // Cargar datos del maestro
 function loadTeacherData() {
     if (currentTeacherId) {
@@ -354,22 +396,23 @@ function loadTeacherData() {
     }
 }
 
-async function loadExams() {
+async function loadExams(cursor = null) {
     if (!currentTeacherId) {
         console.warn('No hay teacher ID disponible');
         return;
     }
     
     try {
-        const data = await apiCall(`/get-teacher-exams/${currentTeacherId}`);
+        const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const data = await apiCall(`/get-teacher-exams/${currentTeacherId}${params}`);
         
         const examsList = document.getElementById('exams-list');
-        if (!data.exams || data.exams.length === 0) {
+        if (!cursor && (!data.exams || data.exams.length === 0)) {
             examsList.innerHTML = '<p>No hay exámenes generados aún.</p>';
             return;
         }
         
-        examsList.innerHTML = data.exams.map(exam => `
+        const itemsHtml = data.exams.map(exam => `
             <div class="exam-list-item">
                 <div class="exam-info">
                     <h4>Código: ${exam.exam_code}</h4>
@@ -383,6 +426,7 @@ async function loadExams() {
                 </div>
             </div>
         `).join('');
+        renderPage(examsList, itemsHtml, cursor, data.next_cursor, 'loadExams');
     } catch (error) {
         console.error('Error cargando exámenes:', error);
         document.getElementById('exams-list').innerHTML = 
@@ -390,7 +434,27 @@ async function loadExams() {
     }
 }
 
-async function loadGrades() {
+// Agregar una página a un listado y dejar el botón "Cargar más" si hay siguiente
+function renderPage(container, itemsHtml, cursor, nextCursor, loaderName) {
+    const previousButton = container.querySelector('.load-more');
+    if (previousButton) previousButton.remove();
+    
+    if (cursor) {
+        container.insertAdjacentHTML('beforeend', itemsHtml);
+    } else {
+        container.innerHTML = itemsHtml;
+    }
+    
+    if (nextCursor) {
+        container.insertAdjacentHTML('beforeend', `
+            <button class="btn btn-secondary load-more" onclick="${loaderName}('${nextCursor}')">
+                Cargar más
+            </button>
+        `);
+    }
+}
+
+async function loadGrades(cursor = null) {
     if (!currentTeacherId) {
         console.log('No teacher ID available');
         return;
@@ -399,17 +463,18 @@ async function loadGrades() {
     console.log('Loading grades for teacher:', currentTeacherId);
     
     try {
-        const data = await apiCall(`/get-student-results/${currentTeacherId}`);
+        const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const data = await apiCall(`/get-student-results/${currentTeacherId}${params}`);
         
         console.log('Student results data:', data);
         
         const gradesList = document.getElementById('grades-list');
-        if (!data.results || data.results.length === 0) {
+        if (!cursor && (!data.results || data.results.length === 0)) {
             gradesList.innerHTML = '<p>No hay calificaciones aún. Los estudiantes deben completar exámenes para que aparezcan los resultados aquí.</p>';
             return;
         }
         
-        gradesList.innerHTML = data.results.map(result => `
+        const itemsHtml = data.results.map(result => `
             <div class="grade-item">
                 <div class="grade-info">
                     <h4>${result.student_name}</h4>
@@ -424,6 +489,7 @@ async function loadGrades() {
                 </div>
             </div>
         `).join('');
+        renderPage(gradesList, itemsHtml, cursor, data.next_cursor, 'loadGrades');
     } catch (error) {
         console.error('Error cargando calificaciones:', error);
         const gradesList = document.getElementById('grades-list');
@@ -431,6 +497,15 @@ async function loadGrades() {
     }
 }
 
+// Descargar todas las calificaciones; el backend las envía en streaming
+function exportGrades() {
+    if (!currentTeacherId) {
+        console.warn('No hay teacher ID disponible');
+        return;
+    }
+    window.location.href = `${API_BASE_URL}/export-results/${currentTeacherId}?format=csv`;
+}
+
 // Versiones de exámenes
 function showVersionsPage(examId) {
     currentExamId = examId;
@@ -480,6 +555,60 @@ async function generateVersions() {
     }
 }
 
+// Exámenes ya descargados (localStorage): al volver a entrar o reconectarse
+// se revalidan con If-None-Match y el servidor responde 304 sin cuerpo
+const EXAM_STORAGE_PREFIX = 'exam:';
+
+function readStoredExam(examCode) {
+    try {
+        return JSON.parse(localStorage.getItem(EXAM_STORAGE_PREFIX + examCode));
+    } catch (error) {
+        return null;
+    }
+}
+
+function storeExam(examCode, etag, data) {
+    try {
+        localStorage.setItem(EXAM_STORAGE_PREFIX + examCode, JSON.stringify({ etag, data }));
+    } catch (error) {
+        // Sin espacio o almacenamiento deshabilitado: solo se pierde la caché
+        console.warn('No se pudo guardar el examen en localStorage:', error);
+    }
+}
+
+async function fetchExam(examCode) {
+    const stored = readStoredExam(examCode);
+    const headers = stored && stored.etag ? { 'If-None-Match': stored.etag } : {};
+    
+    let response;
+    try {
+        response = await fetch(`${API_BASE_URL}/get-exam/${encodeURIComponent(examCode)}`, { headers });
+    } catch (error) {
+        // Sin conexión: usar la copia guardada si la hay
+        if (stored) {
+            console.warn('📦 Sin conexión, usando el examen guardado');
+            return stored.data;
+        }
+        throw error;
+    }
+    
+    if (response.status === 304 && stored) {
+        console.log('📦 Examen sin cambios (304), usando la copia guardada');
+        return stored.data;
+    }
+    if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(`HTTP ${response.status}: ${errorText}`);
+    }
+    
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        storeExam(examCode, etag, data);
+    }
+    return data;
+}
+
 // Login de estudiante
 async function handleStudentLogin(e) {
     e.preventDefault();
@@ -494,7 +623,7 @@ async function handleStudentLogin(e) {
     showLoading();
     
     try {
-        const data = await apiCall(`/get-exam/${examCode.trim()}`);
+        const data = await fetchExam(examCode.trim());
         
         if (data.error) {
             alert('Código de examen no válido');